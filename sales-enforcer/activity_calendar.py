@@ -0,0 +1,164 @@
+# sales-enforcer/activity_calendar.py
+"""
+Per-user activity calendar behind the streak and weekly-minimum metrics.
+
+Each user has one `user_activity_calendars` row holding an array of daily net
+points over a rolling CALENDAR_WEEKS window (starting on a Monday). An ORM
+`after_insert` hook on PointsLedger adds every ledger row to its day, sliding
+the window forward by whole weeks when needed.
+
+The weekly close job (`close_week`) then walks every calendar in one UPDATE:
+it sums the closed week's slice, extends or resets `streak_weeks`, and flags
+users below POINT_CONFIG["weekly_minimum"]. Dashboard reads are a single
+row per user plus a 7-element sum, with no ledger scan.
+"""
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import event, text
+
+import config
+from models import PointsLedger
+from utils import ensure_timezone_aware
+
+CALENDAR_WEEKS = 13
+CALENDAR_DAYS = CALENDAR_WEEKS * 7
+
+def week_start(day: date) -> date:
+    return day - timedelta(days=day.weekday())
+
+def window_start(day: date) -> date:
+    """Start of the window whose last week contains `day`."""
+    return week_start(day) - timedelta(weeks=CALENDAR_WEEKS - 1)
+
+def slide_window(start_day: date, daily: List[int], day: date) -> Tuple[date, List[int]]:
+    """Moves the window forward (by whole weeks) until it covers `day`."""
+    if day < start_day + timedelta(days=CALENDAR_DAYS):
+        return start_day, daily
+    new_start = window_start(day)
+    shift = (new_start - start_day).days
+    if shift >= CALENDAR_DAYS:
+        return new_start, [0] * CALENDAR_DAYS
+    return new_start, daily[shift:] + [0] * shift
+
+def week_points(start_day: date, daily: List[int], week: date) -> int:
+    offset = (week - start_day).days
+    if offset <= -7 or offset >= len(daily):
+        return 0
+    return sum(daily[max(offset, 0):offset + 7])
+
+# --- Incremental maintenance ---
+
+_ENSURE_SQL = text("""
+    INSERT INTO user_activity_calendars (user_id, start_day, daily_points, streak_weeks)
+    VALUES (:user_id, :start_day, :daily_points, 0)
+    ON CONFLICT (user_id) DO NOTHING
+""")
+_LOCK_SQL = text("SELECT start_day, daily_points FROM user_activity_calendars WHERE user_id = :user_id FOR UPDATE")
+_UPDATE_SQL = text("UPDATE user_activity_calendars SET start_day = :start_day, daily_points = :daily_points WHERE user_id = :user_id")
+
+@event.listens_for(PointsLedger, "after_insert")
+def _fold_into_calendar(mapper, connection, target):
+    if not target.points:
+        return
+    # created_at is a server default, so fall back to now when it wasn't set explicitly.
+    day = ensure_timezone_aware(target.created_at).astimezone(timezone.utc).date() if target.created_at else datetime.now(timezone.utc).date()
+    connection.execute(_ENSURE_SQL, {"user_id": target.user_id, "start_day": window_start(day), "daily_points": [0] * CALENDAR_DAYS})
+    row = connection.execute(_LOCK_SQL, {"user_id": target.user_id}).one()
+    start_day, daily = slide_window(row.start_day, list(row.daily_points), day)
+    offset = (day - start_day).days
+    if offset < 0:
+        return  # older than the window; only the ledger keeps it
+    daily[offset] += target.points
+    connection.execute(_UPDATE_SQL, {"user_id": target.user_id, "start_day": start_day, "daily_points": daily})
+
+# --- Weekly close ---
+
+_CLOSE_WEEK_SQL = text("""
+    WITH totals AS (
+        SELECT user_id,
+               COALESCE((
+                   SELECT SUM(x) FROM unnest(daily_points[(CAST(:week AS date) - start_day) + 1:(CAST(:week AS date) - start_day) + 7]) AS x
+               ), 0) AS points
+        FROM user_activity_calendars
+        WHERE closed_week IS DISTINCT FROM CAST(:week AS date)
+        FOR UPDATE
+    )
+    UPDATE user_activity_calendars c
+    SET streak_weeks = CASE
+            WHEN t.points < :minimum THEN 0
+            WHEN c.streak_through = CAST(:week AS date) - 7 THEN c.streak_weeks + 1
+            ELSE 1
+        END,
+        streak_through = CASE WHEN t.points >= :minimum THEN CAST(:week AS date) ELSE c.streak_through END,
+        below_minimum_week = CASE WHEN t.points < :minimum THEN CAST(:week AS date) ELSE c.below_minimum_week END,
+        closed_week = CAST(:week AS date)
+    FROM totals t
+    WHERE t.user_id = c.user_id
+    RETURNING c.user_id, t.points
+""")
+
+def close_week(db, week: date) -> List[dict]:
+    """
+    Closes the week starting on `week` for every calendar in one statement and returns
+    the users who finished it below the weekly minimum. Idempotent per week.
+    """
+    rows = db.execute(_CLOSE_WEEK_SQL, {"week": week_start(week), "minimum": config.POINT_CONFIG["weekly_minimum"]}).all()
+    return [{"user_id": r.user_id, "points": int(r.points)} for r in rows if r.points < config.POINT_CONFIG["weekly_minimum"]]
+
+# --- Reads ---
+
+_STATUS_SQL = text("""
+    SELECT user_id, start_day, daily_points, streak_weeks, streak_through
+    FROM user_activity_calendars
+    WHERE user_id = ANY(:user_ids)
+""")
+
+def get_user_status(db, user_ids: Iterable[int], today: Optional[date] = None) -> Dict[int, dict]:
+    """Current-week points, weekly-minimum status and streak for each user (missing users have no activity)."""
+    today = today or datetime.now(timezone.utc).date()
+    this_week = week_start(today)
+    minimum = config.POINT_CONFIG["weekly_minimum"]
+    status = {}
+    for r in db.execute(_STATUS_SQL, {"user_ids": list(user_ids)}):
+        points = week_points(r.start_day, r.daily_points, this_week)
+        streak = r.streak_weeks if r.streak_through == this_week - timedelta(weeks=1) else 0
+        if points >= minimum:
+            streak += 1
+        status[r.user_id] = {
+            "week_points": points,
+            "meets_weekly_minimum": points >= minimum,
+            "streak_weeks": streak,
+            "on_streak": streak >= config.POINT_CONFIG["streak_min_weeks"],
+        }
+    return status
+
+# --- Rebuild ---
+
+_REBUILD_SQL = text("""
+    INSERT INTO user_activity_calendars (user_id, start_day, daily_points, streak_weeks)
+    SELECT u.user_id, CAST(:start_day AS date), array_agg(COALESCE(d.points, 0) ORDER BY gs.i), 0
+    FROM (SELECT DISTINCT user_id FROM points_ledger) u
+    CROSS JOIN generate_series(0, :days - 1) AS gs(i)
+    LEFT JOIN (
+        SELECT user_id, timezone('UTC', created_at)::date AS day, SUM(points)::int AS points
+        FROM points_ledger
+        WHERE created_at >= CAST(:start_day AS date)
+        GROUP BY 1, 2
+    ) d ON d.user_id = u.user_id AND d.day = CAST(:start_day AS date) + gs.i
+    GROUP BY u.user_id
+""")
+
+def rebuild_calendars(db, today: Optional[date] = None):
+    """
+    Recomputes every calendar from the ledger and replays the weekly closes inside the
+    window (migration backfill, repairs, after a ledger rebuild). The caller commits.
+    """
+    today = today or datetime.now(timezone.utc).date()
+    start_day = window_start(today)
+    db.execute(text("DELETE FROM user_activity_calendars"))
+    db.execute(_REBUILD_SQL, {"start_day": start_day, "days": CALENDAR_DAYS})
+    week = start_day
+    while week < week_start(today):
+        close_week(db, week)
+        week += timedelta(weeks=1)
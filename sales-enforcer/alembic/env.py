@@ -4,10 +4,8 @@ from sqlalchemy import engine_from_config
 from sqlalchemy import pool
 
 from alembic import context
-from dotenv import load_dotenv
-import os
 
-load_dotenv()
+import settings
 
 
 
@@ -16,7 +14,7 @@ load_dotenv()
 # access to the values within the .ini file in use.
 config = context.config
 # Add this line to set the URL from your .env file
-config.set_main_option('sqlalchemy.url', os.getenv('DATABASE_URL')) 
+config.set_main_option('sqlalchemy.url', settings.DATABASE_URL)
 # Interpret the config file for Python logging.
 # This line sets up loggers basically.
 if config.config_file_name is not None:
@@ -0,0 +1,43 @@
+"""Add health_kpi_counters and health_kpi_marks
+
+Revision ID: 0a4c9e5d7b21
+Revises: f1b6d8e2a947
+Create Date: 2025-10-09 10:37:26.418830
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0a4c9e5d7b21'
+down_revision: Union[str, Sequence[str], None] = 'f1b6d8e2a947'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('health_kpi_counters',
+    sa.Column('metric', sa.String(length=32), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('month', sa.Date(), nullable=False),
+    sa.Column('numerator', sa.BigInteger(), nullable=False),
+    sa.Column('denominator', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('metric', 'user_id', 'month')
+    )
+    op.create_table('health_kpi_marks',
+    sa.Column('metric', sa.String(length=32), nullable=False),
+    sa.Column('deal_id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('side', sa.String(length=12), nullable=False),
+    sa.Column('month', sa.Date(), nullable=False),
+    sa.PrimaryKeyConstraint('metric', 'deal_id', 'side')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('health_kpi_marks')
+    op.drop_table('health_kpi_counters')
@@ -0,0 +1,33 @@
+"""Add export_watermarks for incremental columnar exports
+
+Revision ID: 3e8f1a6c9d52
+Revises: 0a4c9e5d7b21
+Create Date: 2025-10-13 15:02:44.690113
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3e8f1a6c9d52'
+down_revision: Union[str, Sequence[str], None] = '0a4c9e5d7b21'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('export_watermarks',
+    sa.Column('table_name', sa.String(length=64), nullable=False),
+    sa.Column('last_id', sa.BigInteger(), nullable=False),
+    sa.Column('exported_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.PrimaryKeyConstraint('table_name')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('export_watermarks')
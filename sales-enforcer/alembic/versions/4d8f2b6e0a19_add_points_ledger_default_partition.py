@@ -0,0 +1,38 @@
+"""Add a DEFAULT partition to points_ledger
+
+Revision ID: 4d8f2b6e0a19
+Revises: 9b2e4d7a1c63
+Create Date: 2025-10-20 11:06:52.318470
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4d8f2b6e0a19'
+down_revision: Union[str, Sequence[str], None] = '9b2e4d7a1c63'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Catches rows outside every quarter partition instead of failing the insert;
+    # partitions.create_quarter_partition moves them out again.
+    op.execute("CREATE TABLE IF NOT EXISTS points_ledger_default PARTITION OF points_ledger DEFAULT")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Fails (rather than losing rows) if the default partition still holds any.
+    op.execute("""
+        DO $$
+        BEGIN
+            IF EXISTS (SELECT 1 FROM points_ledger_default) THEN
+                RAISE EXCEPTION 'points_ledger_default is not empty; run maintain_ledger_partitions first';
+            END IF;
+        END $$;
+    """)
+    op.execute("DROP TABLE points_ledger_default")
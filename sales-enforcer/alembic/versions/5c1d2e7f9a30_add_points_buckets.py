@@ -0,0 +1,43 @@
+"""Add points_buckets time-bucketed points series
+
+Revision ID: 5c1d2e7f9a30
+Revises: 238fc9ab4aa0
+Create Date: 2025-09-08 10:12:41.204518
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5c1d2e7f9a30'
+down_revision: Union[str, Sequence[str], None] = '238fc9ab4aa0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('points_buckets',
+    sa.Column('granularity', sa.String(length=8), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('bucket_start', sa.Date(), nullable=False),
+    sa.Column('points', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('granularity', 'user_id', 'bucket_start')
+    )
+    # Backfill from the existing ledger; user_id 0 holds the team-wide totals.
+    op.execute("""
+        INSERT INTO points_buckets (granularity, user_id, bucket_start, points)
+        SELECT g.granularity, u.user_id, date_trunc(g.granularity, timezone('UTC', l.created_at))::date, SUM(l.points)
+        FROM points_ledger l
+        CROSS JOIN (VALUES ('day'), ('week')) AS g(granularity)
+        CROSS JOIN LATERAL (VALUES (l.user_id), (0)) AS u(user_id)
+        GROUP BY 1, 2, 3
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('points_buckets')
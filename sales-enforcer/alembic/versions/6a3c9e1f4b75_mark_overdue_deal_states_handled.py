@@ -0,0 +1,31 @@
+"""Mark deal_states deadlines already past at rollout as handled
+
+Revision ID: 6a3c9e1f4b75
+Revises: 4d8f2b6e0a19
+Create Date: 2025-10-20 13:22:07.904316
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6a3c9e1f4b75'
+down_revision: Union[str, Sequence[str], None] = '4d8f2b6e0a19'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Rotting penalties were never applied before the mirror existed; deals that
+    # rotted before it was seeded aren't penalized retroactively. Moving the
+    # deal (or logging an activity) re-arms its deadline as usual.
+    op.execute("UPDATE deal_states SET rotted_at = now() WHERE rotted_at IS NULL AND rot_deadline <= now()")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Which rows were marked here isn't recorded; leaving them handled is the safe side.
+    pass
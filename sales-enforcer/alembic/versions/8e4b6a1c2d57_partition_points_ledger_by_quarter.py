@@ -0,0 +1,100 @@
+"""Partition points_ledger by quarter
+
+Revision ID: 8e4b6a1c2d57
+Revises: 5c1d2e7f9a30
+Create Date: 2025-09-15 09:41:03.551920
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8e4b6a1c2d57'
+down_revision: Union[str, Sequence[str], None] = '5c1d2e7f9a30'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Quarters created ahead of "now" by the migration; the maintenance task keeps this topped up.
+QUARTERS_AHEAD = 2
+
+COLUMNS = "id, deal_id, user_id, event_type, points, notes, created_at"
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("ALTER TABLE points_ledger RENAME TO points_ledger_unpartitioned")
+    for ix in ("deal_id", "id", "user_id"):
+        op.execute(f"ALTER INDEX ix_points_ledger_{ix} RENAME TO ix_points_ledger_unpartitioned_{ix}")
+    op.execute("ALTER TABLE points_ledger_unpartitioned RENAME CONSTRAINT points_ledger_pkey TO points_ledger_unpartitioned_pkey")
+    # Keep the id sequence alive when the old table is dropped.
+    op.execute("ALTER SEQUENCE points_ledger_id_seq OWNED BY NONE")
+
+    # The partition key must be part of the primary key.
+    op.execute("""
+        CREATE TABLE points_ledger (
+            id INTEGER NOT NULL DEFAULT nextval('points_ledger_id_seq'),
+            deal_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            event_type pointeventtype NOT NULL,
+            points INTEGER NOT NULL,
+            notes VARCHAR,
+            created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+            PRIMARY KEY (id, created_at)
+        ) PARTITION BY RANGE (created_at)
+    """)
+    op.execute("ALTER SEQUENCE points_ledger_id_seq OWNED BY points_ledger.id")
+
+    # One partition per quarter from the oldest row up to QUARTERS_AHEAD quarters from now.
+    op.execute(f"""
+        DO $$
+        DECLARE
+            q_start timestamptz := date_trunc('quarter', timezone('UTC', COALESCE((SELECT min(created_at) FROM points_ledger_unpartitioned), now()))) AT TIME ZONE 'UTC';
+            q_last  timestamptz := (date_trunc('quarter', timezone('UTC', now())) + interval '{3 * QUARTERS_AHEAD} months') AT TIME ZONE 'UTC';
+        BEGIN
+            WHILE q_start <= q_last LOOP
+                EXECUTE format(
+                    'CREATE TABLE IF NOT EXISTS %I PARTITION OF points_ledger FOR VALUES FROM (%L) TO (%L)',
+                    'points_ledger_y' || to_char(timezone('UTC', q_start), 'YYYY') || 'q' || to_char(timezone('UTC', q_start), 'Q'),
+                    q_start, q_start + interval '3 months'
+                );
+                q_start := q_start + interval '3 months';
+            END LOOP;
+        END $$;
+    """)
+
+    op.execute(f"""
+        INSERT INTO points_ledger ({COLUMNS})
+        SELECT id, deal_id, user_id, event_type, points, notes, COALESCE(created_at, now())
+        FROM points_ledger_unpartitioned
+    """)
+    op.drop_table('points_ledger_unpartitioned')
+
+    op.create_index(op.f('ix_points_ledger_deal_id'), 'points_ledger', ['deal_id'], unique=False)
+    op.create_index(op.f('ix_points_ledger_user_id'), 'points_ledger', ['user_id'], unique=False)
+    op.create_index(op.f('ix_points_ledger_created_at'), 'points_ledger', ['created_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("ALTER TABLE points_ledger RENAME TO points_ledger_partitioned")
+    op.execute("ALTER TABLE points_ledger_partitioned RENAME CONSTRAINT points_ledger_pkey TO points_ledger_partitioned_pkey")
+    op.execute("ALTER SEQUENCE points_ledger_id_seq OWNED BY NONE")
+    op.create_table('points_ledger',
+    sa.Column('id', sa.Integer(), server_default=sa.text("nextval('points_ledger_id_seq')"), nullable=False),
+    sa.Column('deal_id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('event_type', sa.Enum(name='pointeventtype', create_type=False), nullable=False),
+    sa.Column('points', sa.Integer(), nullable=False),
+    sa.Column('notes', sa.String(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.execute(f"INSERT INTO points_ledger ({COLUMNS}) SELECT {COLUMNS} FROM points_ledger_partitioned")
+    op.execute("DROP TABLE points_ledger_partitioned CASCADE")
+    op.execute("ALTER SEQUENCE points_ledger_id_seq OWNED BY points_ledger.id")
+    op.create_index(op.f('ix_points_ledger_deal_id'), 'points_ledger', ['deal_id'], unique=False)
+    op.create_index(op.f('ix_points_ledger_id'), 'points_ledger', ['id'], unique=False)
+    op.create_index(op.f('ix_points_ledger_user_id'), 'points_ledger', ['user_id'], unique=False)
@@ -0,0 +1,35 @@
+"""Sum the team points series at read time instead of storing it
+
+Revision ID: 9b2e4d7a1c63
+Revises: 3e8f1a6c9d52
+Create Date: 2025-10-20 09:41:18.552031
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9b2e4d7a1c63'
+down_revision: Union[str, Sequence[str], None] = '3e8f1a6c9d52'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # user_id 0 held the team-wide totals; they are now summed from the user rows.
+    op.execute("DELETE FROM points_buckets WHERE user_id = 0")
+    op.create_index('ix_points_buckets_granularity_bucket_start', 'points_buckets', ['granularity', 'bucket_start'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_points_buckets_granularity_bucket_start', table_name='points_buckets')
+    op.execute("""
+        INSERT INTO points_buckets (granularity, user_id, bucket_start, points)
+        SELECT granularity, 0, bucket_start, SUM(points)
+        FROM points_buckets
+        GROUP BY granularity, bucket_start
+    """)
@@ -0,0 +1,42 @@
+"""Add webhook_events log
+
+Revision ID: b7f03c9d4e12
+Revises: 8e4b6a1c2d57
+Create Date: 2025-09-22 14:05:37.918264
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7f03c9d4e12'
+down_revision: Union[str, Sequence[str], None] = '8e4b6a1c2d57'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('webhook_events',
+    sa.Column('id', sa.BigInteger(), nullable=False),
+    sa.Column('deal_id', sa.Integer(), nullable=True),
+    sa.Column('received_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.Column('payload', sa.LargeBinary(), nullable=False),
+    sa.Column('deal_snapshot', sa.LargeBinary(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_webhook_events_deal_id_received_at', 'webhook_events', ['deal_id', 'received_at'], unique=False)
+    op.create_index(op.f('ix_webhook_events_received_at'), 'webhook_events', ['received_at'], unique=False)
+    # Payloads are already zlib-compressed; skip TOAST's own compression attempt.
+    op.execute("ALTER TABLE webhook_events ALTER COLUMN payload SET STORAGE EXTERNAL")
+    op.execute("ALTER TABLE webhook_events ALTER COLUMN deal_snapshot SET STORAGE EXTERNAL")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_webhook_events_received_at'), table_name='webhook_events')
+    op.drop_index('ix_webhook_events_deal_id_received_at', table_name='webhook_events')
+    op.drop_table('webhook_events')
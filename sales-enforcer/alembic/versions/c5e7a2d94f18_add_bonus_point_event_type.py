@@ -0,0 +1,31 @@
+"""Add BONUS to the pointeventtype enum
+
+Revision ID: c5e7a2d94f18
+Revises: 6a3c9e1f4b75
+Create Date: 2025-10-20 14:05:41.218377
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c5e7a2d94f18'
+down_revision: Union[str, Sequence[str], None] = '6a3c9e1f4b75'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # PointEventType.BONUS was added to the model without a migration. A new enum
+    # value can't be used in the transaction that adds it, so commit it on its own.
+    with op.get_context().autocommit_block():
+        op.execute("ALTER TYPE pointeventtype ADD VALUE IF NOT EXISTS 'BONUS'")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Postgres can't drop a value from an enum, and BONUS rows may exist by now.
+    pass
@@ -0,0 +1,70 @@
+"""Add stage_dwell_sketches velocity histograms
+
+Revision ID: d2a91f6e7b38
+Revises: b7f03c9d4e12
+Create Date: 2025-09-29 09:41:12.530871
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd2a91f6e7b38'
+down_revision: Union[str, Sequence[str], None] = 'b7f03c9d4e12'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('stage_dwell_sketches',
+    sa.Column('metric', sa.String(length=8), nullable=False),
+    sa.Column('stage_id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('month', sa.Date(), nullable=False),
+    sa.Column('bucket', sa.Integer(), nullable=False),
+    sa.Column('count', sa.BigInteger(), nullable=False),
+    sa.Column('total_seconds', sa.Float(), nullable=False),
+    sa.PrimaryKeyConstraint('metric', 'stage_id', 'user_id', 'month', 'bucket')
+    )
+    # Backfill from the existing stage history (LEAD over each deal's events).
+    # Frozen copy of velocity.REBUILD_SQL as of this revision: GAMMA 1.1,
+    # close sketches under stage_id 0, user_id 0 for the team.
+    op.execute("""
+        WITH owners AS (
+            SELECT DISTINCT ON (deal_id) deal_id, user_id
+            FROM points_ledger ORDER BY deal_id, created_at
+        ),
+        timeline AS (
+            SELECT deal_id, stage_id, entered_at,
+                   LEAD(entered_at) OVER (PARTITION BY deal_id ORDER BY entered_at) AS left_at,
+                   MIN(entered_at) OVER (PARTITION BY deal_id) AS first_entered_at
+            FROM deal_stage_events
+        ),
+        durations AS (
+            SELECT 'dwell' AS metric, t.stage_id, o.user_id, t.left_at AS ended_at,
+                   GREATEST(extract(epoch FROM t.left_at - t.entered_at), 0) AS secs
+            FROM timeline t JOIN owners o USING (deal_id)
+            WHERE t.left_at IS NOT NULL
+            UNION ALL
+            SELECT 'close', 0, w.user_id, w.created_at,
+                   GREATEST(extract(epoch FROM w.created_at - f.first_entered_at), 0)
+            FROM points_ledger w
+            JOIN (SELECT DISTINCT deal_id, first_entered_at FROM timeline) f USING (deal_id)
+            WHERE w.notes = 'Deal WON'
+        )
+        INSERT INTO stage_dwell_sketches (metric, stage_id, user_id, month, bucket, count, total_seconds)
+        SELECT d.metric, d.stage_id, u.user_id, date_trunc('month', timezone('UTC', d.ended_at))::date,
+               CASE WHEN secs <= 1 THEN 0 ELSE ceil(ln(secs) / ln(1.1))::int END, COUNT(*), SUM(secs)
+        FROM durations d
+        CROSS JOIN LATERAL (VALUES (d.user_id), (0)) AS u(user_id)
+        GROUP BY 1, 2, 3, 4, 5
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('stage_dwell_sketches')
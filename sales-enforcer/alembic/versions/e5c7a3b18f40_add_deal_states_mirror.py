@@ -0,0 +1,43 @@
+"""Add deal_states mirror for local rotting detection
+
+Revision ID: e5c7a3b18f40
+Revises: d2a91f6e7b38
+Create Date: 2025-10-02 11:23:05.146392
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5c7a3b18f40'
+down_revision: Union[str, Sequence[str], None] = 'd2a91f6e7b38'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('deal_states',
+    sa.Column('deal_id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('owner_id', sa.Integer(), nullable=True),
+    sa.Column('stage_id', sa.Integer(), nullable=True),
+    sa.Column('status', sa.String(length=16), nullable=True),
+    sa.Column('stage_change_time', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('last_activity_date', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('rot_deadline', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('rotted_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.PrimaryKeyConstraint('deal_id')
+    )
+    op.create_index(op.f('ix_deal_states_owner_id'), 'deal_states', ['owner_id'], unique=False)
+    op.create_index('ix_deal_states_pending_rot_deadline', 'deal_states', ['rot_deadline'], unique=False, postgresql_where=sa.text('rotted_at IS NULL'))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_deal_states_pending_rot_deadline', table_name='deal_states', postgresql_where=sa.text('rotted_at IS NULL'))
+    op.drop_index(op.f('ix_deal_states_owner_id'), table_name='deal_states')
+    op.drop_table('deal_states')
@@ -0,0 +1,89 @@
+"""Add user_activity_calendars for streaks and weekly minimums
+
+Revision ID: f1b6d8e2a947
+Revises: e5c7a3b18f40
+Create Date: 2025-10-06 16:08:52.771204
+
+"""
+from datetime import datetime, timedelta, timezone
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f1b6d8e2a947'
+down_revision: Union[str, Sequence[str], None] = 'e5c7a3b18f40'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Frozen copies of activity_calendar.CALENDAR_WEEKS and
+# config.POINT_CONFIG["weekly_minimum"] as of this revision.
+CALENDAR_WEEKS = 13
+WEEKLY_MINIMUM = 150
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('user_activity_calendars',
+    sa.Column('user_id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('start_day', sa.Date(), nullable=False),
+    sa.Column('daily_points', postgresql.ARRAY(sa.Integer()), nullable=False),
+    sa.Column('streak_weeks', sa.Integer(), nullable=False),
+    sa.Column('streak_through', sa.Date(), nullable=True),
+    sa.Column('below_minimum_week', sa.Date(), nullable=True),
+    sa.Column('closed_week', sa.Date(), nullable=True),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+    # Backfill the current window from the ledger and replay its weekly closes
+    # (activity_calendar.rebuild_calendars as of this revision).
+    today = datetime.now(timezone.utc).date()
+    this_week = today - timedelta(days=today.weekday())
+    start_day = this_week - timedelta(weeks=CALENDAR_WEEKS - 1)
+    bind = op.get_bind()
+    bind.execute(sa.text("""
+        INSERT INTO user_activity_calendars (user_id, start_day, daily_points, streak_weeks)
+        SELECT u.user_id, CAST(:start_day AS date), array_agg(COALESCE(d.points, 0) ORDER BY gs.i), 0
+        FROM (SELECT DISTINCT user_id FROM points_ledger) u
+        CROSS JOIN generate_series(0, :days - 1) AS gs(i)
+        LEFT JOIN (
+            SELECT user_id, timezone('UTC', created_at)::date AS day, SUM(points)::int AS points
+            FROM points_ledger
+            WHERE created_at >= CAST(:start_day AS date)
+            GROUP BY 1, 2
+        ) d ON d.user_id = u.user_id AND d.day = CAST(:start_day AS date) + gs.i
+        GROUP BY u.user_id
+    """), {"start_day": start_day, "days": CALENDAR_WEEKS * 7})
+    close_week = sa.text("""
+        WITH totals AS (
+            SELECT user_id,
+                   COALESCE((
+                       SELECT SUM(x) FROM unnest(daily_points[(CAST(:week AS date) - start_day) + 1:(CAST(:week AS date) - start_day) + 7]) AS x
+                   ), 0) AS points
+            FROM user_activity_calendars
+            WHERE closed_week IS DISTINCT FROM CAST(:week AS date)
+            FOR UPDATE
+        )
+        UPDATE user_activity_calendars c
+        SET streak_weeks = CASE
+                WHEN t.points < :minimum THEN 0
+                WHEN c.streak_through = CAST(:week AS date) - 7 THEN c.streak_weeks + 1
+                ELSE 1
+            END,
+            streak_through = CASE WHEN t.points >= :minimum THEN CAST(:week AS date) ELSE c.streak_through END,
+            below_minimum_week = CASE WHEN t.points < :minimum THEN CAST(:week AS date) ELSE c.below_minimum_week END,
+            closed_week = CAST(:week AS date)
+        FROM totals t
+        WHERE t.user_id = c.user_id
+    """)
+    week = start_day
+    while week < this_week:
+        bind.execute(close_week, {"week": week, "minimum": WEEKLY_MINIMUM})
+        week += timedelta(weeks=1)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('user_activity_calendars')
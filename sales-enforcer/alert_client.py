@@ -1,16 +1,17 @@
 # sales-enforcer/alert_client.py
-import os
+import logging
 import requests
-from dotenv import load_dotenv
 
-load_dotenv()
+import settings
 
-ZAPIER_WEBHOOK_URL_DEAL_WON = os.getenv("ZAPIER_WEBHOOK_URL_DEAL_WON")
-ZAPIER_WEBHOOK_URL_MILESTONE = os.getenv("ZAPIER_WEBHOOK_URL_MILESTONE")
+ZAPIER_WEBHOOK_URL_DEAL_WON = settings.ZAPIER_WEBHOOK_URL_DEAL_WON
+ZAPIER_WEBHOOK_URL_MILESTONE = settings.ZAPIER_WEBHOOK_URL_MILESTONE
+
+logger = logging.getLogger(__name__)
 
 def trigger_won_deal_alert(deal_data: dict, user_data: dict):
     if not ZAPIER_WEBHOOK_URL_DEAL_WON:
-        print("ZAPIER_WEBHOOK_URL_DEAL_WON is not set. Skipping.")
+        logger.warning("ZAPIER_WEBHOOK_URL_DEAL_WON is not set. Skipping.")
         return
 
     try:
@@ -20,13 +21,13 @@ def trigger_won_deal_alert(deal_data: dict, user_data: dict):
             "rep_name": user_data.get("name"),
         }
         requests.post(ZAPIER_WEBHOOK_URL_DEAL_WON, json=payload, timeout=5)
-        print(f"Successfully triggered Zapier 'Deal WON' alert for deal {deal_data['id']}.")
+        logger.info(f"Successfully triggered Zapier 'Deal WON' alert for deal {deal_data['id']}.")
     except Exception as e:
-        print(f"Failed to trigger Zapier webhook: {e}")
+        logger.error(f"Failed to trigger Zapier webhook: {e}")
 
 def trigger_milestone_alert(user_data: dict, milestone_rank: str):
     if not ZAPIER_WEBHOOK_URL_MILESTONE:
-        print("ZAPIER_WEBHOOK_URL_MILESTONE is not set. Skipping.")
+        logger.warning("ZAPIER_WEBHOOK_URL_MILESTONE is not set. Skipping.")
         return
 
     try:
@@ -35,6 +36,6 @@ def trigger_milestone_alert(user_data: dict, milestone_rank: str):
             "rank": milestone_rank,
         }
         requests.post(ZAPIER_WEBHOOK_URL_MILESTONE, json=payload, timeout=5)
-        print(f"Successfully triggered Zapier 'Milestone' alert for {user_data.get('name')}.")
+        logger.info(f"Successfully triggered Zapier 'Milestone' alert for {user_data.get('name')}.")
     except Exception as e:
-        print(f"Failed to trigger Zapier milestone webhook: {e}")
\ No newline at end of file
+        logger.error(f"Failed to trigger Zapier milestone webhook: {e}")
\ No newline at end of file
@@ -0,0 +1,101 @@
+# sales-enforcer/benchmarks/bench_records_memory.py
+"""
+Memory benchmark: raw Pipedrive dicts vs projected records for a pipeline pull.
+
+Serializes a synthetic pipeline of deals (each with a few hundred custom-field
+keys, like the real account) into 500-deal response pages, then "pulls" them
+the old way (json.loads, keep every dict) and the new way (records.decode_page).
+Each mode runs in a fresh subprocess so peak RSS is measured independently.
+
+Run from the sales-enforcer directory:
+    python -m benchmarks.bench_records_memory [--deals 10000] [--custom-fields 300]
+"""
+import argparse
+import hashlib
+import json
+import random
+import resource
+import subprocess
+import sys
+import time
+
+PAGE_SIZE = 500
+
+def build_pages(n_deals: int, n_custom_fields: int, seed: int = 7):
+    from records import DEAL_CUSTOM_FIELDS
+
+    rng = random.Random(seed)
+    # Real keys are 40-char hashes; include the configured ones so projection has work to do.
+    noise_keys = [hashlib.sha1(str(i).encode()).hexdigest() for i in range(n_custom_fields)]
+    keys = list(DEAL_CUSTOM_FIELDS) + noise_keys[: max(0, n_custom_fields - len(DEAL_CUSTOM_FIELDS))]
+    pages = []
+    for start in range(0, n_deals, PAGE_SIZE):
+        data = []
+        for i in range(start, min(start + PAGE_SIZE, n_deals)):
+            deal = {
+                "id": i, "title": f"Deal {i}", "status": "open", "stage_id": rng.choice([90, 91, 92, 93, 94, 95]),
+                "pipeline_id": 11, "user_id": {"id": 1000 + i % 25, "name": f"Rep {i % 25}", "email": f"rep{i % 25}@example.com"},
+                "value": rng.randrange(1000, 90000), "currency": "AED",
+                "add_time": "2025-07-01 10:00:00", "stage_change_time": "2025-07-10 10:00:00",
+                "last_activity_date": "2025-07-12", "update_time": "2025-07-12 09:00:00",
+            }
+            for k in keys:
+                deal[k] = rng.choice([None, "", str(rng.randrange(1, 100)), f"free text value {rng.random()}"])
+            data.append(deal)
+        more = start + PAGE_SIZE < n_deals
+        pages.append(json.dumps({"success": True, "data": data, "additional_data": {"pagination": {"more_items_in_collection": more}}}).encode())
+    return pages
+
+def pull_raw(pages):
+    all_deals = []
+    for content in pages:
+        all_deals.extend(json.loads(content).get("data", []))
+    return all_deals
+
+def pull_records(pages):
+    from records import DealRecord, decode_page
+
+    all_deals = []
+    for content in pages:
+        data, _ = decode_page(content, DealRecord)
+        all_deals.extend(data)
+    return all_deals
+
+def peak_rss_mb() -> float:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS reports bytes.
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+def run_child(mode: str, n_deals: int, n_custom_fields: int):
+    pages = build_pages(n_deals, n_custom_fields)
+    baseline = peak_rss_mb()
+    started = time.perf_counter()
+    deals = (pull_raw if mode == "raw" else pull_records)(pages)
+    elapsed = time.perf_counter() - started
+    del pages
+    print(json.dumps({"mode": mode, "deals": len(deals), "baseline_mb": baseline, "peak_mb": peak_rss_mb(), "seconds": elapsed}))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--deals", type=int, default=10_000)
+    parser.add_argument("--custom-fields", type=int, default=300)
+    parser.add_argument("--child", choices=["raw", "records"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child, args.deals, args.custom_fields)
+        return
+
+    print(f"Pipeline pull: {args.deals} deals x {args.custom_fields} custom fields")
+    for mode in ("raw", "records"):
+        out = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_records_memory", "--child", mode,
+             "--deals", str(args.deals), "--custom-fields", str(args.custom_fields)],
+            check=True, capture_output=True, text=True,
+        ).stdout
+        r = json.loads(out)
+        print(f"{mode:>8}: peak RSS {r['peak_mb']:7.1f} MB (+{r['peak_mb'] - r['baseline_mb']:6.1f} MB over fixture), "
+              f"{r['seconds'] * 1000:7.1f} ms")
+
+if __name__ == "__main__":
+    main()
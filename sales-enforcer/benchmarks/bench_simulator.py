@@ -0,0 +1,107 @@
+# sales-enforcer/benchmarks/bench_simulator.py
+"""
+Benchmark: what-if simulator latency for a batch of candidates.
+
+Builds the simulator's column arrays from benchmarks/seed_data.generate rows,
+or with --db loads them through simulator.load_dataset from a database seeded
+by benchmarks/seed_data.py, then times one score_candidates call (what POST
+/api/simulate does after its first, dataset-loading request) per repeat.
+Exits non-zero if the median call is over --budget-ms; the target is
+sub-second for 100k events.
+
+Run from the sales-enforcer directory:
+    python -m benchmarks.bench_simulator [--scale 100k] [--candidates 20] [--repeat 5] [--db]
+"""
+import argparse
+import random
+import statistics
+import sys
+import time
+from collections import namedtuple
+from datetime import datetime, timezone
+
+import config
+import simulator
+from benchmarks.seed_data import SCALES, generate
+from funnel import WON_NOTE
+from models import PointEventType
+
+StageRow = namedtuple("StageRow", "stage_id ts user_id")
+WonRow = namedtuple("WonRow", "deal_id user_id ts first_stage_ts")
+AdjRow = namedtuple("AdjRow", "user_id points ts")
+
+def synthetic_dataset(rows: int, users: int, days: int, seed: int) -> simulator.SimulationDataset:
+    """The rows load_dataset would read back after seed_data loaded the same generator output."""
+    owners, first_stage, stage_events = {}, {}, []
+    won_rows, adj_rows = [], []
+    for kind, row in generate(rows, users, days, seed, now=datetime(2026, 1, 1, tzinfo=timezone.utc)):
+        if kind == "stage":
+            deal_id, stage_id, at = row
+            ts = datetime.fromisoformat(at).timestamp()
+            first_stage.setdefault(deal_id, ts)
+            stage_events.append((deal_id, stage_id, ts))
+            continue
+        deal_id, owner, event_type, points, notes, at = row
+        owners.setdefault(deal_id, owner)
+        ts = datetime.fromisoformat(at).timestamp()
+        if notes == WON_NOTE:
+            won_rows.append(WonRow(deal_id, owner, ts, first_stage.get(deal_id)))
+        elif event_type not in (PointEventType.STAGE_ADVANCE.name, PointEventType.BONUS.name):
+            adj_rows.append(AdjRow(owner, points, ts))
+    stage_rows = [StageRow(stage_id, ts, owners[deal_id]) for deal_id, stage_id, ts in stage_events]
+    return simulator.build_dataset(stage_rows, won_rows, adj_rows, {})
+
+def candidates(n: int, seed: int):
+    rng = random.Random(seed)
+    stage_ids = [sid for sid, s in config.STAGES.items() if s["points"]]
+    return [{
+        "name": f"candidate-{i}",
+        "stages": {str(sid): rng.randrange(5, 200) for sid in rng.sample(stage_ids, k=min(3, len(stage_ids)))},
+        "won_deal_points": rng.randrange(50, 300),
+        "bonus_won_fast_days": rng.randrange(7, 45),
+        "bonus_won_fast_points": rng.randrange(0, 100),
+    } for i in range(n)]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", choices=list(SCALES), default="100k")
+    parser.add_argument("--users", type=int, default=25)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--candidates", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=1000.0)
+    parser.add_argument("--db", action="store_true", help="Load the dataset from DATABASE_URL instead of generating it.")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    if args.db:
+        from database import SessionLocal
+
+        db = SessionLocal()
+        try:
+            ds = simulator.load_dataset(db)
+        finally:
+            db.close()
+    else:
+        ds = synthetic_dataset(SCALES[args.scale], args.users, args.days, args.seed)
+    load_ms = (time.perf_counter() - started) * 1000
+    events = len(ds.ev_time) + len(ds.won_time) + len(ds.adj_time)
+
+    batch = candidates(args.candidates, args.seed)
+    timings = []
+    for _ in range(args.repeat):
+        started = time.perf_counter()
+        simulator.score_candidates(ds, batch)
+        timings.append((time.perf_counter() - started) * 1000)
+    median = statistics.median(timings)
+
+    print(f"dataset: {events} events, {len(ds.user_ids)} users, loaded in {load_ms:.0f} ms")
+    print(f"{args.candidates} candidates: median {median:.1f} ms, min {min(timings):.1f} ms, max {max(timings):.1f} ms")
+    if median > args.budget_ms:
+        print(f"FAIL: median {median:.1f} ms is over the {args.budget_ms:.0f} ms budget")
+        sys.exit(1)
+    print(f"OK: within the {args.budget_ms:.0f} ms budget")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+# sales-enforcer/benchmarks/bench_timestamps.py
+"""
+Micro-benchmark: legacy per-field timestamp parsing vs utils.timestamps.
+
+Builds a synthetic fixture of 50k Pipedrive-shaped activities (and one deal per
+10 activities) and times the parsing work the routers do on them.
+
+Run from the sales-enforcer directory:
+    python -m benchmarks.bench_timestamps [--activities 50000] [--repeat 5]
+"""
+import argparse
+import random
+import timeit
+from datetime import datetime, timedelta, timezone
+
+from utils import ensure_timezone_aware
+from utils.timestamps import ActivityTimes, DealTimes, parse_datetimes, _parse_date, _parse_datetime
+
+def build_fixture(n_activities: int, seed: int = 42):
+    rng = random.Random(seed)
+    base = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    activities, deals = [], []
+    for i in range(n_activities):
+        added = base + timedelta(seconds=rng.randrange(0, 180 * 86400))
+        done = added + timedelta(seconds=rng.randrange(0, 7 * 86400))
+        activities.append({
+            "id": i,
+            "add_time": added.strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "marked_as_done_time": done.strftime("%Y-%m-%d %H:%M:%S") if rng.random() < 0.6 else "",
+            "due_date": (added + timedelta(days=rng.randrange(0, 30))).strftime("%Y-%m-%d"),
+        })
+    for i in range(n_activities // 10):
+        added = base + timedelta(seconds=rng.randrange(0, 180 * 86400))
+        deals.append({
+            "id": i,
+            "add_time": added.strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "won_time": (added + timedelta(days=rng.randrange(1, 60))).strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "stage_change_time": (added + timedelta(days=rng.randrange(0, 20))).strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "last_activity_date": (added + timedelta(days=rng.randrange(0, 20))).strftime("%Y-%m-%d"),
+        })
+    return activities, deals
+
+def legacy(activities, deals):
+    for act in activities:
+        if act.get("marked_as_done_time"):
+            ensure_timezone_aware(datetime.strptime(act["marked_as_done_time"], "%Y-%m-%d %H:%M:%S"))
+        elif act.get("add_time"):
+            ensure_timezone_aware(datetime.fromisoformat(act["add_time"].replace("Z", "+00:00")))
+        if act.get("due_date"):
+            datetime.strptime(act["due_date"], "%Y-%m-%d").date()
+    for deal in deals:
+        # The dashboard parsed won_time twice per deal (filter + average).
+        ensure_timezone_aware(datetime.fromisoformat(deal["won_time"].replace("Z", "+00:00")))
+        ensure_timezone_aware(datetime.fromisoformat(deal["add_time"].replace("Z", "+00:00")))
+        ensure_timezone_aware(datetime.fromisoformat(deal["won_time"].replace("Z", "+00:00")))
+        ensure_timezone_aware(datetime.fromisoformat(deal["stage_change_time"].replace("Z", "+00:00")))
+        ensure_timezone_aware(datetime.strptime(deal["last_activity_date"], "%Y-%m-%d"))
+
+def fast(activities, deals):
+    for act in activities:
+        ActivityTimes(act).display_time
+    for deal in deals:
+        DealTimes(deal).days_to_win
+
+def fast_vectorized(activities, deals):
+    parse_datetimes([a.get("marked_as_done_time") or a.get("add_time") for a in activities])
+    parse_datetimes([a.get("due_date") for a in activities])
+    for deal in deals:
+        DealTimes(deal).days_to_win
+
+def clear_caches():
+    _parse_datetime.cache_clear()
+    _parse_date.cache_clear()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--activities", type=int, default=50_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    activities, deals = build_fixture(args.activities)
+    print(f"Fixture: {len(activities)} activities, {len(deals)} deals, best of {args.repeat} runs")
+
+    results = {}
+    for name, fn in (("legacy", legacy), ("fast", fast), ("fast_vectorized", fast_vectorized)):
+        # Caches are cleared before every run so memoization only helps within a run.
+        results[name] = min(timeit.repeat(lambda: fn(activities, deals), setup=clear_caches, number=1, repeat=args.repeat))
+        print(f"{name:>16}: {results[name] * 1000:8.1f} ms")
+    print(f"{'speedup':>16}: {results['legacy'] / results['fast']:8.1f}x (fast), "
+          f"{results['legacy'] / results['fast_vectorized']:.1f}x (vectorized)")
+
+if __name__ == "__main__":
+    main()
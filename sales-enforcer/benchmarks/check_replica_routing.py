@@ -0,0 +1,86 @@
+# sales-enforcer/benchmarks/check_replica_routing.py
+"""
+Smoke check for read-replica routing (see docker-compose.replica.yml).
+
+Writes a marker row into a scratch table on the primary, then polls the
+replica until it shows up, printing the measured lag and which database
+`get_db` routed to each time. Finishes by checking that the replica session
+refuses writes, then drops the scratch table. No application table is touched.
+
+Run from the sales-enforcer directory:
+    python -m benchmarks.check_replica_routing [--timeout 30]
+"""
+import argparse
+import time
+from datetime import datetime, timezone
+
+from sqlalchemy import text
+
+import database
+from models import ExportWatermark
+
+# A real (not temporary) table: temporary tables aren't replicated.
+MARKER_TABLE = "replica_routing_check"
+
+def _replicated_marker(conn):
+    # The CREATE TABLE itself may not have been replayed yet.
+    if conn.execute(text("SELECT to_regclass(:name)"), {"name": MARKER_TABLE}).scalar() is None:
+        return None
+    return conn.execute(text(f"SELECT max(marker) FROM {MARKER_TABLE}")).scalar()
+
+def _check(marker: int, written_at: float, timeout: float):
+    """(marker replicated within timeout, replica session refused a write)."""
+    seen = False
+    while time.monotonic() - written_at < timeout:
+        deps = database.get_db()
+        db = next(deps)
+        try:
+            target = "replica" if db.get_bind() is database.replica_engine else "primary"
+            with database.replica_engine.connect() as conn:
+                replicated = _replicated_marker(conn)
+        finally:
+            deps.close()
+        seen = replicated == marker
+        print(f"t+{time.monotonic() - written_at:5.2f}s lag={database.replica_lag_seconds()} "
+              f"get_db -> {target} replicated={seen}")
+        if seen:
+            break
+        time.sleep(0.5)
+
+    # The guard fires at flush, before any SQL, so the pending row never reaches the replica.
+    read_only_ok = False
+    with database.ReadSessionLocal() as db:
+        db.add(ExportWatermark(table_name=MARKER_TABLE, last_id=0, exported_at=datetime.now(timezone.utc)))
+        try:
+            db.flush()
+        except RuntimeError:
+            read_only_ok = True
+    return seen, read_only_ok
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    args = parser.parse_args()
+
+    if database.replica_engine is None:
+        raise SystemExit("REPLICA_DATABASE_URL is not set.")
+    # Measure on every call instead of using the cached value.
+    database.REPLICA_LAG_CHECK_SECONDS = 0
+
+    marker = int(time.time())
+    with database.engine.begin() as conn:
+        conn.execute(text(f"CREATE TABLE IF NOT EXISTS {MARKER_TABLE} (marker bigint NOT NULL)"))
+        conn.execute(text(f"INSERT INTO {MARKER_TABLE} (marker) VALUES (:marker)"), {"marker": marker})
+    written_at = time.monotonic()
+    try:
+        seen, read_only_ok = _check(marker, written_at, args.timeout)
+    finally:
+        with database.engine.begin() as conn:
+            conn.execute(text(f"DROP TABLE IF EXISTS {MARKER_TABLE}"))
+
+    print(f"replicated={seen} read_only_guard={read_only_ok}")
+    if not (seen and read_only_ok):
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
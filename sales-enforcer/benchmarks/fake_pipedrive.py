@@ -0,0 +1,368 @@
+# sales-enforcer/benchmarks/fake_pipedrive.py
+"""
+Local fake of the Pipedrive endpoints the API calls, for benchmarks.
+
+Serves a deterministic synthetic account (users, stages, deals with a few
+hundred custom-field keys, activities) in the real response shapes:
+
+- v1 (/v1/deals, /v1/deals/{id}/activities): offset pagination via
+  additional_data.pagination (start, limit, more_items_in_collection, next_start).
+- v2 (/api/v2/deals, /api/v2/activities): cursor pagination via
+  additional_data.next_cursor, with the sort orders the client relies on.
+- /v1/users, /v1/users/{id}, /v1/stages, /v1/deals/{id}.
+
+Every request waits `latency_ms` (+/- `jitter_ms`); beyond `rate_limit`
+requests per second (token bucket of `burst`) it answers 429 with
+Retry-After, and `error_rate` of requests fail with 503. Calls are counted
+per endpoint: GET /__stats returns the counts, POST /__reset clears them.
+
+Point the API at it with PIPEDRIVE_API_HOST=http://127.0.0.1:<port>.
+Run from the sales-enforcer directory:
+    python -m benchmarks.fake_pipedrive [--port 8765] [--deals 5000] [--activities 20000] [--latency-ms 150]
+"""
+import argparse
+import base64
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+import config
+from records import DEAL_CUSTOM_FIELDS
+
+@dataclass
+class FakeConfig:
+    users: int = 25
+    deals: int = 5_000
+    activities: int = 20_000
+    custom_fields: int = 300
+    latency_ms: float = 150.0
+    jitter_ms: float = 50.0
+    rate_limit: float = 0.0  # requests per second; 0 disables
+    burst: int = 20
+    error_rate: float = 0.0
+    seed: int = 42
+
+# --- Synthetic account ---
+
+def _v1_time(ts: datetime) -> str:
+    return ts.strftime("%Y-%m-%d %H:%M:%S")
+
+def _v2_time(ts: datetime) -> str:
+    return ts.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+def _encode_cursor(offset: int) -> str:
+    return base64.urlsafe_b64encode(str(offset).encode()).decode()
+
+def _decode_cursor(cursor: Optional[str]) -> int:
+    return int(base64.urlsafe_b64decode(cursor.encode()).decode()) if cursor else 0
+
+class FakeAccount:
+    """Deals and activities are serialized once; pages are joined from the pre-encoded items."""
+    def __init__(self, cfg: FakeConfig, now: Optional[datetime] = None):
+        rng = random.Random(cfg.seed)
+        now = (now or datetime.now(timezone.utc)).replace(microsecond=0)
+        stage_ids = [sid for sid, _ in sorted(config.STAGES.items(), key=lambda kv: kv[1]["order"])]
+        noise_keys = [hashlib.sha1(str(i).encode()).hexdigest() for i in range(cfg.custom_fields)]
+        custom_keys = list(DEAL_CUSTOM_FIELDS) + noise_keys[: max(0, cfg.custom_fields - len(DEAL_CUSTOM_FIELDS))]
+        loss_key = config.DASHBOARD_CONFIG["field_keys"]["loss_reason"]
+
+        self.users = [
+            {"id": 1000 + i, "name": f"Rep {i}", "email": f"rep{i}@example.com", "active_flag": i % 10 != 9,
+             "icon_url": f"https://example.com/avatars/{1000 + i}.png"}
+            for i in range(cfg.users)
+        ]
+        self.users_by_id = {u["id"]: u for u in self.users}
+        self.stages = [
+            {"id": sid, "name": config.STAGES[sid]["name"], "order_nr": config.STAGES[sid]["order"],
+             "pipeline_id": config.SALES_FLOW_PIPELINE_ID, "rotten_days": config.STAGES[sid]["rot_days"]}
+            for sid in stage_ids
+        ]
+
+        # (deal meta for filtering, v1 JSON, v2 JSON)
+        self.deals: List[Tuple[dict, bytes, bytes]] = []
+        for i in range(cfg.deals):
+            owner = self.users[rng.randrange(cfg.users)]
+            added = now - timedelta(seconds=rng.randrange(0, 180 * 86400))
+            stage_changed = min(now, added + timedelta(hours=rng.randrange(0, 20 * 24)))
+            status = rng.choices(["open", "won", "lost"], weights=[70, 15, 15])[0]
+            won = min(now, added + timedelta(days=rng.randrange(1, 60))) if status == "won" else None
+            lost = min(now, added + timedelta(days=rng.randrange(1, 60))) if status == "lost" else None
+            custom = {k: rng.choice([None, "", str(rng.randrange(1, 100)), f"free text value {rng.random()}"]) for k in custom_keys}
+            if status == "lost":
+                custom[loss_key] = rng.choice(["Budget", "Timing", "Competitor", "No response"])
+            base = {
+                "id": i + 1, "title": f"Deal {i + 1}", "status": status, "stage_id": rng.choice(stage_ids),
+                "pipeline_id": config.SALES_FLOW_PIPELINE_ID, "value": rng.randrange(1000, 90000), "currency": "AED",
+            }
+            times = {"add_time": added, "update_time": stage_changed, "stage_change_time": stage_changed,
+                     "won_time": won, "lost_time": lost}
+            last_activity = (stage_changed - timedelta(days=rng.randrange(0, 10))).date().isoformat()
+            v1 = {**base, **{k: _v1_time(v) if v else None for k, v in times.items()},
+                  "user_id": {"id": owner["id"], "name": owner["name"], "email": owner["email"]},
+                  "owner_name": owner["name"], "last_activity_date": last_activity, **custom}
+            v2 = {**base, **{k: _v2_time(v) if v else None for k, v in times.items()},
+                  "owner_id": owner["id"], "last_activity_date": last_activity, "custom_fields": custom}
+            meta = {"id": i + 1, "status": status, "owner_id": owner["id"], "added": added, "won": won}
+            self.deals.append((meta, json.dumps(v1).encode(), json.dumps(v2).encode()))
+        self.deals_by_id = {meta["id"]: (meta, v1, v2) for meta, v1, v2 in self.deals}
+        # v2 /deals is requested sorted by add_time desc.
+        self.deals_by_add_desc = sorted(self.deals, key=lambda d: (d[0]["added"], d[0]["id"]), reverse=True)
+
+        self.activities: List[Tuple[dict, bytes]] = []
+        self.activities_by_deal: Dict[int, List[Tuple[dict, bytes]]] = {}
+        types = ["call", "meeting", "task", "email"]
+        for i in range(cfg.activities):
+            owner = self.users[rng.randrange(cfg.users)]
+            deal_id = rng.randrange(1, cfg.deals + 1) if cfg.deals else None
+            added = now - timedelta(seconds=rng.randrange(0, 120 * 86400))
+            due = (now + timedelta(days=rng.randrange(-60, 30))).date()
+            done = rng.random() < 0.5
+            item = {
+                "id": i + 1, "subject": f"Follow up {i + 1}", "type": rng.choice(types), "done": done,
+                "due_date": due.isoformat(), "due_time": f"{rng.randrange(8, 18):02d}:00",
+                "owner_id": owner["id"], "user_id": owner["id"], "owner_name": owner["name"],
+                "deal_id": deal_id, "deal_title": f"Deal {deal_id}" if deal_id else None,
+                "add_time": _v1_time(added), "update_time": _v1_time(added),
+                "marked_as_done_time": _v1_time(min(now, added + timedelta(hours=rng.randrange(1, 72)))) if done else "",
+            }
+            meta = {"id": i + 1, "done": done, "owner_id": owner["id"], "due_date": item["due_date"], "deal_id": deal_id}
+            entry = (meta, json.dumps(item).encode())
+            self.activities.append(entry)
+            if deal_id:
+                self.activities_by_deal.setdefault(deal_id, []).append(entry)
+        # v2 /activities is requested sorted by due_date asc.
+        self.activities.sort(key=lambda a: (a[0]["due_date"], a[0]["id"]))
+        for items in self.activities_by_deal.values():
+            items.sort(key=lambda a: a[0]["id"], reverse=True)
+
+# --- Responses ---
+
+def _page(items: List[bytes], additional_data: dict) -> bytes:
+    return b'{"success":true,"data":[' + b",".join(items) + b'],"additional_data":' + json.dumps(additional_data).encode() + b"}"
+
+def _one(data) -> bytes:
+    return json.dumps({"success": True, "data": data}).encode()
+
+def _arg(query: dict, name: str, default=None):
+    values = query.get(name)
+    return values[0] if values else default
+
+def _bool_arg(query: dict, name: str) -> Optional[bool]:
+    value = _arg(query, name)
+    return None if value is None else value.lower() in ("1", "true")
+
+def _v1_page(entries: list, query: dict, default_limit: int = 100) -> bytes:
+    start = int(_arg(query, "start", 0))
+    limit = min(int(_arg(query, "limit", default_limit)), 500)
+    chunk = entries[start:start + limit]
+    more = start + limit < len(entries)
+    return _page(chunk, {"pagination": {"start": start, "limit": limit, "more_items_in_collection": more,
+                                        "next_start": start + limit if more else None}})
+
+def _v2_page(entries: list, query: dict) -> bytes:
+    offset = _decode_cursor(_arg(query, "cursor"))
+    limit = min(int(_arg(query, "limit", 100)), 500)
+    chunk = entries[offset:offset + limit]
+    more = offset + limit < len(entries)
+    return _page(chunk, {"next_cursor": _encode_cursor(offset + limit) if more else None})
+
+ROUTES = [
+    ("v1/users/{id}", re.compile(r"^/v1/users/(\d+)$")),
+    ("v1/users", re.compile(r"^/v1/users$")),
+    ("v1/stages", re.compile(r"^/v1/stages$")),
+    ("v1/deals/{id}/activities", re.compile(r"^/v1/deals/(\d+)/activities$")),
+    ("v1/deals/{id}", re.compile(r"^/v1/deals/(\d+)$")),
+    ("v1/deals", re.compile(r"^/v1/deals$")),
+    ("v2/deals", re.compile(r"^/api/v2/deals$")),
+    ("v2/activities", re.compile(r"^/api/v2/activities$")),
+]
+
+def respond(account: FakeAccount, route: str, match, query: dict) -> Tuple[int, bytes]:
+    if route == "v1/users":
+        return 200, _one(account.users)
+    if route == "v1/users/{id}":
+        user = account.users_by_id.get(int(match.group(1)))
+        return (200, _one(user)) if user else (404, _one(None))
+    if route == "v1/stages":
+        return 200, _one(account.stages)
+    if route == "v1/deals/{id}":
+        deal = account.deals_by_id.get(int(match.group(1)))
+        return (200, b'{"success":true,"data":' + deal[1] + b"}") if deal else (404, _one(None))
+    if route == "v1/deals":
+        status = _arg(query, "status", "all_not_deleted")
+        since = _arg(query, "won_date_since")
+        deals = [
+            d for d in account.deals
+            if (status == "all_not_deleted" or d[0]["status"] == status)
+            and (not since or (d[0]["won"] and d[0]["won"].date().isoformat() >= since))
+        ]
+        return 200, _v1_page([d[1] for d in deals], query)
+    if route == "v1/deals/{id}/activities":
+        done = _bool_arg(query, "done")
+        entries = [a[1] for a in account.activities_by_deal.get(int(match.group(1)), []) if done is None or a[0]["done"] == done]
+        return 200, _v1_page(entries, query)
+    if route == "v2/deals":
+        status = _arg(query, "status")
+        owner_id = _arg(query, "owner_id")
+        deals = [
+            d[2] for d in account.deals_by_add_desc
+            if (not status or d[0]["status"] == status) and (not owner_id or d[0]["owner_id"] == int(owner_id))
+        ]
+        return 200, _v2_page(deals, query)
+    if route == "v2/activities":
+        done = _bool_arg(query, "done")
+        owner_id = _arg(query, "owner_id")
+        entries = [
+            a[1] for a in account.activities
+            if (done is None or a[0]["done"] == done) and (not owner_id or a[0]["owner_id"] == int(owner_id))
+        ]
+        return 200, _v2_page(entries, query)
+    return 404, _one(None)
+
+# --- Server ---
+
+class FakePipedrive:
+    """The account plus latency, rate-limit and error injection, and per-endpoint call counts."""
+    def __init__(self, cfg: FakeConfig):
+        self.cfg = cfg
+        self.account = FakeAccount(cfg)
+        self._rng = random.Random(cfg.seed)
+        self._lock = threading.Lock()
+        self._tokens = float(cfg.burst)
+        self._refilled_at = time.monotonic()
+        self.calls: Counter = Counter()
+        self.rate_limited = 0
+        self.injected_errors = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"total": sum(self.calls.values()), "by_endpoint": dict(self.calls),
+                    "rate_limited": self.rate_limited, "injected_errors": self.injected_errors}
+
+    def reset(self):
+        with self._lock:
+            self.calls.clear()
+            self.rate_limited = self.injected_errors = 0
+
+    def _admit(self, route: str) -> Optional[int]:
+        """None to serve the request, else the status to fail it with."""
+        with self._lock:
+            self.calls[route] += 1
+            if self.cfg.rate_limit:
+                now = time.monotonic()
+                self._tokens = min(self.cfg.burst, self._tokens + (now - self._refilled_at) * self.cfg.rate_limit)
+                self._refilled_at = now
+                if self._tokens < 1:
+                    self.rate_limited += 1
+                    return 429
+                self._tokens -= 1
+            if self.cfg.error_rate and self._rng.random() < self.cfg.error_rate:
+                self.injected_errors += 1
+                return 503
+            return None
+
+    def _delay(self) -> float:
+        with self._lock:
+            jitter = self._rng.uniform(-self.cfg.jitter_ms, self.cfg.jitter_ms)
+        return max(0.0, self.cfg.latency_ms + jitter) / 1000
+
+    def handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status: int, body: bytes, headers: Optional[dict] = None):
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                if self.path == "/__reset":
+                    fake.reset()
+                    return self._send(200, b"{}")
+                self._send(404, b"{}")
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                if url.path == "/__stats":
+                    return self._send(200, json.dumps(fake.stats()).encode())
+                for route, pattern in ROUTES:
+                    match = pattern.match(url.path)
+                    if match:
+                        break
+                else:
+                    return self._send(404, _one(None))
+                time.sleep(fake._delay())
+                failure = fake._admit(route)
+                if failure == 429:
+                    return self._send(429, b'{"success":false,"error":"Rate limit exceeded"}', {"Retry-After": "1"})
+                if failure:
+                    return self._send(failure, b'{"success":false,"error":"Service unavailable"}')
+                status, body = respond(fake.account, route, match, parse_qs(url.query))
+                self._send(status, body)
+
+        return Handler
+
+    def serve(self, host: str = "127.0.0.1", port: int = 0) -> ThreadingHTTPServer:
+        """Starts serving on a daemon thread; port 0 picks a free one (see server.server_port)."""
+        server = ThreadingHTTPServer((host, port), self.handler())
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+def add_arguments(parser: argparse.ArgumentParser):
+    defaults = FakeConfig()
+    parser.add_argument("--users", type=int, default=defaults.users)
+    parser.add_argument("--deals", type=int, default=defaults.deals)
+    parser.add_argument("--activities", type=int, default=defaults.activities)
+    parser.add_argument("--custom-fields", type=int, default=defaults.custom_fields)
+    parser.add_argument("--latency-ms", type=float, default=defaults.latency_ms)
+    parser.add_argument("--jitter-ms", type=float, default=defaults.jitter_ms)
+    parser.add_argument("--rate-limit", type=float, default=defaults.rate_limit, help="Requests per second before 429s (0: off).")
+    parser.add_argument("--burst", type=int, default=defaults.burst)
+    parser.add_argument("--error-rate", type=float, default=defaults.error_rate, help="Fraction of requests answered with 503.")
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+
+def config_from_args(args) -> FakeConfig:
+    return FakeConfig(
+        users=args.users, deals=args.deals, activities=args.activities, custom_fields=args.custom_fields,
+        latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, rate_limit=args.rate_limit, burst=args.burst,
+        error_rate=args.error_rate, seed=args.seed,
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    fake = FakePipedrive(config_from_args(args))
+    server = fake.serve(args.host, args.port)
+    print(f"Fake Pipedrive on http://{args.host}:{server.server_port} "
+          f"({args.deals} deals, {args.activities} activities, built in {time.perf_counter() - started:.1f}s)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,317 @@
+# sales-enforcer/benchmarks/run_scenarios.py
+"""
+End-to-end API benchmark against a fake Pipedrive.
+
+Starts benchmarks.fake_pipedrive in-process and the API as a subprocess
+(gunicorn with --workers uvicorn workers, or a single uvicorn), then runs each
+scenario as a closed loop of --concurrency clients and reports per scenario:
+
+- throughput (requests/s), latency p50/p95/p99/max and the first (cold) request,
+- status codes and errors,
+- upstream Pipedrive calls, by endpoint, and how many were rate limited,
+- peak RSS of the API process tree, sampled while the scenario runs.
+
+Results are written as JSON together with the commit and settings, so runs can
+be compared across commits (--compare previous.json prints the deltas).
+The database is whatever DATABASE_URL points at; seed it first with
+benchmarks.seed_data. Set CACHE_REDIS_URL to benchmark the shared cache.
+Every scenario starts with an empty shared cache (the se:cache: keys are
+flushed, or, with the in-process cache, the API is restarted) unless --warm
+is given, so results don't depend on which scenarios ran before.
+
+Run from the sales-enforcer directory:
+    python -m benchmarks.run_scenarios [--scenarios dashboard weekly-report] [--requests 200]
+        [--concurrency 8] [--workers 4] [--latency-ms 150] [--rate-limit 0] [--out results.json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+import shared_cache
+from benchmarks import fake_pipedrive
+
+# name -> builds (path, params) for the i-th request; user ids match fake_pipedrive.
+SCENARIOS: Dict[str, Callable[[int, random.Random, argparse.Namespace], Tuple[str, dict]]] = {
+    "users": lambda i, rng, a: ("/api/users", {}),
+    "dashboard": lambda i, rng, a: ("/api/dashboard-data", {}),
+    "weekly-report": lambda i, rng, a: ("/api/weekly-report", {
+        "start_date": (date.today() - timedelta(days=30)).isoformat(), "end_date": date.today().isoformat(), "limit": 50,
+    }),
+    "weekly-report-user": lambda i, rng, a: ("/api/weekly-report", {"user_id": 1000 + rng.randrange(a.users), "limit": 50}),
+    "due-activities": lambda i, rng, a: ("/api/due-activities", {}),
+    "due-activities-user": lambda i, rng, a: ("/api/due-activities", {"user_id": 1000 + rng.randrange(a.users)}),
+}
+DEFAULT_SCENARIOS = ["users", "dashboard", "weekly-report", "due-activities", "due-activities-user"]
+
+# --- Measurements ---
+
+def percentile(sorted_values: List[float], q: float) -> Optional[float]:
+    """Linear interpolation between closest ranks; q in [0, 100]."""
+    if not sorted_values:
+        return None
+    k = (len(sorted_values) - 1) * q / 100
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+def _process_tree(root: int) -> List[int]:
+    children: Dict[int, List[int]] = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # The command name may contain spaces; ppid is the second field after it.
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+    tree, stack = [], [root]
+    while stack:
+        pid = stack.pop()
+        tree.append(pid)
+        stack.extend(children.get(pid, []))
+    return tree
+
+def tree_rss_mb(root: int) -> float:
+    """Current RSS of a process and all its descendants (Linux /proc)."""
+    total_kb = 0
+    for pid in _process_tree(root):
+        try:
+            with open(f"/proc/{pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total_kb += int(line.split()[1])
+                        break
+        except OSError:
+            continue
+    return total_kb / 1024
+
+class RssSampler:
+    def __init__(self, pid: int, interval: float = 0.1):
+        self.pid = pid
+        self.interval = interval
+        self.peak_mb = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak_mb = max(self.peak_mb, tree_rss_mb(self.pid))
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+# --- Load ---
+
+async def _request(client: httpx.AsyncClient, path: str, params: dict) -> Tuple[float, str]:
+    """(latency in ms, status code or exception name)."""
+    started = time.perf_counter()
+    try:
+        response = await client.get(path, params=params)
+        await response.aread()
+        outcome = str(response.status_code)
+    except httpx.HTTPError as e:
+        outcome = type(e).__name__
+    return (time.perf_counter() - started) * 1000, outcome
+
+async def run_load(base_url: str, build: Callable, args) -> dict:
+    rng = random.Random(args.seed)
+    latencies: List[float] = []
+    outcomes: Dict[str, int] = {}
+    issued = 0
+
+    def record(latency_ms: float, outcome: str):
+        latencies.append(latency_ms)
+        outcomes[outcome] = outcomes.get(outcome, 0) + 1
+
+    async def client_loop(client: httpx.AsyncClient, deadline: Optional[float]):
+        nonlocal issued
+        while (time.perf_counter() < deadline) if deadline else (issued < args.requests):
+            path, params = build(issued, rng, args)
+            issued += 1
+            record(*await _request(client, path, params))
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits) as client:
+        # The first request runs alone so its (cold) latency isn't hidden by the rest.
+        path, params = build(issued, rng, args)
+        issued += 1
+        record(*await _request(client, path, params))
+        started = time.perf_counter()
+        deadline = started + args.duration if args.duration else None
+        await asyncio.gather(*(client_loop(client, deadline) for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+
+    ordered = sorted(latencies)
+    return {
+        "requests": len(latencies),
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round((len(latencies) - 1) / elapsed, 2) if elapsed else None,
+        "latency_ms": {
+            "first": round(latencies[0], 2),
+            "p50": round(percentile(ordered, 50), 2),
+            "p95": round(percentile(ordered, 95), 2),
+            "p99": round(percentile(ordered, 99), 2),
+            "max": round(ordered[-1], 2),
+            "mean": round(sum(ordered) / len(ordered), 2),
+        },
+        "statuses": outcomes,
+        # Transport failures and 5xx; 503s are expected while serving degraded without a cached copy.
+        "errors": sum(n for outcome, n in outcomes.items() if not outcome.isdigit() or int(outcome) >= 500),
+    }
+
+# --- API process ---
+
+def start_api(args, pipedrive_url: str) -> subprocess.Popen:
+    env = dict(os.environ, PIPEDRIVE_API_HOST=pipedrive_url, PIPEDRIVE_API_TOKEN="bench", PORT=str(args.port))
+    if args.server == "gunicorn":
+        env.update(WEB_CONCURRENCY=str(args.workers), PROMETHEUS_MULTIPROC_DIR=tempfile.mkdtemp(prefix="bench-metrics-"))
+        cmd = [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "--bind", f"127.0.0.1:{args.port}", "main:app"]
+    else:
+        cmd = [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(args.port), "--log-level", "warning"]
+    proc = subprocess.Popen(cmd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise SystemExit(f"API exited during start-up:\n{proc.stderr.read().decode()[-2000:]}")
+        try:
+            if httpx.get(f"http://127.0.0.1:{args.port}/", timeout=1).status_code == 200:
+                return proc
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    proc.terminate()
+    raise SystemExit("API did not become ready within 60s.")
+
+def start_cold(api: Optional[subprocess.Popen], args, pipedrive_url: str) -> Optional[subprocess.Popen]:
+    """Empties the shared cache; returns the API process to measure (restarted if the cache lives in it)."""
+    if shared_cache.CACHE_REDIS_URL:
+        shared_cache.clear()
+    elif api is not None:
+        api.terminate()
+        api.wait(timeout=30)
+        api = start_api(args, pipedrive_url)
+    else:
+        print("Warning: the external API's in-process cache can't be cleared; results may be warm.")
+    return api
+
+def git_revision() -> dict:
+    def git(*cmd):
+        try:
+            return subprocess.run(["git", *cmd], capture_output=True, text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+    return {"commit": git("rev-parse", "HEAD"), "dirty": bool(git("status", "--porcelain", "--untracked-files=no"))}
+
+def compare(previous_path: str, current: dict):
+    with open(previous_path) as f:
+        previous = {s["name"]: s for s in json.load(f)["scenarios"]}
+    print(f"\nvs {previous_path}:")
+    print(f"{'scenario':<22} {'rps':>16} {'p95 ms':>20} {'upstream':>14}")
+    for s in current["scenarios"]:
+        p = previous.get(s["name"])
+        if p is None:
+            continue
+        print(f"{s['name']:<22} {p['throughput_rps']:>7} -> {s['throughput_rps']:<7}"
+              f"{p['latency_ms']['p95']:>9} -> {s['latency_ms']['p95']:<9}"
+              f"{p['upstream']['total']:>6} -> {s['upstream']['total']:<6}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", nargs="+", default=DEFAULT_SCENARIOS, choices=list(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=200, help="Requests per scenario (ignored with --duration).")
+    parser.add_argument("--duration", type=float, default=0, help="Seconds per scenario instead of a request count.")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--server", choices=("gunicorn", "uvicorn"), default="gunicorn")
+    parser.add_argument("--workers", type=int, default=4, help="gunicorn worker processes.")
+    parser.add_argument("--port", type=int, default=8800)
+    parser.add_argument("--api-url", help="Benchmark an already running API instead (it must use this fake Pipedrive).")
+    parser.add_argument("--pipedrive-port", type=int, default=0)
+    parser.add_argument("--warm", action="store_true", help="Keep the shared cache between scenarios.")
+    parser.add_argument("--label", default="", help="Free-form note stored with the results.")
+    parser.add_argument("--out", default="benchmark-results.json")
+    parser.add_argument("--compare", help="Previous results file to print deltas against.")
+    fake_pipedrive.add_arguments(parser)
+    args = parser.parse_args()
+
+    fake_cfg = fake_pipedrive.config_from_args(args)
+    fake = fake_pipedrive.FakePipedrive(fake_cfg)
+    pd_server = fake.serve(port=args.pipedrive_port)
+    pipedrive_url = f"http://127.0.0.1:{pd_server.server_port}"
+
+    api = None
+    if args.api_url:
+        base_url = args.api_url.rstrip("/")
+    else:
+        api = start_api(args, pipedrive_url)
+        base_url = f"http://127.0.0.1:{args.port}"
+
+    results = {
+        "meta": {
+            **git_revision(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "label": args.label,
+            "python": platform.python_version(),
+            "cpus": os.cpu_count(),
+            "server": "external" if args.api_url else args.server,
+            "workers": None if args.api_url or args.server == "uvicorn" else args.workers,
+            "concurrency": args.concurrency,
+            "pipedrive": {k: v for k, v in vars(fake_cfg).items()},
+            "shared_cache": "redis" if shared_cache.CACHE_REDIS_URL else "in-process",
+            "cold_scenarios": not args.warm,
+        },
+        "scenarios": [],
+    }
+    try:
+        for i, name in enumerate(args.scenarios):
+            # A just-started API has nothing cached in-process yet.
+            if not args.warm and (i or shared_cache.CACHE_REDIS_URL):
+                api = start_cold(api, args, pipedrive_url)
+            fake.reset()
+            if api is not None:
+                with RssSampler(api.pid) as rss:
+                    run = asyncio.run(run_load(base_url, SCENARIOS[name], args))
+                run["peak_rss_mb"] = round(rss.peak_mb, 1)
+            else:
+                run = asyncio.run(run_load(base_url, SCENARIOS[name], args))
+                run["peak_rss_mb"] = None
+            run["upstream"] = fake.stats()
+            results["scenarios"].append({"name": name, **run})
+            lat = run["latency_ms"]
+            print(f"{name:<22} {run['throughput_rps']:>8} rps  p50 {lat['p50']:>8} p95 {lat['p95']:>8} "
+                  f"p99 {lat['p99']:>8} first {lat['first']:>8} ms  upstream {run['upstream']['total']:>5}  "
+                  f"errors {run['errors']}  rss {run['peak_rss_mb']} MB")
+    finally:
+        if api is not None:
+            api.terminate()
+            api.wait(timeout=30)
+        pd_server.shutdown()
+
+    with open(args.out, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Wrote {args.out}")
+    if args.compare:
+        compare(args.compare, results)
+
+if __name__ == "__main__":
+    main()
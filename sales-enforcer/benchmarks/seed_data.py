@@ -0,0 +1,158 @@
+# sales-enforcer/benchmarks/seed_data.py
+"""
+Seeds points_ledger and deal_stage_events with synthetic history at a given
+scale, for benchmarks. Point DATABASE_URL at a scratch database.
+
+Deals walk the configured stages in order, as webhooks would have scored
+them: one stage event and one STAGE_ADVANCE ledger row per stage reached, a
+"Deal WON" row for won deals and the occasional fast-win bonus. Rows are
+bulk-loaded with COPY (the ORM hooks don't fire), so the derived tables
+(points buckets, dwell sketches, activity calendars) are rebuilt afterwards.
+
+Deal and owner ids match benchmarks/fake_pipedrive.py (owners 1000..1000+users-1).
+
+Run from the sales-enforcer directory:
+    python -m benchmarks.seed_data --scale 100k [--users 25] [--days 365] [--truncate]
+"""
+import argparse
+import csv
+import io
+import logging
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Iterator, Tuple
+
+from sqlalchemy import text
+
+import config
+import partitions
+from funnel import WON_NOTE
+from models import PointEventType
+
+logger = logging.getLogger(__name__)
+
+SCALES = {"10k": 10_000, "100k": 100_000, "1m": 1_000_000, "10m": 10_000_000}
+COPY_BATCH_ROWS = 50_000
+LEDGER_COLUMNS = ("deal_id", "user_id", "event_type", "points", "notes", "created_at")
+STAGE_EVENT_COLUMNS = ("deal_id", "stage_id", "entered_at")
+DERIVED_TABLES = ("points_buckets", "stage_dwell_sketches", "user_activity_calendars")
+
+def generate(rows: int, users: int, days: int, seed: int, first_deal_id: int = 1,
+             now: datetime = None) -> Iterator[Tuple[str, tuple]]:
+    """Yields ("ledger", row) and ("stage", row) until `rows` ledger rows have been produced."""
+    rng = random.Random(seed)
+    now = now or datetime.now(timezone.utc)
+    stages = [(sid, s) for sid, s in sorted(config.STAGES.items(), key=lambda kv: kv[1]["order"]) if s["points"]]
+    produced, deal_id = 0, first_deal_id
+    while produced < rows:
+        owner = 1000 + rng.randrange(users)
+        at = now - timedelta(seconds=rng.randrange(0, days * 86400))
+        # Most deals stall early; about one in six reaches the last stage.
+        reached = min(len(stages), 1 + int(rng.expovariate(0.45)))
+        added = at
+        for sid, stage in stages[:reached]:
+            if at > now:
+                break
+            yield "stage", (deal_id, sid, at.isoformat())
+            yield "ledger", (deal_id, owner, PointEventType.STAGE_ADVANCE.name, stage["points"],
+                             f"Advanced to stage: {stage['name']}", at.isoformat())
+            produced += 1
+            at += timedelta(hours=rng.randrange(2, 10 * 24))
+        if reached == len(stages) and at <= now and rng.random() < 0.6:
+            yield "ledger", (deal_id, owner, PointEventType.STAGE_ADVANCE.name,
+                             config.POINT_CONFIG["won_deal_points"], WON_NOTE, at.isoformat())
+            produced += 1
+            days_to_win = (at - added).days
+            if days_to_win <= config.POINT_CONFIG["bonus_won_fast_days"]:
+                yield "ledger", (deal_id, owner, PointEventType.BONUS.name, config.POINT_CONFIG["bonus_won_fast_points"],
+                                 f"Bonus: Deal won in {days_to_win} days.", at.isoformat())
+                produced += 1
+        deal_id += 1
+
+def _copy(raw_conn, table: str, columns: tuple, buffer: io.StringIO):
+    buffer.seek(0)
+    with raw_conn.cursor() as cur:
+        cur.copy_expert(f'COPY "{table}" ({", ".join(columns)}) FROM STDIN WITH (FORMAT csv)', buffer)
+    raw_conn.commit()
+
+def seed(rows: int, users: int, days: int, seed: int, truncate: bool = False) -> dict:
+    from database import engine
+
+    now = datetime.now(timezone.utc)
+    with engine.begin() as conn:
+        if truncate:
+            conn.execute(text("TRUNCATE points_ledger, deal_stage_events"))
+        # COPY into the partitioned ledger needs a partition for every quarter in the window.
+        quarters = days // 90 + 2
+        partitions.ensure_future_partitions(conn, now - timedelta(days=days), quarters_ahead=quarters + partitions.QUARTERS_AHEAD)
+        first_deal_id = conn.execute(text("SELECT COALESCE(MAX(deal_id), 0) + 1 FROM deal_stage_events")).scalar()
+
+    started = time.perf_counter()
+    targets = {"ledger": ("points_ledger", LEDGER_COLUMNS), "stage": ("deal_stage_events", STAGE_EVENT_COLUMNS)}
+    buffers = {kind: io.StringIO() for kind in targets}
+    writers = {kind: csv.writer(buffers[kind]) for kind in targets}
+    pending = {kind: 0 for kind in targets}
+    totals = {kind: 0 for kind in targets}
+    raw_conn = engine.raw_connection()
+    try:
+        for kind, row in generate(rows, users, days, seed, first_deal_id, now):
+            writers[kind].writerow(row)
+            pending[kind] += 1
+            if pending[kind] >= COPY_BATCH_ROWS:
+                _copy(raw_conn, *targets[kind], buffers[kind])
+                totals[kind] += pending[kind]
+                buffers[kind], pending[kind] = io.StringIO(), 0
+                writers[kind] = csv.writer(buffers[kind])
+                logger.info(f"{targets[kind][0]}: {totals[kind]} rows")
+        for kind in targets:
+            if pending[kind]:
+                _copy(raw_conn, *targets[kind], buffers[kind])
+                totals[kind] += pending[kind]
+    finally:
+        raw_conn.close()
+    load_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    with engine.begin() as conn:
+        conn.execute(text("ANALYZE points_ledger"))
+        conn.execute(text("ANALYZE deal_stage_events"))
+    rebuild_derived()
+    return {
+        "points_ledger": totals["ledger"], "deal_stage_events": totals["stage"],
+        "load_seconds": round(load_seconds, 1), "rebuild_seconds": round(time.perf_counter() - started, 1),
+    }
+
+def rebuild_derived():
+    import activity_calendar
+    import points_series
+    import velocity
+    from database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        points_series.rebuild_buckets(db)
+        velocity.rebuild_sketches(db)
+        activity_calendar.rebuild_calendars(db)
+        db.commit()
+    finally:
+        db.close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    size = parser.add_mutually_exclusive_group(required=True)
+    size.add_argument("--scale", choices=list(SCALES))
+    size.add_argument("--rows", type=int, help="Ledger rows to generate (deal_stage_events gets about as many).")
+    parser.add_argument("--users", type=int, default=25)
+    parser.add_argument("--days", type=int, default=365, help="History window ending now.")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--truncate", action="store_true", help="Empty both tables first.")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    rows = args.rows or SCALES[args.scale]
+    result = seed(rows, args.users, args.days, args.seed, truncate=args.truncate)
+    logger.info(f"Seeded {result}")
+
+if __name__ == "__main__":
+    main()
@@ -1,104 +1,64 @@
 # sales-enforcer/celery_worker.py
+import asyncio
 import os
-import re
-from datetime import datetime
+import logging
+import time
+from datetime import datetime, timedelta, timezone
 from celery import Celery
-from dotenv import load_dotenv
 from sqlalchemy import func
-from database import SessionLocal
+from celery.schedules import crontab, schedule
+import settings
+from database import SessionLocal, engine
+from observability import install_celery
 from models import DealStageEvent, PointsLedger, PointEventType, UserMilestone
 import config
 import pipedrive_client
+from circuit_breaker import CircuitOpenError
+import points_series  # registers the ledger -> bucket hook
+import activity_calendar  # registers the ledger -> calendar hook
+import partitions
+import event_log
+import scoring
+import velocity
+import rotting
+import health_kpis
+import queues
+import exporter
 # import alert_client # Commented out to prevent errors
 
-load_dotenv()
+logger = logging.getLogger(__name__)
+
+celery_app = Celery("tasks", broker=settings.REDIS_URL, backend=settings.REDIS_URL)
+install_celery(celery_app)
+celery_app.conf.task_routes = (queues.route_task,)
+celery_app.conf.task_default_queue = queues.SCHEDULED_QUEUE
+
+celery_app.conf.beat_schedule = {
+    "maintain-ledger-partitions": {
+        "task": "celery_worker.maintain_ledger_partitions",
+        "schedule": crontab(hour=2, minute=15),
+    },
+    "close-weekly-minimums": {
+        "task": "celery_worker.close_weekly_minimums",
+        "schedule": crontab(day_of_week="mon", hour=0, minute=30),
+    },
+    # Cheap when nothing is due: it only reads expired deadlines from deal_states.
+    "apply-rotting-penalties": {
+        "task": "celery_worker.apply_rotting_penalties",
+        "schedule": schedule(run_every=600),
+    },
+    # Incremental Parquet export for BI; only runs when EXPORT_DIR is configured.
+    "export-scorecard-history": {
+        "task": "celery_worker.export_scorecard_history",
+        "schedule": crontab(hour=3, minute=0),
+    },
+    # Catches deal changes that never produced a webhook (e.g. activities logged elsewhere).
+    "sync-deal-states": {
+        "task": "celery_worker.sync_deal_states",
+        "schedule": crontab(hour=1, minute=45),
+    },
+}
 
-def parse_azure_redis_url(azure_url: str) -> str:
-    if not azure_url or not azure_url.startswith('redis-'): return azure_url
-    try:
-        host, params = azure_url.split(',', 1)
-        password_match = re.search(r'password=([^,]+)', params)
-        password = password_match.group(1) if password_match else ''
-        return f"rediss://:{password}@{host}?ssl_cert_reqs=CERT_NONE"
-    except (ValueError, AttributeError):
-        print("Warning: Could not parse Azure Redis URL, falling back to original value.")
-        return azure_url
-
-raw_redis_url = os.getenv("REDIS_URL")
-parsed_redis_url = parse_azure_redis_url(raw_redis_url)
-celery_app = Celery("tasks", broker=parsed_redis_url, backend=parsed_redis_url)
-
-def check_compliance(stage_id: int, deal_data: dict) -> (bool, list):
-    """
-    Evaluates if a deal meets the compliance rules for a given stage.
-    This version is robust against different data types from the Pipedrive API.
-    """
-    stage_rules = config.COMPLIANCE_RULES.get(stage_id)
-    if not stage_rules:
-        return True, []
-
-    def evaluate(ruleset):
-        condition = ruleset["condition"]
-        rules = ruleset["rules"]
-        failed_messages = []
-        passed_count = 0
-        
-        for rule in rules:
-            if "condition" in rule:
-                passed, messages = evaluate(rule)
-                if passed:
-                    passed_count += 1
-                else:
-                    failed_messages.extend(messages)
-                continue
-
-            field_key = rule["field"]
-            rule_type = rule["type"]
-            field_value = deal_data.get(field_key)
-            
-            value_to_check = None
-            if isinstance(field_value, dict) and 'id' in field_value:
-                value_to_check = field_value['id']
-            elif field_value is not None:
-                value_to_check = field_value
-
-            rule_passed = False
-            if rule_type == "not_empty" and value_to_check is not None:
-                rule_passed = True
-            elif rule_type == "equals_id" and value_to_check is not None:
-                if str(value_to_check) == str(rule["value"]):
-                    rule_passed = True
-            elif rule_type == "equals" and value_to_check is not None:
-                 if str(value_to_check) == str(rule["value"]):
-                    rule_passed = True
-
-            if rule_passed:
-                passed_count += 1
-            else:
-                failed_messages.append(rule["message"])
-        
-        if condition == "AND" and passed_count == len(rules):
-            return True, []
-        if condition == "OR" and passed_count > 0:
-            return True, []
-            
-        return False, failed_messages
-
-    return evaluate(stage_rules)
-
-def apply_status_change_bonuses(db_session, user_id: int, deal_data: dict, previous_data: dict):
-    deal_id = deal_data["id"]
-    
-    if deal_data.get("status") == 'won' and previous_data.get("status") != 'won':
-        add_time = datetime.fromisoformat(deal_data["add_time"].replace('Z', '+00:00'))
-        won_time = datetime.fromisoformat(deal_data["won_time"].replace('Z', '+00:00'))
-        days_to_win = (won_time - add_time).days
-        
-        if days_to_win <= config.POINT_CONFIG["bonus_won_fast_days"]:
-            db_session.add(PointsLedger(deal_id=deal_id, user_id=user_id, event_type=PointEventType.BONUS, points=config.POINT_CONFIG["bonus_won_fast_points"], notes=f"Bonus: Deal won in {days_to_win} days."))
-        
-        db_session.add(PointsLedger(deal_id=deal_id, user_id=user_id, event_type=PointEventType.STAGE_ADVANCE, points=config.POINT_CONFIG["won_deal_points"], notes="Deal WON"))
-        
 def check_and_trigger_milestones(db_session, user_id: int):
     total_score = db_session.query(func.sum(PointsLedger.points)).filter(PointsLedger.user_id == user_id).scalar() or 0
     achieved_milestones = db_session.query(UserMilestone.milestone_rank).filter(UserMilestone.user_id == user_id).all()
@@ -108,11 +68,36 @@ def check_and_trigger_milestones(db_session, user_id: int):
             db_session.add(UserMilestone(user_id=user_id, milestone_rank=rank))
             break
 
-@celery_app.task
-def process_pipedrive_event(payload: dict):
-    print(f"Received payload: {payload}")
+# While Pipedrive is unreachable, the event at the head of a webhook lane waits
+# in place, holding the lane, rather than being re-queued behind later events
+# for the same deal: the lanes exist to apply each deal's events in order.
+WEBHOOK_BACKOFF_SECONDS = 5.0
+WEBHOOK_BACKOFF_MAX_SECONDS = 300.0
+# Don't spin on a circuit that is about to half-open.
+WEBHOOK_MIN_WAIT_SECONDS = 1.0
+
+def get_deal_holding_lane(deal_id: int):
+    """pipedrive_client.get_deal, waiting out open circuits and outages instead of failing."""
+    attempt = 0
+    while True:
+        try:
+            return pipedrive_client.get_deal(deal_id)
+        except CircuitOpenError as e:
+            # The half-open probe is let through once retry_in has passed.
+            wait = max(e.retry_in, WEBHOOK_MIN_WAIT_SECONDS)
+            error = e
+        except pipedrive_client.PipedriveUnavailable as e:
+            wait = min(WEBHOOK_BACKOFF_SECONDS * 2 ** attempt, WEBHOOK_BACKOFF_MAX_SECONDS)
+            error = e
+        attempt += 1
+        logger.warning(f"Pipedrive unavailable for deal {deal_id}, holding the lane for {wait:.0f}s: {error}", extra={"deal_id": deal_id})
+        time.sleep(wait)
+
+# acks_late: an event held through a worker restart is redelivered, not lost.
+@celery_app.task(acks_late=True)
+def process_pipedrive_event(payload: dict, event_id: int = None):
+    logger.info("Received payload", extra={"task": "process_pipedrive_event", "deal_id": (payload.get("data") or {}).get("id")})
     current_data = payload.get("data")
-    previous_data = payload.get("previous", {})
     
     if not current_data:
         return {"status": "Payload did not contain 'data' object. Skipping."}
@@ -124,79 +109,136 @@ def process_pipedrive_event(payload: dict):
     if not deal_id or not user_id:
         return {"status": "Deal ID or Owner ID missing from webhook payload. Skipping."}
     
+    full_deal_data = get_deal_holding_lane(deal_id)
+    if not full_deal_data:
+        return {"status": f"Deal {deal_id} no longer exists in Pipedrive."}
+
     db = SessionLocal()
     try:
-        was_updated = False
-        full_deal_data = pipedrive_client.get_deal(deal_id)
-        if not full_deal_data:
-            return {"status": f"Could not fetch full details for deal {deal_id}."}
-
-        # Handle status change events
-        if current_data.get("status") != previous_data.get("status"):
-            apply_status_change_bonuses(db, user_id, full_deal_data, previous_data)
-            was_updated = True
-
-        # Handle stage change events
-        current_stage_id = current_data.get("stage_id")
-        previous_stage_id = previous_data.get("stage_id")
-        if current_stage_id is not None and current_stage_id != previous_stage_id:
-            current_stage = config.STAGES.get(current_stage_id)
-            previous_stage = config.STAGES.get(previous_stage_id, {"order": 0})
-
-            if not current_stage: return f"Unknown stage_id: {current_stage_id}"
-            
-            if current_stage["order"] > previous_stage["order"]:
-                is_compliant, messages = check_compliance(current_stage_id, full_deal_data)
-                if not is_compliant:
-                    full_message = "<b>Compliance Error:</b> Deal moved back. Please complete required fields for this stage:<br>- " + "<br>- ".join(messages)
-                    pipedrive_client.add_note(deal_id, full_message)
-                    pipedrive_client.update_deal(deal_id, {"stage_id": previous_stage_id})
-                    return {"status": f"Not compliant with stage {current_stage_id}. Deal reverted."}
-
-                if not db.query(DealStageEvent).filter_by(deal_id=deal_id, stage_id=current_stage_id).first():
-                    db.add(DealStageEvent(deal_id=deal_id, stage_id=current_stage_id))
-                    points_to_add = current_stage.get("points", 0)
-                    if points_to_add > 0:
-                        db.add(PointsLedger(deal_id=deal_id, user_id=user_id, event_type=PointEventType.STAGE_ADVANCE, points=points_to_add, notes=f"Advanced to stage: {current_stage['name']}"))
-                        was_updated = True
-
-        if was_updated:
+        if event_id is not None:
+            # Keep the deal as scored so the event log can be replayed without Pipedrive.
+            event_log.attach_snapshot(db, event_id, full_deal_data)
+        rotting.upsert_deal_states(db, [full_deal_data])
+        db.commit()
+
+        reached_stages = {r[0] for r in db.query(DealStageEvent.stage_id).filter_by(deal_id=deal_id).all()}
+        result = scoring.score_event(payload, full_deal_data, reached_stages)
+        health_kpis.record_webhook(db, full_deal_data, user_id, result)
+        db.commit()
+
+        if result.compliance_failure:
+            current_stage_id, previous_stage_id, messages = result.compliance_failure
+            full_message = "<b>Compliance Error:</b> Deal moved back. Please complete required fields for this stage:<br>- " + "<br>- ".join(messages)
+            pipedrive_client.add_note(deal_id, full_message)
+            pipedrive_client.update_deal(deal_id, {"stage_id": previous_stage_id})
+            return {"status": result.status}
+
+        velocity.record_score_result(db, deal_id, user_id, result)
+        for stage_id in result.stage_events:
+            db.add(DealStageEvent(deal_id=deal_id, stage_id=stage_id))
+        for entry in result.ledger_entries:
+            db.add(PointsLedger(**entry))
+
+        if result.was_updated:
             db.commit()
             check_and_trigger_milestones(db, user_id)
-            return {"status": "Processed successfully with point updates."}
-        else:
-            return {"status": "No changes triggered point updates."}
+        return {"status": result.status}
 
     except Exception as e:
         db.rollback()
-        print(f"FATAL error in process_pipedrive_event for deal {deal_id}: {e}")
+        logger.exception(f"FATAL error in process_pipedrive_event for deal {deal_id}: {e}", extra={"deal_id": deal_id})
         return {"status": "Error during processing."}
     finally:
         db.close()
 
 @celery_app.task
 def apply_rotting_penalties():
-    print("Running scheduled task: Applying rotting penalties...")
-    rotted_deals = pipedrive_client.get_rotted_deals()
-    if not rotted_deals:
+    """
+    Penalizes deals whose rot deadline has passed. Due deals come from the local
+    deal_states mirror and are re-fetched from Pipedrive before any penalty is
+    written; deals that can't be fetched are left for the next run.
+    """
+    logger.info("Running scheduled task: Applying rotting penalties...")
+    db = SessionLocal()
+    processed = penalized = 0
+    unreachable = set()
+    try:
+        while True:
+            due = rotting.due_deals(db, exclude=unreachable)
+            if not due:
+                break
+            fresh = asyncio.run(pipedrive_client.get_deals_by_id_async([d.deal_id for d in due]))
+            unreachable.update(d.deal_id for d in due if d.deal_id not in fresh)
+            rotted = rotting.confirm_rotted(db, fresh.values())
+            penalized_deals = {r[0] for r in db.query(PointsLedger.deal_id).filter(
+                PointsLedger.deal_id.in_([d["id"] for d in rotted]),
+                PointsLedger.event_type == PointEventType.DEAL_ROTTED_SUSPENSION,
+            )}
+            for deal in rotted:
+                stage_points = config.STAGES.get(deal.get("stage_id"), {}).get("points", 0)
+                if deal["id"] in penalized_deals or stage_points <= 0 or deal.get("owner_id") is None:
+                    continue
+                db.add(PointsLedger(deal_id=deal["id"], user_id=deal.get("owner_id"), event_type=PointEventType.DEAL_ROTTED_SUSPENSION, points=-stage_points, notes=f"Deal rotted in stage '{config.STAGES.get(deal.get('stage_id'), {}).get('name', 'Unknown')}'"))
+                penalized += 1
+            db.commit()
+            processed += len(fresh)
+    except Exception as e:
+        db.rollback()
+        logger.exception(f"An error occurred in apply_rotting_penalties: {e}")
+    finally:
+        db.close()
+
+    if unreachable:
+        logger.warning(f"Rotting check skipped {len(unreachable)} deals that could not be fetched from Pipedrive.")
+    if not processed:
         return {"status": "No rotted deals found."}
+    return {"status": f"Rotting check complete. Re-checked {processed} due deals, penalized {penalized}."}
 
+@celery_app.task
+def sync_deal_states():
+    """Refreshes the deal_states mirror from the open deals in the sales pipeline."""
+    deals = asyncio.run(pipedrive_client.get_deals_from_pipeline_async(pipeline_id=config.SALES_FLOW_PIPELINE_ID))
     db = SessionLocal()
     try:
-        for deal in rotted_deals:
-            deal_id, user_id, stage_id = deal["id"], deal["owner_id"], deal["stage_id"]
-            is_penalized = db.query(PointsLedger).filter_by(deal_id=deal_id, event_type=PointEventType.DEAL_ROTTED_SUSPENSION).first()
-            if not is_penalized:
-                stage_points = config.STAGES.get(stage_id, {}).get("points", 0)
-                if stage_points > 0:
-                    penalty = PointsLedger(deal_id=deal_id, user_id=user_id, event_type=PointEventType.DEAL_ROTTED_SUSPENSION, points=-stage_points, notes=f"Deal rotted in stage '{config.STAGES.get(stage_id, {}).get('name', 'Unknown')}'")
-                    db.add(penalty)
+        synced = rotting.upsert_deal_states(db, deals)
+        # An empty pull is more likely an upstream hiccup than an empty pipeline.
+        cleared = rotting.clear_missing(db, [d["id"] for d in deals]) if deals else 0
         db.commit()
     except Exception as e:
         db.rollback()
-        print(f"An error occurred in apply_rotting_penalties: {e}")
+        logger.exception(f"An error occurred in sync_deal_states: {e}")
+        return {"status": "Error during deal state sync."}
     finally:
         db.close()
-    
-    return {"status": f"Rotting check complete. Processed {len(rotted_deals)} deals."}
+    return {"status": f"Synced {synced} open deals, cleared {cleared} closed ones."}
+
+@celery_app.task
+def close_weekly_minimums():
+    """Closes last week on every activity calendar: advances streaks and flags reps below the weekly minimum."""
+    last_week = activity_calendar.week_start(datetime.now(timezone.utc).date()) - timedelta(weeks=1)
+    db = SessionLocal()
+    try:
+        below = activity_calendar.close_week(db, last_week)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.exception(f"An error occurred in close_weekly_minimums: {e}")
+        return {"status": "Error during weekly close."}
+    finally:
+        db.close()
+    for row in below:
+        logger.warning(f"Below weekly minimum for week of {last_week}: {row['points']} points.", extra={"user_id": row["user_id"]})
+    return {"status": f"Closed week of {last_week}.", "below_minimum": below}
+
+@celery_app.task
+def export_scorecard_history():
+    """Appends new ledger / stage / milestone rows to the quarter-partitioned Parquet export."""
+    out_dir = os.getenv("EXPORT_DIR")
+    if not out_dir:
+        return {"status": "EXPORT_DIR not set. Skipping."}
+    return {"status": "Export complete.", "tables": [exporter.export_to_directory(engine, t, out_dir) for t in exporter.EXPORTS]}
 
+@celery_app.task
+def maintain_ledger_partitions():
+    """Creates upcoming quarter partitions and vacuums (optionally archives) closed ones."""
+    return partitions.maintain_partitions(engine)
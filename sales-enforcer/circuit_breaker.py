@@ -0,0 +1,82 @@
+# sales-enforcer/circuit_breaker.py
+"""
+Minimal circuit breaker for upstream calls.
+
+closed    -> calls go through; `failure_threshold` consecutive failures open it.
+open      -> calls fail immediately with CircuitOpenError for `reset_timeout` seconds.
+half-open -> one probe call is let through; success closes the circuit, failure
+             re-opens it. Other calls keep failing fast while the probe runs.
+
+State changes are reported through `on_state_change(name, state)` (used for the
+metrics gauge). Thread-safe, so one breaker serves the API's event loop and
+threadpool as well as gevent workers.
+"""
+import threading
+import time
+from typing import Callable, Optional
+
+CLOSED = "closed"
+HALF_OPEN = "half_open"
+OPEN = "open"
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream whose circuit is open."""
+    def __init__(self, name: str, retry_in: float):
+        super().__init__(f"Circuit '{name}' is open; retry in {retry_in:.0f}s.")
+        self.name = name
+        self.retry_in = retry_in
+
+class CircuitBreaker:
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 on_state_change: Optional[Callable[[str, str], None]] = None):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._on_state_change = on_state_change
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+
+    @property
+    def state(self) -> str:
+        return self._state
+
+    def _set_state(self, state: str):
+        if state != self._state:
+            self._state = state
+            if self._on_state_change:
+                self._on_state_change(self.name, state)
+
+    def before_call(self):
+        """Raises CircuitOpenError unless the call may go through."""
+        with self._lock:
+            if self._state == CLOSED:
+                return
+            elapsed = time.monotonic() - self._opened_at
+            if self._state == OPEN and elapsed >= self.reset_timeout:
+                self._set_state(HALF_OPEN)
+            if self._state == HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return
+            raise CircuitOpenError(self.name, max(0.0, self.reset_timeout - elapsed))
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._probe_in_flight = False
+            self._set_state(CLOSED)
+
+    def abandon_call(self):
+        """The call ended without an upstream verdict (e.g. cancelled); frees the probe slot."""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._probe_in_flight = False
+            if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+                self._set_state(OPEN)
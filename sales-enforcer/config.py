@@ -6,19 +6,26 @@ Central configuration for the Sales Scorecard.
 """
 
 # --- Scorecard Points System ---
+# "rot_days" (None = never rots) is only the fallback: rotting.py follows the
+# pipeline's own deal-rotting setting per stage, read from Pipedrive's stages.
 STAGES = {
-    99: {"name": "Nurture Zone", "order": 1, "points": 0},
-    90: {"name": "1. Lead Intake", "order": 2, "points": 10},
-    91: {"name": "2. Qualification Completed", "order": 3, "points": 20},
-    92: {"name": "3. Pre–Design Intake BAMFAM", "order": 4, "points": 30},
-    93: {"name": "4. Design Intake Completed", "order": 5, "points": 40},
-    94: {"name": "5. Proposal Presentation / Buying Zone", "order": 6, "points": 50},
-    95: {"name": "6. Close (Card / BAMFAM)", "order": 7, "points": 100},
+    99: {"name": "Nurture Zone", "order": 1, "points": 0, "rot_days": None},
+    90: {"name": "1. Lead Intake", "order": 2, "points": 10, "rot_days": 5},
+    91: {"name": "2. Qualification Completed", "order": 3, "points": 20, "rot_days": 5},
+    92: {"name": "3. Pre–Design Intake BAMFAM", "order": 4, "points": 30, "rot_days": 5},
+    93: {"name": "4. Design Intake Completed", "order": 5, "points": 40, "rot_days": 5},
+    94: {"name": "5. Proposal Presentation / Buying Zone", "order": 6, "points": 50, "rot_days": 5},
+    95: {"name": "6. Close (Card / BAMFAM)", "order": 7, "points": 100, "rot_days": 5},
 }
 
+# Rot threshold for deals in stages outside STAGES (e.g. other pipelines in reports).
+DEFAULT_ROT_DAYS = 5
+
 POINT_CONFIG = {
     "won_deal_points": 200,
     "weekly_minimum": 150,
+    # Consecutive weeks at or above weekly_minimum (the current week counts once it's met) to be "on streak".
+    "streak_min_weeks": 2,
     "bonus_lead_intake_same_day": 5,
     "bonus_proposal_payment_same_day": 25,
     "bonus_won_fast_days": 14,
@@ -68,9 +75,19 @@ COMPLIANCE_RULES = {
     ]},
 }
 
+# --- Pipeline / Deal Identity ---
+SALES_FLOW_PIPELINE_ID = 11
+DEAL_UNIQUE_ID_KEY = "8d5a64af5474d18b62fb4d6e2881fb65009fca99"
+
 # --- Dashboard Configuration ---
 DASHBOARD_CONFIG = {
     "quarterly_points_target": 20000,
+    # Stage sequence behind the "Sales Health" conversion KPIs (qualification -> proposal -> won).
+    "health_funnel_stages": [91, 94],
+    # Stage a new lead enters, and the stage whose entry requires the design fee.
+    "lead_intake_stage": 90,
+    "design_fee_stage": 94,
+    "design_fee_paid_yes_id": 78,
     "field_keys": {
         "design_fee_paid": "f7b50a98745a1a2ec32a92d4bcfb89244fc15f4b",
         "loss_reason": "f7767455d77a063bc765e0b323813f513bcca2f9",
@@ -1,12 +1,113 @@
 # sales-enforcer/database.py
+import logging
 import os
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from dotenv import load_dotenv
+import threading
+import time
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session, sessionmaker
 
-load_dotenv()
+import settings
+from observability import DB_REPLICA_LAG_SECONDS, DB_SESSION_ROUTES, instrument_engine
 
-DATABASE_URL = os.getenv("DATABASE_URL")
+logger = logging.getLogger(__name__)
+
+DATABASE_URL = settings.DATABASE_URL
+REPLICA_DATABASE_URL = settings.REPLICA_DATABASE_URL
+MAX_REPLICA_LAG_SECONDS = float(os.getenv("MAX_REPLICA_LAG_SECONDS", "5"))
+REPLICA_LAG_CHECK_SECONDS = float(os.getenv("REPLICA_LAG_CHECK_SECONDS", "5"))
 
 engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
\ No newline at end of file
+instrument_engine(engine)
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+class ReadOnlySession(Session):
+    """Session bound to the replica; writing through it is a bug, so fail loudly."""
+    def flush(self, objects=None):
+        if self.new or self.dirty or self.deleted:
+            raise RuntimeError("Attempted to write through a read-only (replica) session.")
+        return super().flush(objects)
+
+replica_engine = None
+ReadSessionLocal = None
+if REPLICA_DATABASE_URL:
+    replica_engine = create_engine(REPLICA_DATABASE_URL, pool_pre_ping=True)
+    instrument_engine(replica_engine)
+    ReadSessionLocal = sessionmaker(class_=ReadOnlySession, autocommit=False, autoflush=False, bind=replica_engine)
+
+# --- Replica Lag ---
+# 0 when the replica has replayed everything it received (an idle primary doesn't
+# look like lag), otherwise the age of the last replayed transaction.
+# NULL (unhealthy) unless a WAL receiver is streaming: a detached replica has
+# replayed everything it received, which would otherwise read as zero lag.
+# status is only visible with pg_read_all_stats; without it, an existing
+# receiver process is the best we can check.
+_LAG_SQL = text("""
+    SELECT CASE
+        WHEN NOT EXISTS (
+            SELECT 1 FROM pg_stat_wal_receiver WHERE status = 'streaming' OR status IS NULL
+        ) THEN NULL
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+""")
+
+_lag_lock = threading.Lock()
+_lag_state = {"checked_at": 0.0, "lag": None}
+
+def replica_lag_seconds() -> float | None:
+    """Cached replica lag in seconds; None when there is no replica or it can't be reached."""
+    if replica_engine is None:
+        return None
+    now = time.monotonic()
+    if now - _lag_state["checked_at"] < REPLICA_LAG_CHECK_SECONDS:
+        return _lag_state["lag"]
+    with _lag_lock:
+        if now - _lag_state["checked_at"] < REPLICA_LAG_CHECK_SECONDS:
+            return _lag_state["lag"]
+        try:
+            with replica_engine.connect() as conn:
+                lag = conn.execute(_LAG_SQL).scalar()
+            if lag is None:
+                logger.warning("Replica is not streaming from the primary, reading from the primary.")
+            else:
+                lag = float(lag)
+                DB_REPLICA_LAG_SECONDS.set(lag)
+        except Exception as e:
+            logger.warning(f"Replica lag check failed, reading from the primary: {e}")
+            lag = None
+        _lag_state.update(checked_at=now, lag=lag)
+        return lag
+
+def replica_is_fresh() -> bool:
+    lag = replica_lag_seconds()
+    return lag is not None and lag <= MAX_REPLICA_LAG_SECONDS
+
+def read_engine():
+    """Engine for heavy read-only work: the replica while it's fresh, else the primary."""
+    if replica_is_fresh():
+        DB_SESSION_ROUTES.labels("replica").inc()
+        return replica_engine
+    DB_SESSION_ROUTES.labels("primary").inc()
+    return engine
+
+# --- Database Dependency ---
+def get_db():
+    """Read-only API dependency: a replica session while replica lag is within bounds, else the primary."""
+    if replica_is_fresh():
+        DB_SESSION_ROUTES.labels("replica").inc()
+        db = ReadSessionLocal()
+    else:
+        DB_SESSION_ROUTES.labels("primary").inc()
+        db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+def get_primary_db():
+    """API dependency for endpoints that write, or must read their own writes."""
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
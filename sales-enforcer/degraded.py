@@ -0,0 +1,59 @@
+# sales-enforcer/degraded.py
+"""
+Degraded serving: remember the last good response per key and hand it back,
+marked stale, when Pipedrive is failing or its circuit is open.
+
+Object responses carry `"stale"` and `"dataAgeSeconds"` fields; every
+response also gets the standard `Age` header plus `X-Data-Stale`.
+
+The remembered values live in shared_cache, so every API worker can serve
+what any of them last fetched.
+"""
+import os
+from typing import Any, Dict, Hashable, Iterator, Optional, Tuple
+
+import shared_cache
+
+STALE_HEADER = "X-Data-Stale"
+AGE_HEADER = "Age"
+# How long a last good response stays available as a fallback.
+LAST_GOOD_TTL_SECONDS = int(os.getenv("LAST_GOOD_TTL_SECONDS", str(7 * 24 * 3600)))
+
+class LastGood:
+    """
+    Bounded map of key -> last good value per namespace, shared by all workers and
+    evicting the least recently stored. Values round-trip through JSON.
+    """
+    def __init__(self, namespace: str, maxsize: int = 128):
+        self.namespace = namespace
+        self.maxsize = maxsize
+        self._index = shared_cache.make_key("lastgood", namespace)
+
+    def _key(self, key: Hashable) -> str:
+        parts = key if isinstance(key, tuple) else (key,)
+        return shared_cache.make_key("lastgood", self.namespace, *parts)
+
+    def remember(self, key: Hashable, value: Any):
+        member = self._key(key)
+        shared_cache.set(member, value, LAST_GOOD_TTL_SECONDS)
+        evicted = shared_cache.index_add(self._index, member, self.maxsize)
+        if evicted:
+            shared_cache.delete(*evicted)
+
+    def recall(self, key: Hashable) -> Optional[Tuple[Any, int]]:
+        """(value, age in seconds) or None."""
+        return shared_cache.get(self._key(key))
+
+    def items(self) -> Iterator[Tuple[str, Any, int]]:
+        """(cache key, value, age in seconds), most recently stored first."""
+        members = shared_cache.index_members(self._index)
+        for member, hit in zip(members, shared_cache.get_many(members)):
+            if hit is not None:
+                yield member, hit[0], hit[1]
+
+def freshness_headers(age_seconds: int = 0, stale: bool = False) -> Dict[str, str]:
+    return {STALE_HEADER: "true" if stale else "false", AGE_HEADER: str(age_seconds)}
+
+def mark(body: dict, age_seconds: int = 0, stale: bool = False) -> dict:
+    """Copy of an object response with the freshness fields set."""
+    return {**body, "stale": stale, "dataAgeSeconds": age_seconds}
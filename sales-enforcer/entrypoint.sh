@@ -2,16 +2,84 @@
 set -e
 
 # This script checks an environment variable to decide what to run.
-# If APP_MODE is "api", it runs the web server.
-# If APP_MODE is "worker", it runs the Celery worker.
+# If APP_MODE is "api", it runs the web server: gunicorn with WEB_CONCURRENCY uvicorn workers
+#   (default: one per CPU; see gunicorn.conf.py). `kill -HUP 1` reloads the workers gracefully.
+# If APP_MODE is "webhooks", it runs one single-threaded worker per webhook partition
+#   (WEBHOOK_PARTITIONS_OWNED, default: all of 0..WEBHOOK_PARTITIONS-1), preserving per-deal order.
+# If APP_MODE is "scheduled", it runs the worker for beat jobs and other bulk work.
+# If APP_MODE is "alerts", it runs the worker for outbound notifications.
+# If APP_MODE is "worker", it runs every lane in one container (single-container setups): the
+#   webhook partitions as in "webhooks" mode, plus one worker for the scheduled and alert lanes.
+# In the multi-process modes, the container exits as soon as any worker process does, so the
+# orchestrator restarts it instead of a partition's queue growing unconsumed.
+# If APP_MODE is "beat", it runs the Celery beat scheduler. Nothing periodic (partition upkeep,
+#   weekly close, rotting sweep, deal sync, export) runs without it; deploy exactly one
+#   (sales-enforcer-beat in .github/workflows/deploy.yml).
+# Queue lanes are defined in queues.py.
+
+WEBHOOK_PARTITIONS="${WEBHOOK_PARTITIONS:-4}"
+WORKER_METRICS_PORT="${WORKER_METRICS_PORT:-9100}"
+CHILD_PIDS=""
+
+start_child() {
+  "$@" &
+  CHILD_PIDS="$CHILD_PIDS $!"
+}
+
+start_webhook_partitions() {
+  for p in $1; do
+    # Solo pool + prefetch 1: one message at a time, in queue order.
+    start_child env WORKER_METRICS_PORT=$((WORKER_METRICS_PORT + p)) \
+      celery -A celery_worker worker -Q "webhooks.$p" -n "webhooks-$p@%h" \
+      -P solo --concurrency=1 --prefetch-multiplier=1 --loglevel=INFO
+  done
+}
+
+# /bin/sh has no `wait -n`: poll the children and stop everything once one has exited.
+supervise_children() {
+  trap 'kill $CHILD_PIDS 2>/dev/null; wait; exit 143' TERM INT
+  while :; do
+    for pid in $CHILD_PIDS; do
+      if ! kill -0 "$pid" 2>/dev/null; then
+        echo "Worker process $pid exited; stopping the others so the container restarts."
+        kill $CHILD_PIDS 2>/dev/null || true
+        wait || true
+        exit 1
+      fi
+    done
+    sleep 5 &
+    wait $! || true
+  done
+}
 
 if [ "$APP_MODE" = "api" ]; then
   echo "Starting in API mode..."
-  exec uvicorn main:app --host 0.0.0.0 --port 80
+  # Workers write their metrics here so /metrics can report all of them.
+  export PROMETHEUS_MULTIPROC_DIR="${PROMETHEUS_MULTIPROC_DIR:-/tmp/prometheus-multiproc}"
+  exec gunicorn -c gunicorn.conf.py main:app
+elif [ "$APP_MODE" = "webhooks" ]; then
+  PARTITIONS="${WEBHOOK_PARTITIONS_OWNED:-$(seq 0 $((WEBHOOK_PARTITIONS - 1)))}"
+  echo "Starting in Webhooks mode for partitions: $(echo $PARTITIONS)..."
+  start_webhook_partitions "$PARTITIONS"
+  supervise_children
+elif [ "$APP_MODE" = "scheduled" ]; then
+  echo "Starting in Scheduled mode..."
+  exec celery -A celery_worker worker -Q scheduled -n "scheduled@%h" \
+    -P prefork --concurrency="${SCHEDULED_CONCURRENCY:-2}" --prefetch-multiplier=1 --loglevel=INFO
+elif [ "$APP_MODE" = "alerts" ]; then
+  echo "Starting in Alerts mode..."
+  exec celery -A celery_worker worker -Q alerts -n "alerts@%h" \
+    -P gevent --concurrency="${ALERTS_CONCURRENCY:-50}" --prefetch-multiplier=4 --loglevel=INFO
 elif [ "$APP_MODE" = "worker" ]; then
-  echo "Starting in Worker mode..."
-  exec celery -A celery_worker worker -P gevent --loglevel=INFO
+  echo "Starting in Worker mode (all lanes)..."
+  start_webhook_partitions "$(seq 0 $((WEBHOOK_PARTITIONS - 1)))"
+  start_child env WORKER_METRICS_PORT=$((WORKER_METRICS_PORT + WEBHOOK_PARTITIONS)) \
+    celery -A celery_worker worker -Q scheduled,alerts -n "worker@%h" -P gevent --loglevel=INFO
+  supervise_children
+elif [ "$APP_MODE" = "beat" ]; then
+  echo "Starting in Beat mode..."
+  exec celery -A celery_worker beat --loglevel=INFO
 else
-  echo "Error: APP_MODE environment variable not set or invalid (must be 'api' or 'worker')."
+  echo "Error: APP_MODE environment variable not set or invalid (must be 'api', 'webhooks', 'scheduled', 'alerts', 'worker' or 'beat')."
   exit 1
-fi
\ No newline at end of file
+fi
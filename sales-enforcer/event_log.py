@@ -0,0 +1,87 @@
+# sales-enforcer/event_log.py
+"""
+Durable, compressed log of incoming Pipedrive webhooks.
+
+Every webhook is appended to `webhook_events` before it is queued, as
+zlib-compressed JSON. While processing, the worker attaches the projected
+deal it fetched from Pipedrive (records.DealRecord), so a replay can score the
+event exactly as the live task did without calling Pipedrive again.
+Replays read the log in contiguous deal_id ranges ordered by (deal_id,
+received_at), so each segment is an index range scan.
+"""
+import zlib
+from typing import Iterator, List, Optional, Tuple
+
+import orjson
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from models import WebhookEvent
+from records import DealRecord
+
+COMPRESSION_LEVEL = 6
+
+def pack(obj) -> bytes:
+    return zlib.compress(orjson.dumps(obj), COMPRESSION_LEVEL)
+
+def unpack(blob: Optional[bytes]):
+    if blob is None:
+        return None
+    return orjson.loads(zlib.decompress(blob))
+
+def append(db: Session, payload: dict) -> int:
+    """Stores one webhook and returns its event id."""
+    deal_id = (payload.get("data") or {}).get("id")
+    event = WebhookEvent(deal_id=deal_id if isinstance(deal_id, int) else None, payload=pack(payload))
+    db.add(event)
+    db.commit()
+    return event.id
+
+def attach_snapshot(db: Session, event_id: int, deal: DealRecord):
+    db.query(WebhookEvent).filter(WebhookEvent.id == event_id).update(
+        {WebhookEvent.deal_snapshot: pack(deal.as_raw())}, synchronize_session=False,
+    )
+
+_SPLIT_SQL = text("""
+    SELECT percentile_disc(CAST(:fractions AS float8[])) WITHIN GROUP (ORDER BY deal_id)
+    FROM webhook_events
+    WHERE deal_id IS NOT NULL
+      AND (CAST(:since AS timestamptz) IS NULL OR received_at >= :since)
+      AND (CAST(:until AS timestamptz) IS NULL OR received_at < :until)
+""")
+
+def split_deal_ranges(conn, parts: int, since=None, until=None) -> List[Tuple[Optional[int], Optional[int]]]:
+    """
+    Splits the logged deal ids into at most `parts` [lo, hi) ranges holding
+    about as many events each (None = unbounded). A deal never spans two ranges.
+    """
+    if parts <= 1:
+        return [(None, None)]
+    cuts = conn.execute(_SPLIT_SQL, {
+        "fractions": [i / parts for i in range(1, parts)], "since": since, "until": until,
+    }).scalar() or []
+    bounds = [None, *sorted(set(cuts)), None]
+    return list(zip(bounds, bounds[1:]))
+
+_SEGMENT_SQL = text("""
+    SELECT deal_id, received_at, payload, deal_snapshot
+    FROM webhook_events
+    WHERE deal_id IS NOT NULL
+      AND (CAST(:lo AS integer) IS NULL OR deal_id >= :lo)
+      AND (CAST(:hi AS integer) IS NULL OR deal_id < :hi)
+      AND (CAST(:since AS timestamptz) IS NULL OR received_at >= :since)
+      AND (CAST(:until AS timestamptz) IS NULL OR received_at < :until)
+    ORDER BY deal_id, received_at, id
+""")
+
+def iter_segment(conn, lo: Optional[int], hi: Optional[int], since=None, until=None) -> Iterator[Tuple[int, object, dict, Optional[DealRecord]]]:
+    """
+    Streams (deal_id, received_at, payload, deal snapshot) for every event with
+    lo <= deal_id < hi, through a server-side cursor so memory stays flat.
+    """
+    result = conn.execution_options(stream_results=True, yield_per=2000).execute(
+        _SEGMENT_SQL, {"lo": lo, "hi": hi, "since": since, "until": until},
+    )
+    for deal_id, received_at, payload, snapshot in result:
+        raw = unpack(snapshot)
+        yield deal_id, received_at, unpack(payload), DealRecord(raw) if raw else None
@@ -0,0 +1,250 @@
+# sales-enforcer/exporter.py
+"""
+Columnar export of scorecard history for finance / BI.
+
+`points_ledger`, `deal_stage_events` and `user_milestones` are read through
+server-side cursors (`stream_results` + `yield_per`) and converted batch by
+batch into Arrow record batches, so memory stays bounded by EXPORT_BATCH_ROWS
+whatever the table size.
+
+- `export_to_directory` writes Hive-style partitioned Parquet
+  (<out>/<table>/quarter=2025Q3/part-<first_id>.parquet) and only exports rows
+  past the table's watermark (`export_watermarks.last_id`), so repeated runs
+  are incremental. Parts are named after the watermark they start from, so a
+  run that dies before saving its watermark is overwritten by the next one
+  rather than duplicated.
+- `stream_export` yields a single Parquet file (or Arrow IPC stream) as bytes
+  while it is being written, for the streaming download endpoint.
+
+Rows are selected by id, so a watermark is exact even for rows whose
+timestamps arrive out of order (e.g. replays). Ids can commit out of order
+too, so the upper bound is only taken once no transaction that could still
+commit a lower id is running (`settled_max_id`):
+
+    python -m exporter --out /exports [--tables points_ledger ...] [--full]
+"""
+import enum
+import os
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from sqlalchemy import BigInteger, Table, Text, cast, func, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from models import DealStageEvent, ExportWatermark, PointsLedger, UserMilestone
+
+EXPORT_BATCH_ROWS = 50_000
+# How long to wait for in-flight transactions before giving up on this run.
+EXPORT_SETTLE_SECONDS = 30.0
+_SETTLE_POLL_SECONDS = 0.2
+FORMATS = ("parquet", "arrow")
+
+_TIMESTAMP = pa.timestamp("us", tz="UTC")
+
+@dataclass(frozen=True)
+class ExportSpec:
+    table: Table
+    time_column: str
+    schema: pa.Schema
+
+EXPORTS: Dict[str, ExportSpec] = {
+    "points_ledger": ExportSpec(PointsLedger.__table__, "created_at", pa.schema([
+        ("id", pa.int64()), ("deal_id", pa.int64()), ("user_id", pa.int64()),
+        ("event_type", pa.string()), ("points", pa.int64()), ("notes", pa.string()),
+        ("created_at", _TIMESTAMP),
+    ])),
+    "deal_stage_events": ExportSpec(DealStageEvent.__table__, "entered_at", pa.schema([
+        ("id", pa.int64()), ("deal_id", pa.int64()), ("stage_id", pa.int64()), ("entered_at", _TIMESTAMP),
+    ])),
+    "user_milestones": ExportSpec(UserMilestone.__table__, "achieved_at", pa.schema([
+        ("id", pa.int64()), ("user_id", pa.int64()), ("milestone_rank", pa.string()), ("achieved_at", _TIMESTAMP),
+    ])),
+}
+
+def get_spec(table: str) -> ExportSpec:
+    if table not in EXPORTS:
+        raise ValueError(f"Unknown export table '{table}'. Choose from {sorted(EXPORTS)}.")
+    return EXPORTS[table]
+
+def _column(values, field: pa.Field) -> pa.Array:
+    if values and isinstance(values[0], enum.Enum):
+        values = [v.value if v is not None else None for v in values]
+    return pa.array(values, type=field.type)
+
+def _xid(expr):
+    return cast(cast(expr, Text), BigInteger)
+
+def settled_max_id(conn, table: str, floor: int = 0, settle_seconds: float = EXPORT_SETTLE_SECONDS) -> int:
+    """
+    max(id) once every id below it is committed or rolled back for good; `floor`
+    if that takes longer than settle_seconds.
+
+    A transaction that took a lower id may still be running when max(id) is
+    read. Every such transaction has an xid below that snapshot's xmax, so the
+    bound is safe once the oldest running xid (pg_snapshot_xmin) has passed it.
+    """
+    spec = get_spec(table)
+    snapshot_xmax, top = conn.execute(select(
+        _xid(func.pg_snapshot_xmax(func.pg_current_snapshot())),
+        select(func.coalesce(func.max(spec.table.c.id), 0)).scalar_subquery(),
+    )).one()
+    deadline = time.monotonic() + settle_seconds
+    while True:
+        conn.commit()  # each check needs a fresh snapshot
+        if conn.execute(select(_xid(func.pg_snapshot_xmin(func.pg_current_snapshot())))).scalar() >= snapshot_xmax:
+            return top
+        if time.monotonic() >= deadline:
+            return floor
+        time.sleep(_SETTLE_POLL_SECONDS)
+
+def iter_batches(conn, table: str, after_id: int = 0, up_to_id: Optional[int] = None,
+                 start: Optional[datetime] = None, end: Optional[datetime] = None,
+                 batch_size: int = EXPORT_BATCH_ROWS) -> Iterator[pa.RecordBatch]:
+    """Rows with after_id < id <= up_to_id (and optionally in [start, end]) as Arrow batches, in id order."""
+    spec = get_spec(table)
+    t = spec.table
+    stmt = select(*[t.c[name] for name in spec.schema.names]).where(t.c.id > after_id).order_by(t.c.id)
+    if up_to_id is not None:
+        stmt = stmt.where(t.c.id <= up_to_id)
+    if start is not None:
+        stmt = stmt.where(t.c[spec.time_column] >= start)
+    if end is not None:
+        stmt = stmt.where(t.c[spec.time_column] <= end)
+
+    result = conn.execution_options(stream_results=True, yield_per=batch_size).execute(stmt)
+    for rows in result.partitions():
+        columns = list(zip(*rows))
+        yield pa.RecordBatch.from_arrays(
+            [_column(list(col), field) for col, field in zip(columns, spec.schema)],
+            schema=spec.schema,
+        )
+
+# --- Streaming download ---
+
+class _ChunkSink:
+    """Write-only file object that hands written bytes back to a generator."""
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def writable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return False
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> Iterator[bytes]:
+        chunks, self._chunks = self._chunks, []
+        if chunks:
+            yield b"".join(chunks)
+
+def stream_export(conn, table: str, fmt: str = "parquet", **filters) -> Iterator[bytes]:
+    """One Parquet file (or Arrow IPC stream), yielded a row group at a time."""
+    if fmt not in FORMATS:
+        raise ValueError(f"format must be one of {FORMATS}")
+    spec = get_spec(table)
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, spec.schema, compression="zstd") if fmt == "parquet" else pa.ipc.new_stream(sink, spec.schema)
+    try:
+        for batch in iter_batches(conn, table, **filters):
+            writer.write_batch(batch)
+            yield from sink.drain()
+    finally:
+        writer.close()
+    yield from sink.drain()
+
+# --- Partitioned, incremental export ---
+
+def quarter_label(ts: Optional[datetime]) -> str:
+    if ts is None:
+        return "unknown"
+    ts = ts.astimezone(timezone.utc)
+    return f"{ts.year}Q{(ts.month - 1) // 3 + 1}"
+
+def get_watermark(conn, table: str) -> int:
+    row = conn.execute(select(ExportWatermark.last_id).where(ExportWatermark.table_name == table)).first()
+    return row[0] if row else 0
+
+def set_watermark(conn, table: str, last_id: int):
+    stmt = pg_insert(ExportWatermark.__table__).values(table_name=table, last_id=last_id, exported_at=func.now())
+    conn.execute(stmt.on_conflict_do_update(
+        index_elements=["table_name"],
+        set_={"last_id": stmt.excluded.last_id, "exported_at": stmt.excluded.exported_at},
+    ))
+
+def export_to_directory(engine, table: str, out_dir: str, full: bool = False) -> dict:
+    """
+    Appends rows past the table's watermark to quarter-partitioned Parquet files under
+    out_dir/<table>/, then advances the watermark. `full` re-exports from the start.
+    """
+    spec = get_spec(table)
+    with engine.connect() as conn:
+        after_id = 0 if full else get_watermark(conn, table)
+        up_to_id = settled_max_id(conn, table, floor=after_id)
+        if up_to_id <= after_id:
+            return {"table": table, "rows": 0, "files": [], "watermark": after_id}
+
+        # The same start id after a crash means the same file names: the retry replaces them.
+        part_name = f"part-{after_id + 1}.parquet"
+        writers: Dict[str, pq.ParquetWriter] = {}
+        paths: Dict[str, str] = {}
+        rows = 0
+        try:
+            for batch in iter_batches(conn, table, after_id, up_to_id):
+                quarters = [quarter_label(ts) for ts in batch.column(spec.time_column).to_pylist()]
+                for quarter in set(quarters):
+                    if quarter not in writers:
+                        directory = os.path.join(out_dir, table, f"quarter={quarter}")
+                        os.makedirs(directory, exist_ok=True)
+                        paths[quarter] = os.path.join(directory, part_name)
+                        writers[quarter] = pq.ParquetWriter(paths[quarter] + ".tmp", spec.schema, compression="zstd")
+                    indices = [i for i, q in enumerate(quarters) if q == quarter]
+                    writers[quarter].write_batch(batch.take(pa.array(indices)))
+                rows += batch.num_rows
+        finally:
+            for writer in writers.values():
+                writer.close()
+        # Files become visible only once complete; a failed run leaves just .tmp files behind.
+        for path in paths.values():
+            os.replace(path + ".tmp", path)
+        set_watermark(conn, table, up_to_id)
+        conn.commit()
+    return {"table": table, "rows": rows, "files": sorted(paths.values()), "watermark": up_to_id}
+
+def main():
+    import argparse
+    import json
+
+    from database import engine
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--out", default=os.getenv("EXPORT_DIR"), required=not os.getenv("EXPORT_DIR"))
+    parser.add_argument("--tables", nargs="+", default=list(EXPORTS), choices=list(EXPORTS))
+    parser.add_argument("--full", action="store_true", help="Ignore the watermarks and export everything.")
+    args = parser.parse_args()
+
+    for table in args.tables:
+        print(json.dumps(export_to_directory(engine, table, args.out, full=args.full)))
+
+if __name__ == "__main__":
+    main()
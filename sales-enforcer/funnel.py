@@ -0,0 +1,89 @@
+# sales-enforcer/funnel.py
+"""
+Stage-funnel conversion computed in a single SQL query.
+
+For a sequence of stage ids (default: every stage in config.STAGES, in
+"order") followed by a final "won" step, each deal with stage activity in the
+period is reduced to one row of reached-flags (`bool_or`). The outer query
+counts, per step, how many deals reached it and how many reached both it and
+the previous step, using `COUNT(*) FILTER (...)`. Results are cached per
+(sequence, period) in the shared cache, so API workers share them; cached
+results carry `start` / `end` as ISO strings.
+"""
+from datetime import datetime, timezone
+from typing import List, Optional, Sequence
+
+from sqlalchemy import and_, func
+from sqlalchemy.orm import Session
+
+import config
+import shared_cache
+from models import DealStageEvent, PointsLedger
+
+WON_STEP = "won"
+WON_NOTE = "Deal WON"
+
+# Open periods change with every webhook; closed ones only with late events.
+OPEN_PERIOD_TTL_SECONDS = 300
+CLOSED_PERIOD_TTL_SECONDS = 3600
+
+def default_stage_sequence() -> List[int]:
+    return [sid for sid, _ in sorted(config.STAGES.items(), key=lambda kv: kv[1]["order"])]
+
+def _pct(numerator: int, denominator: int) -> int:
+    return int((numerator / denominator) * 100) if denominator else 0
+
+def compute_funnel(db: Session, start: datetime, end: datetime, stage_ids: Optional[Sequence[int]] = None) -> dict:
+    stage_ids = list(stage_ids or default_stage_sequence())
+    unknown = [sid for sid in stage_ids if sid not in config.STAGES]
+    if unknown:
+        raise ValueError(f"Unknown stage ids: {unknown}")
+
+    per_deal = (
+        db.query(
+            DealStageEvent.deal_id.label("deal_id"),
+            *[func.bool_or(DealStageEvent.stage_id == sid).label(f"s{i}") for i, sid in enumerate(stage_ids)],
+        )
+        .filter(DealStageEvent.entered_at.between(start, end))
+        .group_by(DealStageEvent.deal_id)
+        .subquery()
+    )
+    won = (
+        db.query(PointsLedger.deal_id.label("deal_id"))
+        .filter(PointsLedger.notes == WON_NOTE, PointsLedger.created_at <= end)
+        .distinct()
+        .subquery()
+    )
+
+    reached_flags = [per_deal.c[f"s{i}"].is_(True) for i in range(len(stage_ids))] + [won.c.deal_id.isnot(None)]
+    columns = [func.count().filter(flag) for flag in reached_flags]
+    columns += [func.count().filter(and_(prev, cur)) for prev, cur in zip(reached_flags, reached_flags[1:])]
+    columns.append(func.count().filter(and_(reached_flags[0], reached_flags[-1])))
+    row = db.query(*columns).select_from(per_deal).outerjoin(won, won.c.deal_id == per_deal.c.deal_id).one()
+
+    n_steps = len(reached_flags)
+    reached, converted, first_to_won = list(row[:n_steps]), [None] + list(row[n_steps:-1]), row[-1]
+    step_keys = stage_ids + [WON_STEP]
+    steps = []
+    for i, key in enumerate(step_keys):
+        steps.append({
+            "stage_id": key if key != WON_STEP else None,
+            "name": config.STAGES[key]["name"] if key != WON_STEP else "Won",
+            "reached": reached[i],
+            "converted_from_previous": converted[i],
+            "conversion_pct": _pct(converted[i], reached[i - 1]) if i else None,
+        })
+    return {
+        "start": start,
+        "end": end,
+        "steps": steps,
+        "overall_conversion_pct": _pct(first_to_won, reached[0]),
+    }
+
+def get_funnel(db: Session, start: datetime, end: datetime, stage_ids: Optional[Sequence[int]] = None) -> dict:
+    """Cached compute_funnel, keyed by stage sequence and period."""
+    sequence = list(stage_ids or default_stage_sequence())
+    key = shared_cache.make_key("funnel", ",".join(map(str, sequence)), start.isoformat(), end.isoformat())
+    ttl = CLOSED_PERIOD_TTL_SECONDS if end < datetime.now(timezone.utc) else OPEN_PERIOD_TTL_SECONDS
+    result, _ = shared_cache.get_or_compute(key, ttl, lambda: compute_funnel(db, start, end, sequence))
+    return result
@@ -0,0 +1,50 @@
+# sales-enforcer/gunicorn.conf.py
+"""
+Production API server: a gunicorn master managing N uvicorn worker processes.
+
+    gunicorn -c gunicorn.conf.py main:app
+
+Graceful reload (new code or config, no dropped requests): `kill -HUP 1` in the
+container. New workers are started first; old ones finish their in-flight
+requests within graceful_timeout and exit. TERM shuts down the same way.
+
+Workers share cached Pipedrive data and dashboard snapshots through
+shared_cache, and metrics through PROMETHEUS_MULTIPROC_DIR (see
+observability.py).
+"""
+import os
+import shutil
+
+bind = f"0.0.0.0:{os.getenv('PORT', '80')}"
+# cpu_count() is the node's cores, not the container's; size from the CPUs we may
+# run on, capped because every worker holds its own DB pool and Pipedrive clients.
+MAX_DEFAULT_WORKERS = 4
+workers = int(os.getenv("WEB_CONCURRENCY") or min(len(os.sched_getaffinity(0)), MAX_DEFAULT_WORKERS))
+worker_class = "uvicorn_worker.UvicornWorker"
+
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", "30"))
+# Long enough for a cold dashboard build or a large export stream.
+timeout = int(os.getenv("WORKER_TIMEOUT", "120"))
+keepalive = 5
+
+# Recycle workers now and then so slow leaks can't build up; the jitter keeps
+# them from all restarting at once.
+max_requests = int(os.getenv("MAX_REQUESTS", "10000"))
+max_requests_jitter = max_requests // 10
+
+# Each worker imports the app after the fork, so a HUP picks up new code and no
+# database or Redis connection is ever shared between processes.
+preload_app = False
+
+def on_starting(server):
+    # Samples from a previous master are meaningless; start from an empty directory.
+    directory = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+    if directory:
+        shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory, exist_ok=True)
+
+def child_exit(server, worker):
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,109 @@
+# sales-enforcer/health_kpis.py
+"""
+Sales-health KPIs kept as running counters instead of dashboard-time queries.
+
+- lead_contacted_same_day: of the sales-pipeline deals added in a month, how
+  many were contacted (an activity, or a move past Lead Intake) on the day
+  they were added.
+- design_fee_compliance: of the deals that tried to enter the design-fee
+  stage in a month, how many already had the design fee paid on their first
+  attempt.
+
+The webhook task calls `record_webhook` with the deal it fetched and the
+scoring result. Each deal is counted at most once per side of each KPI
+(`health_kpi_marks`), and every count lands in `health_kpi_counters` per
+user and team-wide. The dashboard reads only the counters.
+"""
+from datetime import date, datetime, timezone
+from typing import Dict, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+import config
+from models import HealthKpiCounter
+from utils.timestamps import DealTimes
+
+LEAD_CONTACTED_SAME_DAY = "lead_contacted_same_day"
+DESIGN_FEE_COMPLIANCE = "design_fee_compliance"
+NUMERATOR = "numerator"
+DENOMINATOR = "denominator"
+TEAM_USER_ID = HealthKpiCounter.TEAM_USER_ID
+
+def month_of(ts: datetime) -> date:
+    return ts.astimezone(timezone.utc).date().replace(day=1)
+
+_MARK_SQL = text("""
+    INSERT INTO health_kpi_marks (metric, deal_id, side, month)
+    VALUES (:metric, :deal_id, :side, :month)
+    ON CONFLICT DO NOTHING
+    RETURNING deal_id
+""")
+
+def _count(db: Session, metric: str, side: str, deal_id: int, user_id: Optional[int], month: date) -> bool:
+    """Counts the deal on one side of a KPI unless it already was. Returns whether it was counted now."""
+    if db.execute(_MARK_SQL, {"metric": metric, "deal_id": deal_id, "side": side, "month": month}).first() is None:
+        return False
+    db.execute(text(f"""
+        INSERT INTO health_kpi_counters (metric, user_id, month, numerator, denominator)
+        SELECT :metric, u.user_id, :month, {int(side == NUMERATOR)}, {int(side == DENOMINATOR)}
+        FROM (VALUES (:team_user_id), (:user_id)) AS u(user_id)
+        WHERE u.user_id IS NOT NULL
+        ON CONFLICT (metric, user_id, month) DO UPDATE
+        SET {side} = health_kpi_counters.{side} + 1
+    """), {"metric": metric, "month": month, "user_id": user_id, "team_user_id": TEAM_USER_ID})
+    return True
+
+def _design_fee_paid(deal) -> bool:
+    value = deal.get(config.DASHBOARD_CONFIG["field_keys"]["design_fee_paid"])
+    if isinstance(value, dict):
+        value = value.get("id")
+    return value is not None and str(value) == str(config.DASHBOARD_CONFIG["design_fee_paid_yes_id"])
+
+def _contacted_same_day(times: DealTimes, deal) -> bool:
+    added_on = times.add_time.date()
+    if times.last_activity_date and times.last_activity_date.date() == added_on:
+        return True
+    lead_stage = config.STAGES.get(config.DASHBOARD_CONFIG["lead_intake_stage"], {"order": 0})
+    stage = config.STAGES.get(deal.get("stage_id"))
+    moved_on = stage is not None and stage["order"] > lead_stage["order"]
+    return bool(moved_on and times.stage_change_time and times.stage_change_time.date() == added_on)
+
+def record_webhook(db: Session, deal, user_id: Optional[int], result, now: Optional[datetime] = None):
+    """Folds one processed webhook (fetched deal + scoring.ScoreResult) into the KPI counters."""
+    now = now or datetime.now(timezone.utc)
+    deal_id = deal.get("id")
+    if deal.get("pipeline_id") != config.SALES_FLOW_PIPELINE_ID:
+        return
+
+    times = DealTimes(deal)
+    if times.add_time:
+        month = month_of(times.add_time)
+        _count(db, LEAD_CONTACTED_SAME_DAY, DENOMINATOR, deal_id, user_id, month)
+        if _contacted_same_day(times, deal):
+            _count(db, LEAD_CONTACTED_SAME_DAY, NUMERATOR, deal_id, user_id, month)
+
+    fee_stage = config.DASHBOARD_CONFIG["design_fee_stage"]
+    attempted = fee_stage in result.stage_events or (result.compliance_failure and result.compliance_failure[0] == fee_stage)
+    if attempted:
+        month = month_of(now)
+        first_attempt = _count(db, DESIGN_FEE_COMPLIANCE, DENOMINATOR, deal_id, user_id, month)
+        if first_attempt and _design_fee_paid(deal):
+            _count(db, DESIGN_FEE_COMPLIANCE, NUMERATOR, deal_id, user_id, month)
+
+_RATES_SQL = text("""
+    SELECT metric, SUM(numerator) AS numerator, SUM(denominator) AS denominator
+    FROM health_kpi_counters
+    WHERE user_id = :user_id
+      AND month BETWEEN date_trunc('month', CAST(:start AS timestamp))::date AND CAST(:end AS date)
+    GROUP BY metric
+""")
+
+def get_rates(db: Session, start: datetime, end: datetime, user_id: Optional[int] = None) -> Dict[str, int]:
+    """Whole-percent rate per KPI over the months overlapping [start, end] (0 when there's no data)."""
+    rates = {LEAD_CONTACTED_SAME_DAY: 0, DESIGN_FEE_COMPLIANCE: 0}
+    params = {"user_id": user_id if user_id is not None else TEAM_USER_ID, "start": start, "end": end}
+    for r in db.execute(_RATES_SQL, params):
+        if r.denominator:
+            rates[r.metric] = int((r.numerator / r.denominator) * 100)
+    return rates
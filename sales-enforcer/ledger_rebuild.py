@@ -0,0 +1,172 @@
+# sales-enforcer/ledger_rebuild.py
+"""
+Rebuild the points ledger from the webhook event log.
+
+Replays every logged event through the current scoring rules (scoring.py)
+into a shadow table, so changes to config.STAGES / POINT_CONFIG can be applied
+retroactively and compared before anything is swapped in:
+
+    python -m ledger_rebuild --workers 8 [--since 2025-01-01] [--until 2026-01-01]
+
+Events are split into contiguous deal_id ranges of about equal size, one per
+worker, so each worker's read is a range scan of the (deal_id, received_at)
+index. Each worker process streams its range in that order through a
+server-side cursor, keeps per-deal state only for the deal it is on, and
+bulk-loads the resulting entries with COPY in batches. The shadow table is
+UNLOGGED and recreated on every run; promoting it is a deliberate manual step.
+
+With --since, stages a deal reached before the window are seeded from
+deal_stage_events, so they aren't credited again. The shadow table then holds
+only the window's entries.
+"""
+import argparse
+import csv
+import io
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from typing import Dict, Optional, Set
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import NullPool
+
+import event_log
+import settings
+
+logger = logging.getLogger(__name__)
+
+SHADOW_TABLE = "points_ledger_shadow"
+COPY_BATCH_ROWS = 50_000
+COPY_COLUMNS = ("deal_id", "user_id", "event_type", "points", "notes", "created_at")
+
+def _engine():
+    # Each process gets its own connections; nothing is shared across the fork.
+    return create_engine(settings.DATABASE_URL, poolclass=NullPool)
+
+def create_shadow_table(engine, table: str = SHADOW_TABLE):
+    with engine.begin() as conn:
+        conn.execute(text(f'DROP TABLE IF EXISTS "{table}"'))
+        conn.execute(text(f"""
+            CREATE UNLOGGED TABLE "{table}" (
+                deal_id INTEGER NOT NULL,
+                user_id INTEGER NOT NULL,
+                event_type VARCHAR NOT NULL,
+                points INTEGER NOT NULL,
+                notes VARCHAR,
+                created_at TIMESTAMP WITH TIME ZONE NOT NULL
+            )
+        """))
+
+def _copy_rows(raw_conn, table: str, buffer: io.StringIO):
+    buffer.seek(0)
+    with raw_conn.cursor() as cur:
+        cur.copy_expert(f'COPY "{table}" ({", ".join(COPY_COLUMNS)}) FROM STDIN WITH (FORMAT csv)', buffer)
+    raw_conn.commit()
+
+_REACHED_BEFORE_SQL = text("""
+    SELECT s.deal_id, array_agg(DISTINCT s.stage_id)
+    FROM deal_stage_events s
+    WHERE s.entered_at < :since
+      AND s.deal_id IN (
+          SELECT deal_id FROM webhook_events
+          WHERE deal_id IS NOT NULL
+            AND (CAST(:lo AS integer) IS NULL OR deal_id >= :lo)
+            AND (CAST(:hi AS integer) IS NULL OR deal_id < :hi)
+            AND received_at >= :since
+            AND (CAST(:until AS timestamptz) IS NULL OR received_at < :until)
+      )
+    GROUP BY s.deal_id
+""")
+
+def reached_before(conn, since: datetime, lo: Optional[int], hi: Optional[int], until: Optional[datetime] = None) -> Dict[int, Set[int]]:
+    """Stages each deal with events in the window had already reached before `since`."""
+    rows = conn.execute(_REACHED_BEFORE_SQL, {"since": since, "until": until, "lo": lo, "hi": hi})
+    return {deal_id: set(stage_ids) for deal_id, stage_ids in rows}
+
+def replay_partition(partition: int, lo: Optional[int], hi: Optional[int], since: Optional[datetime], until: Optional[datetime], table: str = SHADOW_TABLE) -> dict:
+    """Replays the events of deals lo <= deal_id < hi into the shadow table. Runs in a worker process."""
+    import scoring
+    from records import DealRecord
+
+    engine = _engine()
+    events = rows = 0
+    started = time.perf_counter()
+    buffer, pending = io.StringIO(), 0
+    writer = csv.writer(buffer)
+    raw_conn = engine.raw_connection()
+    try:
+        with engine.connect() as conn:
+            earlier = reached_before(conn, since, lo, hi, until) if since else {}
+            current_deal, reached = None, set()
+            for deal_id, received_at, payload, snapshot in event_log.iter_segment(conn, lo, hi, since, until):
+                if deal_id != current_deal:
+                    current_deal, reached = deal_id, set(earlier.pop(deal_id, ()))
+                events += 1
+                current = payload.get("data") or {}
+                if not current.get("owner_id"):
+                    continue
+                # Events logged before snapshots existed fall back to the webhook's own copy of the deal.
+                deal = snapshot or DealRecord(current)
+                result = scoring.score_event(payload, deal, reached, at=received_at)
+                reached.update(result.stage_events)
+                for e in result.ledger_entries:
+                    writer.writerow((e["deal_id"], e["user_id"], e["event_type"].value, e["points"], e["notes"], e["created_at"].isoformat()))
+                    pending += 1
+                if pending >= COPY_BATCH_ROWS:
+                    _copy_rows(raw_conn, table, buffer)
+                    rows += pending
+                    buffer, pending = io.StringIO(), 0
+                    writer = csv.writer(buffer)
+        if pending:
+            _copy_rows(raw_conn, table, buffer)
+            rows += pending
+    finally:
+        raw_conn.close()
+        engine.dispose()
+    return {"partition": partition, "events": events, "rows": rows, "seconds": round(time.perf_counter() - started, 2)}
+
+def rebuild(workers: int, since: Optional[datetime] = None, until: Optional[datetime] = None, table: str = SHADOW_TABLE) -> dict:
+    engine = _engine()
+    create_shadow_table(engine, table)
+    with engine.connect() as conn:
+        ranges = event_log.split_deal_ranges(conn, workers, since, until)
+    engine.dispose()
+
+    started = time.perf_counter()
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(replay_partition, i, lo, hi, since, until, table) for i, (lo, hi) in enumerate(ranges)]
+        for future in as_completed(futures):
+            r = future.result()
+            logger.info(f"Partition {r['partition']}: {r['events']} events -> {r['rows']} ledger rows in {r['seconds']}s")
+            results.append(r)
+
+    engine = _engine()
+    with engine.begin() as conn:
+        conn.execute(text(f'CREATE INDEX ON "{table}" (user_id, created_at)'))
+        conn.execute(text(f'ANALYZE "{table}"'))
+    engine.dispose()
+    return {
+        "table": table,
+        "events": sum(r["events"] for r in results),
+        "rows": sum(r["rows"] for r in results),
+        "seconds": round(time.perf_counter() - started, 2),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4)
+    parser.add_argument("--since", type=datetime.fromisoformat, default=None, help="Only replay events received at or after this time.")
+    parser.add_argument("--until", type=datetime.fromisoformat, default=None, help="Only replay events received before this time.")
+    parser.add_argument("--table", default=SHADOW_TABLE)
+    args = parser.parse_args()
+
+    from observability import configure_logging
+    configure_logging()
+    summary = rebuild(args.workers, args.since, args.until, args.table)
+    logger.info(f"Rebuild complete: {summary}")
+
+if __name__ == "__main__":
+    main()
@@ -1,23 +1,39 @@
-from fastapi import FastAPI, Request, Response, Depends
+from fastapi import FastAPI, Request, Response, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.orm import Session
-from sqlalchemy import func, desc, case, extract
-from datetime import datetime, timedelta, timezone, date
+from sqlalchemy import func, desc, case
+from datetime import datetime, timedelta, timezone
 from collections import Counter
-import math
 from pydantic import BaseModel
-import asyncio
+import logging
+import os
 
-from celery_worker import process_pipedrive_event
-from database import SessionLocal
-from models import PointsLedger, DealStageEvent, PointEventType
+from database import SessionLocal, get_db
+from observability import configure_logging, install_fastapi
+from models import PointsLedger, PointEventType
 import pipedrive_client
 import config
+import event_log
+import producer
+import degraded
+import shared_cache
+import funnel
+import points_series
+import activity_calendar
+import health_kpis
+from utils.timestamps import DealTimes
 from routers import reports as reports_router
 from routers import activities as activities_router
-from utils import ensure_timezone_aware, time_ago # ✅ CHANGED: Import from utils.py
+from routers import analytics as analytics_router
+from routers import exports as exports_router
+from utils import get_current_quarter_dates, time_ago, FastJSONResponse, NEXT_CURSOR_HEADER
 
-app = FastAPI()
+configure_logging()
+logger = logging.getLogger(__name__)
+
+app = FastAPI(default_response_class=FastJSONResponse)
+install_fastapi(app)
 
 app.add_middleware(
     CORSMiddleware,
@@ -25,45 +41,31 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, degraded.STALE_HEADER, degraded.AGE_HEADER, exports_router.EXPORT_WATERMARK_HEADER],
 )
 app.include_router(reports_router.router, prefix="/api")
 app.include_router(activities_router.router, prefix="/api") 
+app.include_router(analytics_router.router, prefix="/api")
+app.include_router(exports_router.router, prefix="/api")
 
 # --- Pydantic Models ---
 class User(BaseModel):
     id: int
     name: str
 
-# --- Database Dependency ---
-def get_db():
+# --- Helper Functions ---
+def _append_event(payload: dict):
     db = SessionLocal()
     try:
-        yield db
+        return event_log.append(db, payload)
+    except Exception as e:
+        # Never drop a webhook because the log is unavailable; it just won't be replayable.
+        db.rollback()
+        logger.exception(f"Could not append webhook to the event log: {e}")
+        return None
     finally:
         db.close()
 
-# --- Helper Functions ---
-# ✅ REMOVED: `ensure_timezone_aware` and `time_ago` are now in utils.py
-
-def get_current_quarter_dates():
-    now = datetime.now(timezone.utc)
-    current_quarter = math.ceil(now.month / 3)
-    start_month = 3 * current_quarter - 2
-    end_month = 3 * current_quarter
-    start_date = datetime(now.year, start_month, 1, tzinfo=timezone.utc)
-    
-    next_month_start_year = now.year
-    next_month_start_month = end_month + 1
-    if next_month_start_month > 12:
-        next_month_start_month = 1
-        next_month_start_year += 1
-        
-    next_month_start = datetime(next_month_start_year, next_month_start_month, 1, tzinfo=timezone.utc)
-    end_date = next_month_start - timedelta(days=1)
-    
-    quarter_name = f"Q{current_quarter} {now.year}"
-    return start_date, end_date.replace(hour=23, minute=59, second=59), quarter_name
-
 # --- API Endpoints ---
 @app.get("/")
 def read_root():
@@ -72,17 +74,58 @@ def read_root():
 @app.post("/webhook/pipedrive")
 async def pipedrive_webhook(request: Request):
     payload = await request.json()
-    process_pipedrive_event.delay(payload)
+    # The correlation id set by the metrics middleware travels with the task headers.
+    logger.info("Webhook received", extra={"deal_id": (payload.get("data") or {}).get("id")})
+    # Log the raw event durably before queueing it, so the ledger can be rebuilt later.
+    event_id = await run_in_threadpool(_append_event, payload)
+    producer.send_task(producer.PROCESS_PIPEDRIVE_EVENT, (payload, event_id))
     return Response(status_code=200)
 
+# Last good responses, served (marked stale) while Pipedrive is failing.
+_last_good = degraded.LastGood("main", maxsize=8)
+# Dashboard snapshots are built by one worker and shared with the rest for this long.
+DASHBOARD_TTL_SECONDS = int(os.getenv("DASHBOARD_TTL_SECONDS", "60"))
+
 @app.get("/api/users", response_model=list[User], tags=["Users"])
 async def get_sales_users():
-    users = await pipedrive_client.get_all_users_async()
-    return [{"id": user["id"], "name": user["name"]} for user in users if user]
+    try:
+        users, age = await pipedrive_client.get_active_users_async()
+    except pipedrive_client.UPSTREAM_ERRORS as e:
+        hit = await run_in_threadpool(_last_good.recall, "users")
+        if hit is None:
+            raise HTTPException(status_code=503, detail="Pipedrive is unavailable.")
+        logger.warning(f"Serving stale user list: {e}")
+        body, age = hit
+        return FastJSONResponse(body, headers=degraded.freshness_headers(age, stale=True))
+    body = [{"id": user["id"], "name": user["name"]} for user in users]
+    if age == 0:
+        await run_in_threadpool(_last_good.remember, "users", body)
+    return FastJSONResponse(body, headers=degraded.freshness_headers(age))
 
 
 @app.get("/api/dashboard-data", tags=["Dashboard"])
 def get_dashboard_data(db: Session = Depends(get_db)):
+    """
+    Dashboard for the current quarter. If Pipedrive is failing (or its circuit is open),
+    the last good dashboard is returned with `"stale": true` and its age.
+    """
+    _, _, quarter_name = get_current_quarter_dates()
+    try:
+        data, age = shared_cache.get_or_compute(
+            shared_cache.make_key("dashboard", quarter_name), DASHBOARD_TTL_SECONDS, lambda: _build_dashboard_data(db),
+        )
+    except pipedrive_client.UPSTREAM_ERRORS as e:
+        hit = _last_good.recall(("dashboard", quarter_name))
+        if hit is None:
+            raise HTTPException(status_code=503, detail="Pipedrive is unavailable and no cached dashboard exists yet.")
+        logger.warning(f"Serving stale dashboard: {e}")
+        data, age = hit
+        return FastJSONResponse(degraded.mark(data, age, stale=True), headers=degraded.freshness_headers(age, stale=True))
+    if age == 0:
+        _last_good.remember(("dashboard", quarter_name), data)
+    return FastJSONResponse(degraded.mark(data, age), headers=degraded.freshness_headers(age))
+
+def _build_dashboard_data(db: Session) -> dict:
     start_date, end_date, quarter_name = get_current_quarter_dates()
 
     # --- 1. KPIs ---
@@ -93,18 +136,12 @@ def get_dashboard_data(db: Session = Depends(get_db)):
         "status": "won",
         "won_date_since": start_date.strftime('%Y-%m-%d')
     })
-    won_deals_this_quarter = [
-        d for d in won_deals_this_quarter 
-        if d and d.get("won_time") and ensure_timezone_aware(datetime.fromisoformat(d["won_time"].replace('Z', '+00:00'))) <= end_date
-    ]
-
-    total_days_to_close, deals_for_avg = 0, 0
-    for deal in won_deals_this_quarter:
-        if deal.get("add_time") and deal.get("won_time"):
-            add_time = ensure_timezone_aware(datetime.fromisoformat(deal["add_time"].replace('Z', '+00:00')))
-            won_time = ensure_timezone_aware(datetime.fromisoformat(deal["won_time"].replace('Z', '+00:00')))
-            total_days_to_close += (won_time - add_time).days
-            deals_for_avg += 1
+    # Parse each deal's timestamps once and reuse them for the filter and the average.
+    won_deal_times = [DealTimes(d) for d in won_deals_this_quarter if d]
+    won_deal_times = [t for t in won_deal_times if t.won_time and t.won_time <= end_date]
+
+    days_to_close = [t.days_to_win for t in won_deal_times if t.days_to_win is not None]
+    total_days_to_close, deals_for_avg = sum(days_to_close), len(days_to_close)
     avg_speed_to_close = round(total_days_to_close / deals_for_avg, 1) if deals_for_avg > 0 else 0
 
     # --- 2. Leaderboard ---
@@ -120,21 +157,20 @@ def get_dashboard_data(db: Session = Depends(get_db)):
         .limit(5)
         .all()
     )
+    activity_status = activity_calendar.get_user_status(db, [row.user_id for row in leaderboard_query])
     leaderboard = []
     for row in leaderboard_query:
         user_info = pipedrive_client.get_user(row.user_id)
         leaderboard.append({
             "id": row.user_id, "name": user_info.get("name", f"User {row.user_id}"),
             "avatar": user_info.get("icon_url", f"https://i.pravatar.cc/150?u={row.user_id}"),
-            "points": int(row.total_score or 0), "dealsWon": row.deals_won, "onStreak": False,
+            "points": int(row.total_score or 0), "dealsWon": row.deals_won, "onStreak": activity_status.get(row.user_id, {}).get("on_streak", False),
         })
 
     # --- 3. Points Over Time ---
-    points_by_week = db.query(
-        extract('week', PointsLedger.created_at).label('week_number'),
-        func.sum(PointsLedger.points).label('total_points')
-    ).filter(PointsLedger.created_at >= datetime.now(timezone.utc) - timedelta(weeks=12)).group_by('week_number').order_by('week_number').all()
-    points_over_time = [{"week": f"W{int(r.week_number)}", "points": r.total_points} for r in points_by_week]
+    today = datetime.now(timezone.utc).date()
+    series = points_series.get_points_series(db, today - timedelta(weeks=11), today, granularity="week")
+    points_over_time = [{"week": f"W{b['bucket_start'].isocalendar().week}", "points": b["points"]} for b in series]
 
     # --- 4. Recent Activity ---
     recent_events = db.query(PointsLedger).order_by(desc(PointsLedger.created_at)).limit(5).all()
@@ -142,14 +178,12 @@ def get_dashboard_data(db: Session = Depends(get_db)):
     recent_activity = [{"id": entry.id, "type": "win" if entry.notes and "won" in entry.notes.lower() else type_map.get(entry.event_type, "stage"), "text": entry.notes, "time": time_ago(entry.created_at) } for entry in recent_events]
 
     # --- 5. Sales Health ---
-    qual_stage_id, proposal_stage_id = 91, 94
-    deals_reached_qual = set(r[0] for r in db.query(DealStageEvent.deal_id).filter(DealStageEvent.stage_id == qual_stage_id).all())
-    deals_reached_proposal = set(r[0] for r in db.query(DealStageEvent.deal_id).filter(DealStageEvent.stage_id == proposal_stage_id).all())
-    
-    qual_to_proposal_conversion = int((len(deals_reached_qual.intersection(deals_reached_proposal)) / len(deals_reached_qual)) * 100) if deals_reached_qual else 0
+    health = funnel.get_funnel(db, start_date, end_date, config.DASHBOARD_CONFIG["health_funnel_stages"])
+    # Steps are [qualification, proposal, won]; each step's conversion is from the one before it.
+    qual_to_proposal_conversion = health["steps"][1]["conversion_pct"] or 0
+    proposal_to_close_conversion = health["steps"][-1]["conversion_pct"] or 0
 
-    deals_won_ids = set(r[0] for r in db.query(PointsLedger.deal_id).filter(PointsLedger.notes == "Deal WON").all())
-    proposal_to_close_conversion = int((len(deals_reached_proposal.intersection(deals_won_ids)) / len(deals_reached_proposal)) * 100) if deals_reached_proposal else 0
+    kpi_rates = health_kpis.get_rates(db, start_date, end_date)
 
     lost_deals = pipedrive_client.get_deals({"status": "lost", "limit": 250})
     loss_key = config.DASHBOARD_CONFIG["field_keys"]["loss_reason"]
@@ -159,6 +193,6 @@ def get_dashboard_data(db: Session = Depends(get_db)):
     dashboard_data = {
         "kpis": { "totalPoints": int(total_points), "quarterlyTarget": config.DASHBOARD_CONFIG["quarterly_points_target"], "dealsInPipeline": deals_in_pipeline, "avgSpeedToClose": avg_speed_to_close, "quarterName": quarter_name },
         "leaderboard": leaderboard, "pointsOverTime": points_over_time, "recentActivity": recent_activity,
-        "salesHealth": { "leadToContactedSameDay": 82, "qualToDesignFee": qual_to_proposal_conversion, "designFeeCompliance": 95, "proposalToClose": proposal_to_close_conversion, "topLossReasons": top_loss_reasons, },
+        "salesHealth": { "leadToContactedSameDay": kpi_rates[health_kpis.LEAD_CONTACTED_SAME_DAY], "qualToDesignFee": qual_to_proposal_conversion, "designFeeCompliance": kpi_rates[health_kpis.DESIGN_FEE_COMPLIANCE], "proposalToClose": proposal_to_close_conversion, "topLossReasons": top_loss_reasons, },
     }
     return dashboard_data
\ No newline at end of file
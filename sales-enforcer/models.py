@@ -4,11 +4,18 @@ from sqlalchemy import (
     create_engine,
     Column,
     Integer,
+    BigInteger,
     String,
+    Date,
+    Float,
     DateTime,
     Enum,
     ForeignKey,
+    LargeBinary,
+    Index,
+    text,
 )
+from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.sql import func
 
@@ -26,14 +33,17 @@ class PointEventType(enum.Enum):
 
 class PointsLedger(Base):
     __tablename__ = 'points_ledger'
+    # Range-partitioned by quarter on created_at (see partitions.py). The partition
+    # key must be part of the primary key; id alone is still unique via its sequence.
+    __table_args__ = {"postgresql_partition_by": "RANGE (created_at)"}
     
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True, autoincrement=True)
     deal_id = Column(Integer, nullable=False, index=True)
     user_id = Column(Integer, nullable=False, index=True)
     event_type = Column(Enum(PointEventType), nullable=False)
     points = Column(Integer, nullable=False)
     notes = Column(String, nullable=True)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), primary_key=True, index=True)
 
 class DealStageEvent(Base):
     __tablename__ = 'deal_stage_events'
@@ -50,3 +60,135 @@ class UserMilestone(Base):
     user_id = Column(Integer, nullable=False, index=True)
     milestone_rank = Column(String, nullable=False)
     achieved_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class PointsBucket(Base):
+    """
+    Running points totals per (granularity, bucket_start, user). Maintained
+    incrementally as ledger rows are inserted (see points_series.py); team
+    totals are summed over users when read.
+    """
+    __tablename__ = 'points_buckets'
+    __table_args__ = (Index("ix_points_buckets_granularity_bucket_start", "granularity", "bucket_start"),)
+
+    granularity = Column(String(8), primary_key=True)  # "day" | "week"
+    user_id = Column(Integer, primary_key=True)
+    bucket_start = Column(Date, primary_key=True)
+    points = Column(BigInteger, nullable=False, default=0)
+
+
+class WebhookEvent(Base):
+    """
+    Append-only log of every Pipedrive webhook, kept so the ledger can be
+    rebuilt when scoring rules change. Payloads and deal snapshots are stored
+    as zlib-compressed JSON (see event_log.py).
+    """
+    __tablename__ = 'webhook_events'
+    __table_args__ = (Index('ix_webhook_events_deal_id_received_at', 'deal_id', 'received_at'),)
+
+    id = Column(BigInteger, primary_key=True)
+    deal_id = Column(Integer, nullable=True)
+    received_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False, index=True)
+    payload = Column(LargeBinary, nullable=False)
+    # Projected deal as fetched while processing the event (None until processed).
+    deal_snapshot = Column(LargeBinary, nullable=True)
+
+
+class StageDwellSketch(Base):
+    """
+    Log-bucketed duration histograms (mergeable percentile sketches) per metric,
+    stage, user and month. "dwell" rows hold time spent in a stage before the
+    deal's next recorded stage; "close" rows (stage_id 0) hold time from the
+    first stage event to WON. Maintained incrementally (see velocity.py);
+    user_id = TEAM_USER_ID holds the team-wide sketch.
+    """
+    __tablename__ = 'stage_dwell_sketches'
+
+    TEAM_USER_ID = 0
+
+    metric = Column(String(8), primary_key=True)  # "dwell" | "close"
+    stage_id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, primary_key=True)
+    month = Column(Date, primary_key=True)
+    bucket = Column(Integer, primary_key=True)
+    count = Column(BigInteger, nullable=False, default=0)
+    total_seconds = Column(Float, nullable=False, default=0)
+
+
+class DealState(Base):
+    """
+    Local mirror of the fields rotting depends on, refreshed from every webhook
+    and by a periodic resync (see rotting.py). `rot_deadline` is when the deal
+    rots unless it moves or gets an activity; NULL when it can't rot.
+    """
+    __tablename__ = 'deal_states'
+    __table_args__ = (
+        # The rotting sweep's queue: unprocessed deadlines in time order.
+        Index('ix_deal_states_pending_rot_deadline', 'rot_deadline', postgresql_where=text('rotted_at IS NULL')),
+    )
+
+    deal_id = Column(Integer, primary_key=True, autoincrement=False)
+    owner_id = Column(Integer, nullable=True, index=True)
+    stage_id = Column(Integer, nullable=True)
+    status = Column(String(16), nullable=True)
+    stage_change_time = Column(DateTime(timezone=True), nullable=True)
+    last_activity_date = Column(DateTime(timezone=True), nullable=True)
+    rot_deadline = Column(DateTime(timezone=True), nullable=True)
+    # Set once the sweep has handled the current deadline; cleared when the deadline moves.
+    rotted_at = Column(DateTime(timezone=True), nullable=True)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+
+class UserActivityCalendar(Base):
+    """
+    Per-user rolling calendar of daily net points, maintained as ledger rows are
+    inserted (see activity_calendar.py). `daily_points[i]` is the total for
+    start_day + i days. Streak fields are advanced by the weekly close job.
+    """
+    __tablename__ = 'user_activity_calendars'
+
+    user_id = Column(Integer, primary_key=True, autoincrement=False)
+    start_day = Column(Date, nullable=False)  # always a Monday
+    daily_points = Column(ARRAY(Integer), nullable=False)
+    # Consecutive closed weeks at or above the weekly minimum, ending with `streak_through`.
+    streak_weeks = Column(Integer, nullable=False, default=0)
+    streak_through = Column(Date, nullable=True)
+    # Last closed week the user finished below the weekly minimum.
+    below_minimum_week = Column(Date, nullable=True)
+    closed_week = Column(Date, nullable=True)
+
+
+class HealthKpiCounter(Base):
+    """
+    Running numerator/denominator per sales-health KPI, user and month, updated
+    on each relevant webhook (see health_kpis.py). user_id = TEAM_USER_ID holds
+    the team-wide counters.
+    """
+    __tablename__ = 'health_kpi_counters'
+
+    TEAM_USER_ID = 0
+
+    metric = Column(String(32), primary_key=True)
+    user_id = Column(Integer, primary_key=True)
+    month = Column(Date, primary_key=True)
+    numerator = Column(BigInteger, nullable=False, default=0)
+    denominator = Column(BigInteger, nullable=False, default=0)
+
+
+class HealthKpiMark(Base):
+    """Which deals have already been counted on each side of a KPI, so webhook retries never double count."""
+    __tablename__ = 'health_kpi_marks'
+
+    metric = Column(String(32), primary_key=True)
+    deal_id = Column(Integer, primary_key=True, autoincrement=False)
+    side = Column(String(12), primary_key=True)  # "numerator" | "denominator"
+    month = Column(Date, nullable=False)
+
+
+class ExportWatermark(Base):
+    """Highest row id already exported per table (see exporter.py)."""
+    __tablename__ = 'export_watermarks'
+
+    table_name = Column(String(64), primary_key=True)
+    last_id = Column(BigInteger, nullable=False)
+    exported_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
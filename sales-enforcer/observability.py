@@ -0,0 +1,205 @@
+# sales-enforcer/observability.py
+"""
+Metrics and structured logging shared by the API and the Celery worker.
+
+- Prometheus histograms for FastAPI routes, Pipedrive calls, SQL statements
+  and Celery tasks (duration and queue wait). The API serves them on /metrics;
+  the worker exposes its own registry on WORKER_METRICS_PORT.
+- Under gunicorn (PROMETHEUS_MULTIPROC_DIR set), /metrics aggregates every
+  worker process's samples through prometheus_client's multiprocess mode.
+- JSON log lines carrying a correlation id, taken from the incoming request
+  (X-Correlation-ID) or generated, and forwarded to Celery tasks via a message
+  header so a webhook and the task it enqueued share one id.
+"""
+import json
+import logging
+import os
+import re
+import sys
+import time
+import uuid
+from contextvars import ContextVar
+from typing import Optional
+
+from prometheus_client import Counter, Gauge, Histogram
+
+import settings  # noqa: F401  (loads .env before the getenv calls below)
+
+CORRELATION_HEADER = "X-Correlation-ID"
+CELERY_CORRELATION_HEADER = "x_correlation_id"
+WORKER_METRICS_PORT = int(os.getenv("WORKER_METRICS_PORT", "9100"))
+
+correlation_id: ContextVar[Optional[str]] = ContextVar("correlation_id", default=None)
+
+def new_correlation_id() -> str:
+    return uuid.uuid4().hex
+
+# --- Metrics ---
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "FastAPI request latency by route template.",
+    ["method", "route", "status"],
+)
+PIPEDRIVE_REQUEST_SECONDS = Histogram(
+    "pipedrive_request_duration_seconds", "Latency of single Pipedrive HTTP calls.",
+    ["function", "status"],
+)
+PIPEDRIVE_RETRIES = Counter(
+    "pipedrive_retries_total", "Pipedrive calls retried after a rate-limit or unavailable response.",
+    ["function", "status"],
+)
+PIPEDRIVE_CIRCUIT_STATE = Gauge(
+    "pipedrive_circuit_state", "Pipedrive circuit breaker state per endpoint family (0 closed, 1 half-open, 2 open).",
+    ["family"], multiprocess_mode="livemax",
+)
+SQL_STATEMENT_SECONDS = Histogram(
+    "sql_statement_duration_seconds", "SQL statement execution time by operation and table.",
+    ["operation", "table"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+DB_REPLICA_LAG_SECONDS = Gauge(
+    "db_replica_lag_seconds", "Last measured replay lag of the read replica.",
+    multiprocess_mode="livemax",
+)
+DB_SESSION_ROUTES = Counter(
+    "db_session_routes_total", "Read-only API sessions by the database they were routed to.",
+    ["target"],
+)
+SHARED_CACHE_REQUESTS = Counter(
+    "shared_cache_requests_total", "Shared cache lookups by result (hit, miss, error).",
+    ["result"],
+)
+CELERY_TASK_SECONDS = Histogram(
+    "celery_task_duration_seconds", "Celery task run time.",
+    ["task", "state"],
+)
+CELERY_QUEUE_WAIT_SECONDS = Histogram(
+    "celery_task_queue_wait_seconds", "Time between a task being published and a worker starting it.",
+    ["task"],
+)
+
+# --- Structured Logging ---
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "correlation_id": correlation_id.get(),
+        }
+        for key in ("task", "deal_id", "user_id", "duration_ms"):
+            if hasattr(record, key):
+                entry[key] = getattr(record, key)
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+def configure_logging(level: str = None):
+    """Routes the root logger to stdout as JSON. Safe to call more than once."""
+    root = logging.getLogger()
+    if any(isinstance(h.formatter, JsonFormatter) for h in root.handlers):
+        return
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(JsonFormatter())
+    root.handlers = [handler]
+    root.setLevel(level or os.getenv("LOG_LEVEL", "INFO"))
+
+# --- FastAPI ---
+
+def install_fastapi(app):
+    """Adds the per-route latency middleware and the /metrics endpoint."""
+    from fastapi import Request
+    from fastapi.responses import Response
+    from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, generate_latest, multiprocess
+
+    @app.middleware("http")
+    async def _observe_request(request: Request, call_next):
+        token = correlation_id.set(request.headers.get(CORRELATION_HEADER) or new_correlation_id())
+        started = time.perf_counter()
+        status = 500
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            response.headers[CORRELATION_HEADER] = correlation_id.get()
+            return response
+        finally:
+            route = request.scope.get("route")
+            # Label by route template so path parameters don't explode cardinality.
+            route_label = getattr(route, "path", "unmatched")
+            HTTP_REQUEST_SECONDS.labels(request.method, route_label, str(status)).observe(time.perf_counter() - started)
+            correlation_id.reset(token)
+
+    @app.get("/metrics", include_in_schema=False)
+    def metrics():
+        if not os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+            return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+        # Any worker may answer the scrape, so report the samples of all of them.
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
+
+# --- SQLAlchemy ---
+
+_SQL_TABLE = re.compile(r"\b(?:FROM|INTO|UPDATE|JOIN)\s+\"?(\w+)", re.IGNORECASE)
+
+def instrument_engine(engine):
+    """Times every statement through SQLAlchemy cursor events."""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["query_started"].pop()
+        operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "UNKNOWN"
+        match = _SQL_TABLE.search(statement)
+        SQL_STATEMENT_SECONDS.labels(operation, match.group(1) if match else "").observe(time.perf_counter() - started)
+
+    @event.listens_for(engine, "handle_error")
+    def _error(context):
+        started = context.connection.info.get("query_started") if context.connection is not None else None
+        if started:
+            started.pop()
+
+# --- Celery ---
+
+def install_celery(celery_app):
+    """Task duration / queue-wait histograms, correlation id propagation and a worker metrics port."""
+    from celery import signals
+    from prometheus_client import start_http_server
+
+    @signals.before_task_publish.connect(weak=False)
+    def _stamp(headers=None, **kwargs):
+        if headers is None:
+            return
+        headers.setdefault("published_at", time.time())
+        headers.setdefault(CELERY_CORRELATION_HEADER, correlation_id.get() or new_correlation_id())
+
+    @signals.task_prerun.connect(weak=False)
+    def _prerun(task=None, **kwargs):
+        request = task.request
+        correlation_id.set(getattr(request, CELERY_CORRELATION_HEADER, None) or new_correlation_id())
+        request._observability_started = time.perf_counter()
+        published_at = getattr(request, "published_at", None)
+        if published_at:
+            CELERY_QUEUE_WAIT_SECONDS.labels(task.name).observe(max(0.0, time.time() - float(published_at)))
+
+    @signals.task_postrun.connect(weak=False)
+    def _postrun(task=None, state=None, **kwargs):
+        request = task.request
+        started = getattr(request, "_observability_started", None)
+        if started is not None:
+            CELERY_TASK_SECONDS.labels(task.name, state or "UNKNOWN").observe(time.perf_counter() - started)
+        correlation_id.set(None)
+
+    @signals.worker_ready.connect(weak=False)
+    def _serve_metrics(**kwargs):
+        start_http_server(WORKER_METRICS_PORT)
+
+    @signals.setup_logging.connect(weak=False)
+    def _setup_logging(**kwargs):
+        configure_logging()
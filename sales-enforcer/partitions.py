@@ -0,0 +1,155 @@
+# sales-enforcer/partitions.py
+"""
+Quarter partitions for points_ledger.
+
+The ledger is range-partitioned on created_at with one partition per UTC
+quarter (points_ledger_y2025q3, ...), so current-quarter dashboard queries
+prune to a single partition. `maintain_partitions` is run daily by Celery beat:
+
+- creates partitions QUARTERS_AHEAD quarters ahead. Rows outside every
+  quarter partition (beat down at a quarter rollover, back-dated or replayed
+  rows) land in DEFAULT_PARTITION instead of failing the insert, and are moved
+  into their quarter when its partition is created;
+- vacuums closed quarters once with FREEZE, since ledger rows are never
+  updated after their quarter ends. Plain VACUUM doesn't block reads; to
+  reclaim space physically, run pg_repack on a closed partition.
+- optionally detaches quarters older than ARCHIVE_AFTER_QUARTERS into
+  standalone points_ledger_archive_* tables. Detached rows no longer count
+  towards lifetime totals (milestones), so this is off unless configured.
+"""
+import logging
+import os
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import OperationalError
+
+import settings  # noqa: F401  (loads .env before the getenv calls below)
+
+logger = logging.getLogger(__name__)
+
+PARENT_TABLE = "points_ledger"
+DEFAULT_PARTITION = f"{PARENT_TABLE}_default"
+QUARTERS_AHEAD = int(os.getenv("LEDGER_QUARTERS_AHEAD", "2"))
+_archive_after = os.getenv("LEDGER_ARCHIVE_AFTER_QUARTERS")
+ARCHIVE_AFTER_QUARTERS: Optional[int] = int(_archive_after) if _archive_after else None
+COMPACTED_MARKER = "compacted"
+# Detaching briefly locks the whole ledger; give up rather than queue writes behind it.
+DETACH_LOCK_TIMEOUT = os.getenv("LEDGER_DETACH_LOCK_TIMEOUT", "5s")
+
+def quarter_start(dt: datetime) -> datetime:
+    dt = dt.astimezone(timezone.utc)
+    return datetime(dt.year, 3 * ((dt.month - 1) // 3) + 1, 1, tzinfo=timezone.utc)
+
+def add_quarters(q_start: datetime, n: int) -> datetime:
+    months = q_start.year * 12 + (q_start.month - 1) + 3 * n
+    return datetime(months // 12, months % 12 + 1, 1, tzinfo=timezone.utc)
+
+def partition_name(q_start: datetime) -> str:
+    return f"{PARENT_TABLE}_y{q_start.year}q{(q_start.month - 1) // 3 + 1}"
+
+def list_partitions(conn) -> List[Tuple[str, Optional[str]]]:
+    """(partition name, table comment) for every attached quarter partition (not the default one)."""
+    rows = conn.execute(text("""
+        SELECT c.relname, obj_description(c.oid, 'pg_class')
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        JOIN pg_class p ON p.oid = i.inhparent
+        WHERE p.relname = :parent AND c.relname <> :default
+        ORDER BY c.relname
+    """), {"parent": PARENT_TABLE, "default": DEFAULT_PARTITION}).all()
+    return [(r[0], r[1]) for r in rows]
+
+def create_quarter_partition(conn, q_start: datetime):
+    """
+    Creates the partition for the quarter starting at q_start.
+
+    Postgres refuses to create a partition while the default partition holds
+    rows in its range, so those rows are set aside first and re-inserted
+    through the parent once the partition exists, all in the caller's
+    transaction.
+    """
+    bounds = {"lo": q_start, "hi": add_quarters(q_start, 1)}
+    strays = conn.execute(text(
+        f'SELECT count(*) FROM "{DEFAULT_PARTITION}" WHERE created_at >= :lo AND created_at < :hi'
+    ), bounds).scalar()
+    if strays:
+        conn.execute(text(f"CREATE TEMPORARY TABLE ledger_strays (LIKE {PARENT_TABLE})"))
+        conn.execute(text(
+            f'WITH moved AS (DELETE FROM "{DEFAULT_PARTITION}" WHERE created_at >= :lo AND created_at < :hi RETURNING *) '
+            f'INSERT INTO ledger_strays SELECT * FROM moved'
+        ), bounds)
+    conn.execute(text(
+        f'CREATE TABLE IF NOT EXISTS "{partition_name(q_start)}" PARTITION OF {PARENT_TABLE} '
+        f"FOR VALUES FROM ('{bounds['lo'].isoformat()}') TO ('{bounds['hi'].isoformat()}')"
+    ))
+    if strays:
+        conn.execute(text(f"INSERT INTO {PARENT_TABLE} SELECT * FROM ledger_strays"))
+        conn.execute(text("DROP TABLE ledger_strays"))
+        logger.warning(f"Moved {strays} ledger rows from {DEFAULT_PARTITION} into {partition_name(q_start)}.")
+
+def ensure_future_partitions(conn, now: datetime, quarters_ahead: int = QUARTERS_AHEAD) -> List[str]:
+    created = []
+    existing = {name for name, _ in list_partitions(conn)}
+    for n in range(quarters_ahead + 1):
+        q = add_quarters(quarter_start(now), n)
+        name = partition_name(q)
+        if name in existing:
+            continue
+        create_quarter_partition(conn, q)
+        created.append(name)
+    return created
+
+def _closed_partitions(conn, now: datetime):
+    current = partition_name(quarter_start(now))
+    # Names sort chronologically (points_ledger_yYYYYqN).
+    return [(name, comment) for name, comment in list_partitions(conn) if name < current]
+
+def vacuum_closed_partitions(engine: Engine, now: datetime) -> List[str]:
+    """VACUUM can't run in a transaction, so this uses an autocommit connection."""
+    vacuumed = []
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for name, comment in _closed_partitions(conn, now):
+            if comment == COMPACTED_MARKER:
+                continue
+            # Not VACUUM FULL: its ACCESS EXCLUSIVE lock would block dashboard, funnel and export reads.
+            conn.execute(text(f'VACUUM (FREEZE, ANALYZE) "{name}"'))
+            conn.execute(text(f"COMMENT ON TABLE \"{name}\" IS '{COMPACTED_MARKER}'"))
+            vacuumed.append(name)
+    return vacuumed
+
+def archive_old_partitions(engine: Engine, now: datetime, after_quarters: int) -> List[str]:
+    """
+    Detaches and renames quarters older than after_quarters, one short transaction each.
+
+    DETACH ... CONCURRENTLY isn't allowed while the ledger has a default
+    partition, so this is a plain DETACH: it takes an ACCESS EXCLUSIVE lock on
+    the ledger for the moment the detach needs. If the lock isn't granted
+    within DETACH_LOCK_TIMEOUT the quarter is left for the next run.
+    """
+    cutoff = partition_name(add_quarters(quarter_start(now), -after_quarters))
+    with engine.connect() as conn:
+        candidates = [name for name, _ in _closed_partitions(conn, now) if name < cutoff]
+    archived = []
+    for name in candidates:
+        try:
+            with engine.begin() as conn:
+                conn.execute(text(f"SET LOCAL lock_timeout = '{DETACH_LOCK_TIMEOUT}'"))
+                conn.execute(text(f'ALTER TABLE {PARENT_TABLE} DETACH PARTITION "{name}"'))
+                conn.execute(text(f'ALTER TABLE "{name}" RENAME TO "{name.replace(PARENT_TABLE, PARENT_TABLE + "_archive", 1)}"'))
+        except OperationalError as e:
+            logger.warning(f"Could not detach {name}, retrying on the next run: {e}")
+            continue
+        archived.append(name)
+    return archived
+
+def maintain_partitions(engine: Engine, now: Optional[datetime] = None) -> dict:
+    now = now or datetime.now(timezone.utc)
+    with engine.begin() as conn:
+        created = ensure_future_partitions(conn, now)
+    archived = archive_old_partitions(engine, now, ARCHIVE_AFTER_QUARTERS) if ARCHIVE_AFTER_QUARTERS else []
+    vacuumed = vacuum_closed_partitions(engine, now)
+    logger.info(f"Ledger partitions maintained: created={created} vacuumed={vacuumed} archived={archived}")
+    return {"created": created, "vacuumed": vacuumed, "archived": archived}
@@ -1,47 +1,176 @@
 import os
 import requests
 import httpx
-from dotenv import load_dotenv
 from datetime import date
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, AsyncIterator, Tuple
 import asyncio
+import logging
+import time
 
-load_dotenv()
+import settings
+import shared_cache
+from circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+from observability import PIPEDRIVE_CIRCUIT_STATE, PIPEDRIVE_REQUEST_SECONDS, PIPEDRIVE_RETRIES
+from records import ActivityRecord, DealRecord, decode_one, decode_page
+from utils.timestamps import parse_date
 
-API_TOKEN = os.getenv("PIPEDRIVE_API_TOKEN")
-API_HOST = "https://api.pipedrive.com"
+API_TOKEN = settings.PIPEDRIVE_API_TOKEN
+API_HOST = settings.PIPEDRIVE_API_HOST
 V1_BASE = f"{API_HOST}/v1"
 V2_BASE = f"{API_HOST}/api/v2"
 
+logger = logging.getLogger(__name__)
+
+# Rate-limited (429) or briefly unavailable (503) responses are retried a couple
+# of times, honouring Retry-After, before the error reaches the caller.
+RETRY_STATUSES = {429, 503}
+MAX_RETRIES = 2
+MAX_RETRY_WAIT_SECONDS = 5.0
+
+# Connection attempts fail fast; reads keep the per-call timeouts below.
+CONNECT_TIMEOUT_SECONDS = 5.0
+
+def _timeout(read_seconds: float) -> httpx.Timeout:
+    return httpx.Timeout(read_seconds, connect=CONNECT_TIMEOUT_SECONDS)
+
+# --- Circuit Breakers ---
+# One breaker per endpoint family ("deals", "activities", "users", ...), so an
+# outage of one family doesn't block the others. While a circuit is open, calls
+# raise CircuitOpenError immediately instead of waiting out the timeouts.
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("PIPEDRIVE_CIRCUIT_FAILURES", "5"))
+CIRCUIT_RESET_SECONDS = float(os.getenv("PIPEDRIVE_CIRCUIT_RESET_SECONDS", "30"))
+_CIRCUIT_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+class PipedriveUnavailable(Exception):
+    """A Pipedrive call failed in a way the caller can't distinguish from "no data"."""
+
+# Everything a router should treat as "Pipedrive is down" and degrade on.
+UPSTREAM_ERRORS = (CircuitOpenError, PipedriveUnavailable, requests.exceptions.RequestException, httpx.HTTPError)
+
+def _on_circuit_change(family: str, state: str):
+    PIPEDRIVE_CIRCUIT_STATE.labels(family).set(_CIRCUIT_STATE_VALUES[state])
+    log = logger.warning if state == OPEN else logger.info
+    log(f"Pipedrive circuit '{family}' is now {state}.")
+
+_breakers: Dict[str, CircuitBreaker] = {}
+
+def _endpoint_family(url: str) -> str:
+    """Last non-numeric path segment: /v1/deals/5/activities -> "activities"."""
+    segments = [s for s in url.split("?", 1)[0].split("/") if s and not s.isdigit()]
+    return segments[-1] if segments else "unknown"
+
+def circuit_for(url: str) -> CircuitBreaker:
+    family = _endpoint_family(url)
+    breaker = _breakers.get(family)
+    if breaker is None:
+        breaker = _breakers.setdefault(family, CircuitBreaker(
+            family, CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_SECONDS, on_state_change=_on_circuit_change,
+        ))
+    return breaker
+
+def _is_upstream_failure(status_code: int) -> bool:
+    return status_code >= 500 or status_code == 429
+
+def _retry_wait(response, attempt: int) -> float:
+    try:
+        wait = float(response.headers.get("Retry-After", ""))
+    except ValueError:
+        wait = 0.5 * (2 ** attempt)
+    return min(wait, MAX_RETRY_WAIT_SECONDS)
+
+def _http_get(function: str, url: str, params: dict) -> requests.Response:
+    """requests.get with per-call latency/status metrics, bounded retries and the family's circuit breaker."""
+    breaker = circuit_for(url)
+    breaker.before_call()
+    try:
+        for attempt in range(MAX_RETRIES + 1):
+            started = time.perf_counter()
+            status = "error"
+            try:
+                response = requests.get(url, params=params, timeout=(CONNECT_TIMEOUT_SECONDS, 30))
+                status = str(response.status_code)
+            finally:
+                PIPEDRIVE_REQUEST_SECONDS.labels(function, status).observe(time.perf_counter() - started)
+            if response.status_code not in RETRY_STATUSES or attempt == MAX_RETRIES:
+                break
+            PIPEDRIVE_RETRIES.labels(function, status).inc()
+            time.sleep(_retry_wait(response, attempt))
+    except requests.exceptions.RequestException:
+        breaker.record_failure()
+        raise
+    except BaseException:
+        breaker.abandon_call()
+        raise
+    if _is_upstream_failure(response.status_code):
+        breaker.record_failure()
+    else:
+        breaker.record_success()
+    return response
+
+async def _http_get_async(client: httpx.AsyncClient, function: str, url: str, params: dict) -> httpx.Response:
+    """Async counterpart of _http_get."""
+    breaker = circuit_for(url)
+    breaker.before_call()
+    try:
+        for attempt in range(MAX_RETRIES + 1):
+            started = time.perf_counter()
+            status = "error"
+            try:
+                response = await client.get(url, params=params)
+                status = str(response.status_code)
+            finally:
+                PIPEDRIVE_REQUEST_SECONDS.labels(function, status).observe(time.perf_counter() - started)
+            if response.status_code not in RETRY_STATUSES or attempt == MAX_RETRIES:
+                break
+            PIPEDRIVE_RETRIES.labels(function, status).inc()
+            await asyncio.sleep(_retry_wait(response, attempt))
+    except httpx.HTTPError:
+        breaker.record_failure()
+        raise
+    except BaseException:
+        breaker.abandon_call()
+        raise
+    if _is_upstream_failure(response.status_code):
+        breaker.record_failure()
+    else:
+        breaker.record_success()
+    return response
+
 # --- Synchronous Functions ---
 
 def _handle_request_exception(e: requests.exceptions.RequestException, context: str):
     error_message = f"Error during '{context}': {e}"
     if e.response is not None:
         error_message += f" | Status: {e.response.status_code} | Response: {e.response.text}"
-    print(error_message)
+    logger.error(error_message)
     return None
 
 def get_deal(deal_id: int):
+    """The deal, or None if Pipedrive has no such deal. Raises PipedriveUnavailable / CircuitOpenError when it can't tell."""
     url = f"{V1_BASE}/deals/{deal_id}"
     params = {"api_token": API_TOKEN}
     try:
-        response = requests.get(url, params=params)
+        response = _http_get("get_deal", url, params)
+        if response.status_code == 404:
+            return None
         response.raise_for_status()
-        return response.json().get("data", None)
+        return decode_one(response.content, DealRecord)
     except requests.exceptions.RequestException as e:
-        return _handle_request_exception(e, f"get deal {deal_id}")
+        _handle_request_exception(e, f"get deal {deal_id}")
+        raise PipedriveUnavailable(f"get deal {deal_id} failed: {e}") from e
 
 def get_user(user_id: int):
     url = f"{V1_BASE}/users/{user_id}"
     params = {"api_token": API_TOKEN}
     try:
-        response = requests.get(url, params=params)
+        response = _http_get("get_user", url, params)
         response.raise_for_status()
         return response.json().get("data", {})
     except requests.exceptions.RequestException as e:
         _handle_request_exception(e, f"get user {user_id}")
         return {}
+    except CircuitOpenError:
+        return {}
 
 def get_deals(params: dict = None):
     if params is None:
@@ -55,19 +184,20 @@ def get_deals(params: dict = None):
         params["start"] = start
         params["limit"] = limit
         try:
-            response = requests.get(url, params=params)
+            response = _http_get("get_deals", url, params)
             response.raise_for_status()
-            data = response.json().get("data", [])
+            data, additional_data = decode_page(response.content, DealRecord)
             if not data:
                 break
             all_deals.extend(data)
-            pagination = response.json().get("additional_data", {}).get("pagination", {})
+            pagination = additional_data.get("pagination", {})
             if not pagination or not pagination.get("more_items_in_collection"):
                 break
             start += len(data)
         except requests.exceptions.RequestException as e:
             _handle_request_exception(e, f"get deals with params {params}")
-            return []
+            # A partial or empty list would read as "no deals"; let the caller degrade instead.
+            raise PipedriveUnavailable(f"get deals failed: {e}") from e
     return all_deals
 
 
@@ -77,19 +207,38 @@ def _handle_async_request_exception(e: httpx.RequestError, context: str):
     error_message = f"Error during async '{context}': {e}"
     if hasattr(e, 'response') and e.response is not None:
         error_message += f" | Status: {e.response.status_code} | Response: {e.response.text}"
-    print(error_message)
+    logger.error(error_message)
     return None
 
 async def get_deal_async(deal_id: int):
+    """Async counterpart of get_deal."""
     url = f"{V1_BASE}/deals/{deal_id}"
     params = {"api_token": API_TOKEN}
     try:
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.get(url, params=params)
+        async with httpx.AsyncClient(timeout=_timeout(30.0)) as client:
+            response = await _http_get_async(client, "get_deal_async", url, params)
+            if response.status_code == 404:
+                return None
             response.raise_for_status()
-            return response.json().get("data", None)
+            return decode_one(response.content, DealRecord)
     except httpx.RequestError as e:
-        return _handle_async_request_exception(e, f"get deal {deal_id}")
+        _handle_async_request_exception(e, f"get deal {deal_id}")
+        raise PipedriveUnavailable(f"get deal {deal_id} failed: {e}") from e
+
+async def get_deals_by_id_async(deal_ids: List[int], concurrency: int = 10) -> Dict[int, DealRecord]:
+    """Fetches deals one by one, `concurrency` at a time; deals that couldn't be fetched are left out."""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def fetch(deal_id: int):
+        async with semaphore:
+            try:
+                return await get_deal_async(deal_id)
+            except UPSTREAM_ERRORS as e:
+                logger.warning(f"Could not fetch deal {deal_id}: {e}")
+                return None
+
+    deals = await asyncio.gather(*(fetch(deal_id) for deal_id in deal_ids))
+    return {deal["id"]: deal for deal in deals if deal}
 
 async def get_deals_from_pipeline_async(pipeline_id: int, user_id: int | None = None, status: str = "open"):
     url = f"{V2_BASE}/deals"
@@ -105,14 +254,13 @@ async def get_deals_from_pipeline_async(pipeline_id: int, user_id: int | None =
         params["owner_id"] = user_id
 
     all_deals = []
-    async with httpx.AsyncClient(timeout=60.0) as client:
+    async with httpx.AsyncClient(timeout=_timeout(60.0)) as client:
         while True:
-            resp = await client.get(url, params=params)
+            resp = await _http_get_async(client, "get_deals_from_pipeline_async", url, params)
             resp.raise_for_status()
-            body = resp.json()
-            data = body.get("data", []) or []
+            data, additional_data = decode_page(resp.content, DealRecord)
             all_deals.extend(data)
-            cursor = body.get("additional_data", {}).get("next_cursor")
+            cursor = additional_data.get("next_cursor")
             if not cursor:
                 break
             params["cursor"] = cursor
@@ -128,16 +276,15 @@ async def get_deal_activities_async(deal_id: int, limit: int = 10, done: int = 1
 
     items = []
     try:
-        async with httpx.AsyncClient(timeout=30.0) as client:
+        async with httpx.AsyncClient(timeout=_timeout(30.0)) as client:
             while True:
-                resp = await client.get(url, params=params)
+                resp = await _http_get_async(client, "get_deal_activities_async", url, params)
                 resp.raise_for_status()
-                body = resp.json()
-                data = body.get("data") or []
+                data, additional_data = decode_page(resp.content, ActivityRecord)
                 items.extend(data)
                 if limit and len(items) >= limit:
                     return items[:limit]
-                pagination = body.get("additional_data", {}).get("pagination", {})
+                pagination = additional_data.get("pagination", {})
                 if not pagination or not pagination.get("more_items_in_collection"):
                     break
                 next_start = pagination.get("next_start")
@@ -146,35 +293,88 @@ async def get_deal_activities_async(deal_id: int, limit: int = 10, done: int = 1
                 else:
                     break
     except httpx.RequestError as e:
-        return _handle_async_request_exception(e, f"get activities for deal {deal_id}")
+        _handle_async_request_exception(e, f"get activities for deal {deal_id}")
+        # An empty list would read as "no activities" and be cached as a good report.
+        raise PipedriveUnavailable(f"get activities for deal {deal_id} failed: {e}") from e
     return items
 
 async def get_all_stages_async():
     url = f"{V1_BASE}/stages"
     params = {"api_token": API_TOKEN}
     try:
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.get(url, params=params)
+        async with httpx.AsyncClient(timeout=_timeout(30.0)) as client:
+            response = await _http_get_async(client, "get_all_stages_async", url, params)
             response.raise_for_status()
             return response.json().get("data", [])
     except httpx.RequestError as e:
-        return _handle_async_request_exception(e, "get all stages")
+        _handle_async_request_exception(e, "get all stages")
+        # None would render every stage as "Unknown Stage" in a report cached as good.
+        raise PipedriveUnavailable(f"get all stages failed: {e}") from e
+
+def get_all_stages():
+    url = f"{V1_BASE}/stages"
+    params = {"api_token": API_TOKEN}
+    try:
+        response = _http_get("get_all_stages", url, params)
+        response.raise_for_status()
+        return response.json().get("data", [])
+    except requests.exceptions.RequestException as e:
+        _handle_request_exception(e, "get all stages")
+        raise PipedriveUnavailable(f"get all stages failed: {e}") from e
 
 async def get_all_users_async():
     url = f"{V1_BASE}/users"
     params = {"api_token": API_TOKEN}
-    async with httpx.AsyncClient(timeout=30.0) as client:
-        r = await client.get(url, params=params)
+    async with httpx.AsyncClient(timeout=_timeout(30.0)) as client:
+        r = await _http_get_async(client, "get_all_users_async", url, params)
         r.raise_for_status()
         data = r.json().get("data", []) or []
         return [u for u in data if u.get("active_flag")]
 
-async def get_activities_by_due_date_range_v2_async(
-    owner_id: Optional[int],
+# Active users change rarely, so they are cached for a few minutes in the shared
+# cache and fetched by one API worker per pod rather than by each of them.
+USER_MAP_TTL_SECONDS = 300
+_ACTIVE_USERS_KEY = "pipedrive:active_users"
+
+async def get_active_users_async() -> Tuple[List[dict], int]:
+    """([{"id", "name"}, ...] for active users, age of the cached list in seconds)."""
+    async def fetch():
+        users = await get_all_users_async()
+        return [{"id": u["id"], "name": u.get("name") or str(u["id"])} for u in users if u.get("id")]
+    return await shared_cache.aget_or_compute(_ACTIVE_USERS_KEY, USER_MAP_TTL_SECONDS, fetch)
+
+async def get_user_map_async() -> Dict[int, str]:
+    users, _ = await get_active_users_async()
+    return {u["id"]: u["name"] for u in users}
+
+# The pipeline's deal-rotting setting per stage, cached like the users.
+STAGE_SETTINGS_TTL_SECONDS = 300
+_STAGE_ROT_DAYS_KEY = "pipedrive:stage_rot_days"
+
+def stage_rot_days(stages: list) -> Dict[int, Optional[int]]:
+    """{stage_id: days without activity until a deal rots, or None if the stage never rots}."""
+    return {int(s["id"]): (s.get("rotten_days") if s.get("rotten_flag") else None) for s in stages if s.get("id")}
+
+def _decode_rot_days(cached: dict) -> Dict[int, Optional[int]]:
+    # JSON object keys come back from the cache as strings.
+    return {int(stage_id): days for stage_id, days in cached.items()}
+
+def get_stage_rot_days() -> Dict[int, Optional[int]]:
+    cached, _ = shared_cache.get_or_compute(_STAGE_ROT_DAYS_KEY, STAGE_SETTINGS_TTL_SECONDS, lambda: stage_rot_days(get_all_stages()))
+    return _decode_rot_days(cached)
+
+async def iter_activities_by_due_date_v2_async(
     start_date: date,
     end_date: date,
+    owner_id: Optional[int] = None,
     done: bool = False
-) -> List[Dict]:
+) -> AsyncIterator[ActivityRecord]:
+    """
+    Single cursor sweep over /v2/activities sorted by due_date, yielding items
+    whose due_date falls in [start_date, end_date]. The v2 endpoint has no
+    due_date filter, so the lower bound is applied client-side and the upper
+    bound ends the sweep as soon as it is passed.
+    """
     url = f"{V2_BASE}/activities"
     params = {
         "api_token": API_TOKEN,
@@ -186,56 +386,69 @@ async def get_activities_by_due_date_range_v2_async(
     if owner_id:
         params["owner_id"] = owner_id
 
-    results: List[Dict] = []
-    async with httpx.AsyncClient(timeout=60.0) as client:
-        cursor = None
+    async with httpx.AsyncClient(timeout=_timeout(60.0)) as client:
         while True:
-            if cursor:
-                params["cursor"] = cursor
-            resp = await client.get(url, params=params)
+            resp = await _http_get_async(client, "iter_activities_by_due_date_v2_async", url, params)
             resp.raise_for_status()
-            body = resp.json() or {}
-            data = body.get("data") or []
+            data, additional_data = decode_page(resp.content, ActivityRecord)
 
             for a in data:
                 dd = a.get("due_date")
                 if not dd:
                     continue
-                d = date.fromisoformat(dd)
-                
+                d = parse_date(dd)
+
                 if d > end_date:
                     # Sort is ascending, so we can stop fetching pages
-                    return results
-                
-                if start_date <= d <= end_date:
-                    results.append(a)
+                    return
 
-            cursor = (body.get("additional_data") or {}).get("next_cursor")
+                if start_date <= d:
+                    yield a
+
+            cursor = additional_data.get("next_cursor")
             if not cursor:
                 break
-    return results
+            params["cursor"] = cursor
+
+async def get_activities_by_due_date_range_v2_async(
+    owner_id: Optional[int],
+    start_date: date,
+    end_date: date,
+    done: bool = False
+) -> List[ActivityRecord]:
+    return [
+        a async for a in iter_activities_by_due_date_v2_async(
+            start_date=start_date, end_date=end_date, owner_id=owner_id, done=done,
+        )
+    ]
+
+async def stream_due_activities_all_owners_async(
+    start_date: date,
+    end_date: date,
+    done: bool = False
+) -> AsyncIterator[ActivityRecord]:
+    """
+    All-owners mode: one sweep without an owner filter, with owner names joined
+    from the cached user map. Items are yielded in due_date order.
+    """
+    user_map = await get_user_map_async()
+    async for it in iter_activities_by_due_date_v2_async(
+        start_date=start_date, end_date=end_date, done=done,
+    ):
+        if not it.owner_name:
+            it.owner_name = user_map.get(it.owner_id) or str(it.owner_id or "Unknown")
+        yield it
 
 async def get_due_activities_all_salespersons_async(
     start_date: date,
     end_date: date,
     done: bool = False
-) -> List[Dict]:
-    users = await get_all_users_async()
-    
-    async def fetch_for_user(user):
-        uid = user.get("id")
-        if not uid: return []
-        items = await get_activities_by_due_date_range_v2_async(
-            owner_id=uid, start_date=start_date, end_date=end_date, done=done,
+) -> List[ActivityRecord]:
+    # Keep the previous semantics of only reporting on active users.
+    user_map = await get_user_map_async()
+    return [
+        it async for it in stream_due_activities_all_owners_async(
+            start_date=start_date, end_date=end_date, done=done,
         )
-        owner_name = user.get("name") or str(uid)
-        for it in items:
-            it.setdefault("owner_name", owner_name)
-        return items
-
-    results = await asyncio.gather(*(fetch_for_user(u) for u in users))
-    all_items: List[Dict] = []
-    for user_items in results:
-        all_items.extend(user_items)
-        
-    return all_items
\ No newline at end of file
+        if it.get("owner_id") in user_map
+    ]
@@ -0,0 +1,81 @@
+# sales-enforcer/points_series.py
+"""
+Time-bucketed points series.
+
+Every PointsLedger insert is folded into `points_buckets` (day and week
+buckets per user) by an ORM `after_insert` hook, in the same transaction as the
+ledger row. Chart queries then read a handful of bucket rows and gap-fill
+missing buckets with `generate_series` instead of aggregating the ledger.
+
+Team totals are summed over the user buckets at read time. A team-wide row
+updated on every insert would be one row lock shared by every webhook lane.
+"""
+from datetime import date
+from typing import List, Optional
+
+from sqlalchemy import Date, cast, event, func, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from models import PointsBucket, PointsLedger
+
+GRANULARITIES = ("day", "week")
+
+@event.listens_for(PointsLedger, "after_insert")
+def _fold_into_buckets(mapper, connection, target):
+    # created_at is a server default, so fall back to now() when it wasn't set explicitly.
+    ts = func.timezone("UTC", func.coalesce(target.created_at, func.now()))
+    rows = [
+        {"granularity": g, "bucket_start": cast(func.date_trunc(g, ts), Date), "user_id": target.user_id, "points": target.points}
+        for g in GRANULARITIES
+    ]
+    stmt = pg_insert(PointsBucket.__table__).values(rows)
+    connection.execute(stmt.on_conflict_do_update(
+        index_elements=["granularity", "user_id", "bucket_start"],
+        set_={"points": PointsBucket.__table__.c.points + stmt.excluded.points},
+    ))
+
+_SERIES_SQL = text("""
+    SELECT gs.bucket::date AS bucket_start, COALESCE(b.points, 0) AS points
+    FROM generate_series(
+        date_trunc(:granularity, CAST(:start AS timestamp)),
+        date_trunc(:granularity, CAST(:end AS timestamp)),
+        CAST(:step AS interval)
+    ) AS gs(bucket)
+    LEFT JOIN (
+        SELECT bucket_start, SUM(points) AS points
+        FROM points_buckets
+        WHERE granularity = :granularity
+          AND bucket_start BETWEEN date_trunc(:granularity, CAST(:start AS timestamp))::date AND CAST(:end AS date)
+          AND (CAST(:user_id AS integer) IS NULL OR user_id = :user_id)
+        GROUP BY bucket_start
+    ) b ON b.bucket_start = gs.bucket::date
+    ORDER BY gs.bucket
+""")
+
+def get_points_series(db: Session, start: date, end: date, granularity: str = "week", user_id: Optional[int] = None) -> List[dict]:
+    """Gap-filled series of {"bucket_start", "points"} for one user, or the team when user_id is None."""
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"granularity must be one of {GRANULARITIES}")
+    rows = db.execute(_SERIES_SQL, {
+        "granularity": granularity,
+        "start": start,
+        "end": end,
+        "step": f"1 {granularity}",
+        "user_id": user_id,
+    }).all()
+    return [{"bucket_start": r.bucket_start, "points": int(r.points)} for r in rows]
+
+_REBUILD_SQL = text("""
+    INSERT INTO points_buckets (granularity, user_id, bucket_start, points)
+    SELECT g.granularity, l.user_id, date_trunc(g.granularity, timezone('UTC', l.created_at))::date, SUM(l.points)
+    FROM points_ledger l
+    CROSS JOIN (VALUES ('day'), ('week')) AS g(granularity)
+    GROUP BY 1, 2, 3
+""")
+
+def rebuild_buckets(db: Session):
+    """Recomputes every bucket from the ledger (used by the migration backfill and for repairs)."""
+    db.query(PointsBucket).delete()
+    db.execute(_REBUILD_SQL)
+    db.commit()
@@ -0,0 +1,88 @@
+# sales-enforcer/producer.py
+"""
+Lightweight task producer for the API.
+
+Publishes Celery task messages (message protocol v2, JSON body) straight onto
+the Redis lists the workers consume, so the API never imports celery_worker,
+Celery, kombu or billiard. Routing goes through `queues.route_task`, the same
+router the workers use, and the `published_at` / correlation id headers that
+`observability.install_celery` would stamp are set here.
+
+Fire-and-forget only: anything that needs results, retries, ETAs or canvas
+primitives should be sent from a process that has the Celery app.
+"""
+import base64
+import os
+import reprlib
+import socket
+import time
+import uuid
+from typing import Optional
+
+import orjson
+
+import queues
+import settings
+from observability import CELERY_CORRELATION_HEADER, correlation_id, new_correlation_id
+
+PROCESS_PIPEDRIVE_EVENT = "celery_worker.process_pipedrive_event"
+
+_client = None
+
+def _redis():
+    global _client
+    if _client is None:
+        import redis  # only needed once the first task is sent
+
+        # Celery spells the Azure TLS option CERT_NONE; redis-py wants "none".
+        url = settings.REDIS_URL.replace("ssl_cert_reqs=CERT_NONE", "ssl_cert_reqs=none")
+        _client = redis.Redis.from_url(url)
+    return _client
+
+def build_message(name: str, args: tuple, kwargs: dict, queue: str, task_id: str) -> dict:
+    """The envelope kombu's Redis transport stores, carrying a protocol v2 task message."""
+    body = orjson.dumps([list(args), kwargs, {"callbacks": None, "errbacks": None, "chain": None, "chord": None}])
+    return {
+        "body": base64.b64encode(body).decode(),
+        "content-encoding": "utf-8",
+        "content-type": "application/json",
+        "headers": {
+            "lang": "py",
+            "task": name,
+            "id": task_id,
+            "shadow": None,
+            "eta": None,
+            "expires": None,
+            "group": None,
+            "group_index": None,
+            "retries": 0,
+            "timelimit": [None, None],
+            "root_id": task_id,
+            "parent_id": None,
+            "argsrepr": reprlib.repr(args),
+            "kwargsrepr": reprlib.repr(kwargs),
+            "origin": f"gen{os.getpid()}@{socket.gethostname()}",
+            "ignore_result": False,
+            "published_at": time.time(),
+            CELERY_CORRELATION_HEADER: correlation_id.get() or new_correlation_id(),
+        },
+        "properties": {
+            "correlation_id": task_id,
+            "reply_to": "",
+            "delivery_mode": 2,
+            # Celery declares each routed queue with an exchange and routing key of the same name.
+            "delivery_info": {"exchange": queue, "routing_key": queue},
+            "priority": 0,
+            "body_encoding": "base64",
+            "delivery_tag": str(uuid.uuid4()),
+        },
+    }
+
+def send_task(name: str, args: tuple = (), kwargs: Optional[dict] = None) -> str:
+    """Enqueues `name(*args, **kwargs)` on the lane `queues.route_task` picks; returns the task id."""
+    kwargs = kwargs or {}
+    route = queues.route_task(name, args, kwargs, {}) or {}
+    queue = route.get("queue", queues.SCHEDULED_QUEUE)
+    task_id = str(uuid.uuid4())
+    _redis().lpush(queue, orjson.dumps(build_message(name, args, kwargs, queue, task_id)))
+    return task_id
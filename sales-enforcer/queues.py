@@ -0,0 +1,61 @@
+# sales-enforcer/queues.py
+"""
+Celery queue lanes.
+
+- webhooks.<n>: Pipedrive webhook processing, hash-partitioned by deal id.
+  Each partition queue is consumed by exactly one single-threaded worker, so
+  events for one deal run in the order they arrived while partitions run in
+  parallel.
+- scheduled: beat jobs and other bulk work (rotting sweep, syncs, partition
+  maintenance), and anything not routed explicitly.
+- alerts: outbound notifications, kept away from both so a slow third party
+  can't delay scoring.
+
+Kept free of Celery imports so producers can route without loading the worker.
+"""
+import os
+from typing import List, Optional
+
+import settings  # noqa: F401  (loads .env before the getenv calls below)
+
+WEBHOOK_PARTITIONS = int(os.getenv("WEBHOOK_PARTITIONS", "4"))
+WEBHOOK_QUEUE_PREFIX = "webhooks"
+SCHEDULED_QUEUE = "scheduled"
+ALERTS_QUEUE = "alerts"
+
+SCHEDULED_TASKS = {
+    "celery_worker.apply_rotting_penalties",
+    "celery_worker.sync_deal_states",
+    "celery_worker.close_weekly_minimums",
+    "celery_worker.maintain_ledger_partitions",
+    "celery_worker.export_scorecard_history",
+}
+ALERT_TASK_PREFIX = "celery_worker.send_"
+
+def webhook_partition(deal_id: Optional[int]) -> int:
+    return (deal_id or 0) % WEBHOOK_PARTITIONS
+
+def webhook_queue(deal_id: Optional[int]) -> str:
+    return f"{WEBHOOK_QUEUE_PREFIX}.{webhook_partition(deal_id)}"
+
+def webhook_queues() -> List[str]:
+    return [f"{WEBHOOK_QUEUE_PREFIX}.{p}" for p in range(WEBHOOK_PARTITIONS)]
+
+def all_queues() -> List[str]:
+    return webhook_queues() + [SCHEDULED_QUEUE, ALERTS_QUEUE]
+
+def _deal_id_from_args(args) -> Optional[int]:
+    payload = args[0] if args else None
+    data = (payload or {}).get("data") or {}
+    return data.get("id")
+
+def route_task(name, args, kwargs, options, task=None, **kw):
+    """Celery task router (task_routes)."""
+    if name == "celery_worker.process_pipedrive_event":
+        payload_args = args or [kwargs.get("payload")]
+        return {"queue": webhook_queue(_deal_id_from_args(payload_args))}
+    if name in SCHEDULED_TASKS:
+        return {"queue": SCHEDULED_QUEUE}
+    if name.startswith(ALERT_TASK_PREFIX):
+        return {"queue": ALERTS_QUEUE}
+    return None
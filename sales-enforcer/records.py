@@ -0,0 +1,140 @@
+# sales-enforcer/records.py
+"""
+Compact records for Pipedrive deals and activities.
+
+A raw Pipedrive deal carries hundreds of custom-field keys, but the scorecard
+only reads a handful of standard fields plus the custom fields referenced in
+config (COMPLIANCE_RULES, AUTOMATION_FIELDS, DASHBOARD_CONFIG.field_keys and
+DEAL_UNIQUE_ID_KEY). Responses are decoded page by page with orjson and each
+item is projected into a __slots__ record, so the full dicts never outlive the
+page they arrived in.
+
+Records expose `.get(key, default)` and `[key]` like the dicts they replace,
+so rule evaluation and report code can read them unchanged.
+"""
+from typing import Iterable, List, Optional, Tuple, Type
+
+import orjson
+
+import config
+
+def _rule_fields(ruleset: dict) -> Iterable[str]:
+    for rule in ruleset.get("rules", []):
+        if "condition" in rule:
+            yield from _rule_fields(rule)
+        elif "field" in rule:
+            yield rule["field"]
+
+def deal_custom_field_keys() -> frozenset:
+    """Every custom-field key the scorecard reads, derived from config."""
+    keys = set(config.DASHBOARD_CONFIG["field_keys"].values())
+    keys.update(f["key"] for f in config.AUTOMATION_FIELDS.values())
+    keys.add(config.DEAL_UNIQUE_ID_KEY)
+    for ruleset in config.COMPLIANCE_RULES.values():
+        keys.update(_rule_fields(ruleset))
+    return frozenset(keys)
+
+DEAL_CUSTOM_FIELDS = deal_custom_field_keys()
+
+def _split_owner(raw: dict, *keys: str) -> Tuple[Optional[int], Optional[str]]:
+    """v1 payloads nest the owner as {"id", "name", ...}; v2 payloads use a bare owner_id."""
+    for key in keys:
+        owner = raw.get(key)
+        if isinstance(owner, dict):
+            return owner.get("id"), owner.get("name") or raw.get("owner_name")
+        if owner is not None:
+            return owner, raw.get("owner_name")
+    return None, raw.get("owner_name")
+
+class _Record:
+    __slots__ = ()
+
+    def get(self, key: str, default=None):
+        if key in self.__slots__:
+            value = getattr(self, key)
+        else:
+            value = self._extra(key)
+        return default if value is None else value
+
+    def _extra(self, key: str):
+        return None
+
+    def __getitem__(self, key: str):
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key) is not None
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}(id={getattr(self, 'id', None)!r})"
+
+class DealRecord(_Record):
+    __slots__ = (
+        "id", "title", "status", "stage_id", "pipeline_id", "owner_id", "owner_name",
+        "value", "currency", "add_time", "won_time", "lost_time", "stage_change_time",
+        "last_activity_date", "update_time", "custom",
+    )
+
+    def __init__(self, raw: dict):
+        self.id = raw.get("id")
+        self.title = raw.get("title")
+        self.status = raw.get("status")
+        self.stage_id = raw.get("stage_id")
+        self.pipeline_id = raw.get("pipeline_id")
+        self.owner_id, self.owner_name = _split_owner(raw, "user_id", "owner_id")
+        self.value = raw.get("value")
+        self.currency = raw.get("currency")
+        self.add_time = raw.get("add_time")
+        self.won_time = raw.get("won_time")
+        self.lost_time = raw.get("lost_time")
+        self.stage_change_time = raw.get("stage_change_time")
+        self.last_activity_date = raw.get("last_activity_date")
+        self.update_time = raw.get("update_time")
+        # v2 nests custom fields under "custom_fields"; v1 puts them at the top level.
+        source = raw.get("custom_fields") or raw
+        self.custom = {k: source[k] for k in DEAL_CUSTOM_FIELDS if source.get(k) is not None}
+
+    def _extra(self, key: str):
+        return self.custom.get(key)
+
+    def as_raw(self) -> dict:
+        """A v1-shaped dict that DealRecord(...) decodes back to an equal record (used for snapshots)."""
+        raw = {k: getattr(self, k) for k in self.__slots__ if k not in ("custom", "owner_id", "owner_name")}
+        raw["user_id"] = {"id": self.owner_id, "name": self.owner_name}
+        raw.update(self.custom)
+        return raw
+
+class ActivityRecord(_Record):
+    __slots__ = (
+        "id", "subject", "type", "done", "due_date", "due_time", "owner_id", "owner_name",
+        "deal_id", "deal_title", "add_time", "update_time", "marked_as_done_time",
+    )
+
+    def __init__(self, raw: dict):
+        self.id = raw.get("id")
+        self.subject = raw.get("subject")
+        self.type = raw.get("type")
+        self.done = raw.get("done")
+        self.due_date = raw.get("due_date")
+        self.due_time = raw.get("due_time")
+        self.owner_id, self.owner_name = _split_owner(raw, "owner_id", "user_id")
+        self.deal_id = raw.get("deal_id")
+        self.deal_title = raw.get("deal_title")
+        self.add_time = raw.get("add_time")
+        self.update_time = raw.get("update_time")
+        self.marked_as_done_time = raw.get("marked_as_done_time")
+
+def decode_page(content: bytes, record_cls: Type[_Record]) -> Tuple[List[_Record], dict]:
+    """Decodes one Pipedrive response body into records plus its `additional_data`."""
+    body = orjson.loads(content) or {}
+    data = body.get("data") or []
+    if isinstance(data, dict):
+        data = [data]
+    return [record_cls(item) for item in data if item], body.get("additional_data") or {}
+
+def decode_one(content: bytes, record_cls: Type[_Record]) -> Optional[_Record]:
+    records, _ = decode_page(content, record_cls)
+    return records[0] if records else None
@@ -0,0 +1,167 @@
+# sales-enforcer/rotting.py
+"""
+One rotting / "stuck" detector for the penalty sweep and the weekly report.
+
+A deal rots when it sits in a stage for the stage's rot days with no activity:
+the clock starts at the later of its stage change and its last activity.
+`rot_status` evaluates that for a single deal. Rot days come from the
+pipeline's own deal-rotting setting per stage (Pipedrive's rotten_flag /
+rotten_days, cached with the other reference data), so a deal is stuck here
+when Pipedrive shows it as rotten; `rot_days` in config.STAGES is the fallback
+while the stage settings can't be fetched.
+
+For the penalty sweep, deal state is mirrored into `deal_states` on every
+webhook (and by a periodic resync), with the precomputed `rot_deadline`.
+A partial index on pending deadlines acts as a time-ordered queue, so the
+sweep only reads deals whose deadline has already passed.
+
+The mirror can lag Pipedrive (an activity logged without a deal webhook only
+shows up at the nightly resync), so the sweep re-fetches each due deal and
+re-checks it before writing a penalty. Only deadlines crossed while a deal is
+mirrored are penalized: a deal first mirrored already past its deadline is
+recorded as handled, so the first resync doesn't penalize every long-idle deal
+at once.
+"""
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Collection, Iterable, List, Mapping, NamedTuple, Optional
+
+from sqlalchemy import case, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+import config
+import pipedrive_client
+from models import DealState
+from utils.timestamps import DealTimes
+
+logger = logging.getLogger(__name__)
+
+SWEEP_BATCH_SIZE = 500
+
+class RotStatus(NamedTuple):
+    is_stuck: bool
+    reason: str
+    deadline: Optional[datetime]
+
+def load_pipeline_rot_days() -> Mapping[int, Optional[int]]:
+    """Pipedrive's rot days per stage; empty (config fallback) while they can't be fetched."""
+    try:
+        return pipedrive_client.get_stage_rot_days()
+    except pipedrive_client.UPSTREAM_ERRORS as e:
+        logger.warning(f"Could not load stage rot settings, using config rot_days: {e}")
+        return {}
+
+def rot_days(stage_id: Optional[int], pipeline_rot_days: Optional[Mapping[int, Optional[int]]] = None) -> Optional[int]:
+    if pipeline_rot_days and stage_id in pipeline_rot_days:
+        return pipeline_rot_days[stage_id]
+    stage = config.STAGES.get(stage_id)
+    return stage.get("rot_days") if stage else config.DEFAULT_ROT_DAYS
+
+def rot_status(stage_id: Optional[int], times: DealTimes, now: datetime, status: Optional[str] = "open",
+               pipeline_rot_days: Optional[Mapping[int, Optional[int]]] = None) -> RotStatus:
+    """Whether the deal is stuck at `now`, why, and when it rots (None if it can't)."""
+    days = rot_days(stage_id, pipeline_rot_days)
+    anchor = max(filter(None, (times.stage_change_time, times.last_activity_date, times.add_time)), default=None)
+    if status != "open" or days is None or anchor is None:
+        return RotStatus(False, "", None)
+
+    deadline = anchor + timedelta(days=days)
+    if now < deadline:
+        return RotStatus(False, "", deadline)
+    idle_days = (now - anchor).days
+    if times.last_activity_date and times.last_activity_date >= anchor:
+        return RotStatus(True, f"No activity for {idle_days} days.", deadline)
+    return RotStatus(True, f"In stage for {idle_days} days with no activity since entering it.", deadline)
+
+# --- Mirror ---
+
+def _state_row(deal, now: datetime, pipeline_rot_days: Mapping[int, Optional[int]]) -> dict:
+    times = DealTimes(deal)
+    deadline = rot_status(deal.get("stage_id"), times, now, deal.get("status"), pipeline_rot_days).deadline
+    return {
+        "deal_id": deal.get("id"),
+        "owner_id": deal.get("owner_id"),
+        "stage_id": deal.get("stage_id"),
+        "status": deal.get("status"),
+        "stage_change_time": times.stage_change_time,
+        "last_activity_date": times.last_activity_date,
+        "rot_deadline": deadline,
+        # Only used on first insert; see the module docstring.
+        "rotted_at": now if deadline is not None and deadline <= now else None,
+        "updated_at": now,
+    }
+
+def upsert_deal_states(db: Session, deals: Iterable, pipeline_rot_days: Optional[Mapping[int, Optional[int]]] = None) -> int:
+    """Mirrors deals (DealRecord or dict) into deal_states. A moved deadline re-arms the sweep."""
+    now = datetime.now(timezone.utc)
+    deals = [d for d in deals if d and d.get("id")]
+    if not deals:
+        return 0
+    if pipeline_rot_days is None:
+        pipeline_rot_days = load_pipeline_rot_days()
+    rows = [_state_row(d, now, pipeline_rot_days) for d in deals]
+    table = DealState.__table__
+    stmt = pg_insert(table).values(rows)
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=["deal_id"],
+        set_={
+            "owner_id": stmt.excluded.owner_id,
+            "stage_id": stmt.excluded.stage_id,
+            "status": stmt.excluded.status,
+            "stage_change_time": stmt.excluded.stage_change_time,
+            "last_activity_date": stmt.excluded.last_activity_date,
+            "rot_deadline": stmt.excluded.rot_deadline,
+            "rotted_at": case(
+                (table.c.rot_deadline.is_distinct_from(stmt.excluded.rot_deadline), None),
+                else_=table.c.rotted_at,
+            ),
+            "updated_at": stmt.excluded.updated_at,
+        },
+    ))
+    return len(rows)
+
+def clear_missing(db: Session, open_deal_ids: List[int]) -> int:
+    """After a full resync: deals no longer open in the pipeline can't rot."""
+    return (
+        db.query(DealState)
+        .filter(DealState.rot_deadline.isnot(None), DealState.deal_id.notin_(open_deal_ids))
+        .update({DealState.rot_deadline: None}, synchronize_session=False)
+    )
+
+# --- Sweep ---
+
+def due_deals(db: Session, now: Optional[datetime] = None, limit: int = SWEEP_BATCH_SIZE, exclude: Collection[int] = ()) -> List[DealState]:
+    """Deals whose deadline has passed and hasn't been handled, oldest first (locked for this transaction)."""
+    now = now or datetime.now(timezone.utc)
+    query = db.query(DealState).filter(DealState.rotted_at.is_(None), DealState.rot_deadline <= now)
+    if exclude:
+        query = query.filter(DealState.deal_id.notin_(list(exclude)))
+    return (
+        query
+        .order_by(DealState.rot_deadline)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+        .all()
+    )
+
+def confirm_rotted(db: Session, fresh_deals: Iterable, now: Optional[datetime] = None) -> List:
+    """
+    Re-mirrors freshly fetched due deals and returns the ones still rotting, marked handled.
+
+    A deal that moved or got an activity since the mirror was last updated
+    gets its new deadline (re-arming the sweep) instead of a penalty.
+    """
+    now = now or datetime.now(timezone.utc)
+    fresh_deals = [d for d in fresh_deals if d and d.get("id")]
+    pipeline_rot_days = load_pipeline_rot_days()
+    upsert_deal_states(db, fresh_deals, pipeline_rot_days)
+    rotted = [d for d in fresh_deals if rot_status(d.get("stage_id"), DealTimes(d), now, d.get("status"), pipeline_rot_days).is_stuck]
+    if rotted:
+        db.query(DealState).filter(DealState.deal_id.in_([d["id"] for d in rotted])).update(
+            {DealState.rotted_at: now}, synchronize_session=False,
+        )
+    return rotted
+
+def next_deadline(db: Session) -> Optional[datetime]:
+    return db.query(func.min(DealState.rot_deadline)).filter(DealState.rotted_at.is_(None)).scalar()
@@ -1,13 +1,22 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
-from typing import Optional, List
+from typing import Optional, List, Dict, Tuple
 from datetime import datetime, date, timedelta
 from zoneinfo import ZoneInfo # Requires Python 3.9+
-import asyncio
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+import logging
+import threading
+import time
 
+import degraded
 import pipedrive_client
+import shared_cache
+from utils import FastJSONResponse, decode_cursor, encode_cursor, ndjson_response, paginated_headers
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
 # --- Pydantic Models ---
 class DueActivityItem(BaseModel):
@@ -20,15 +29,158 @@ class DueActivityItem(BaseModel):
     deal_title: Optional[str]
     is_overdue: bool
 
+# --- Due-Activity Sweep Cache ---
+# Sweeps live in the shared cache, so one API worker per pod calls Pipedrive
+# for a date range and every worker answers from its result. Each sweep is
+# stored once, as the range's last good value; the sweep index lists the live
+# ones by (range, swept_at), and each worker keeps the decoded indexes it has
+# already built, so a repeat request reads neither the sweep nor rebuilds it.
+SWEEP_TTL_SECONDS = 60
+SWEEP_INDEX = "sweeps"
+MAX_CACHED_SWEEPS = 16
+_ACTIVITY_FIELDS = ("id", "subject", "type", "due_date", "owner_id", "owner_name", "deal_id", "deal_title")
+
+class DueActivityIndex:
+    """
+    Results of one all-owners sweep, indexed by (owner_id, due_date) so any
+    per-user or narrower date filter is answered without another Pipedrive call.
+    """
+    def __init__(self, start_date: date, end_date: date, activities: List[dict], active_owner_ids, swept_at: float):
+        self.start_date = start_date
+        self.end_date = end_date
+        self.active_owner_ids = set(active_owner_ids)
+        self.swept_at = swept_at
+        # Sweep is already sorted by due_date, so each owner's list stays sorted.
+        self._by_owner: Dict[Optional[int], Tuple[List[str], List[dict]]] = {}
+        for a in activities:
+            keys, items = self._by_owner.setdefault(a.get("owner_id"), ([], []))
+            keys.append(a["due_date"])
+            items.append(a)
+
+    @classmethod
+    def from_cache(cls, payload: dict) -> "DueActivityIndex":
+        return cls(
+            date.fromisoformat(payload["start_date"]), date.fromisoformat(payload["end_date"]),
+            payload["activities"], payload["active_owner_ids"], payload["swept_at"],
+        )
+
+    def covers(self, start_date: date, end_date: date) -> bool:
+        return self.start_date <= start_date and end_date <= self.end_date
+
+    def select(self, owner_id: Optional[int], start_date: date, end_date: date) -> List[dict]:
+        lo, hi = start_date.isoformat(), end_date.isoformat()
+        owners = [owner_id] if owner_id else [o for o in self._by_owner if o in self.active_owner_ids]
+        selected = []
+        for o in owners:
+            keys, items = self._by_owner.get(o, ([], []))
+            selected.extend(items[bisect_left(keys, lo):bisect_right(keys, hi)])
+        return selected
+
+# Sweeps kept as a fallback, however old, while Pipedrive is failing.
+_last_good = degraded.LastGood("due_activities", maxsize=MAX_CACHED_SWEEPS)
+
+# This worker's decoded sweeps, keyed by (start_date, end_date, swept_at).
+_decoded: "OrderedDict[Tuple[date, date, float], DueActivityIndex]" = OrderedDict()
+_decoded_lock = threading.Lock()
+
+def _sweep_key(start_date: date, end_date: date) -> str:
+    return shared_cache.make_key("sweep", start_date.isoformat(), end_date.isoformat())
+
+def _index_member(start_date: date, end_date: date, swept_at: float) -> str:
+    return shared_cache.make_key(start_date.isoformat(), end_date.isoformat(), repr(swept_at))
+
+def _remember_decoded(index: DueActivityIndex):
+    with _decoded_lock:
+        _decoded[(index.start_date, index.end_date, index.swept_at)] = index
+        while len(_decoded) > MAX_CACHED_SWEEPS:
+            _decoded.popitem(last=False)
+
+def _decode_sweep(start_date: date, end_date: date, swept_at: float) -> Optional[DueActivityIndex]:
+    """The sweep of that range taken at swept_at, decoded once per worker."""
+    with _decoded_lock:
+        index = _decoded.get((start_date, end_date, swept_at))
+    if index is not None:
+        return index
+    hit = _last_good.recall((start_date, end_date))
+    if hit is None or hit[0]["swept_at"] < swept_at:
+        return None
+    index = DueActivityIndex.from_cache(hit[0])
+    _remember_decoded(index)
+    return index
+
+def _covering_sweep(start_date: date, end_date: date) -> Optional[DueActivityIndex]:
+    """A live sweep whose range covers [start_date, end_date]."""
+    now = time.time()
+    for member in shared_cache.index_members(SWEEP_INDEX):
+        lo, hi, swept_at = member.split(":")
+        lo, hi, swept_at = date.fromisoformat(lo), date.fromisoformat(hi), float(swept_at)
+        if now - swept_at < SWEEP_TTL_SECONDS and lo <= start_date and end_date <= hi:
+            index = _decode_sweep(lo, hi, swept_at)
+            if index is not None:
+                return index
+    return None
+
+def stale_index(start_date: date, end_date: date) -> Optional[DueActivityIndex]:
+    """The most recent sweep covering the range, however old."""
+    for _, payload, _ in _last_good.items():
+        index = DueActivityIndex.from_cache(payload)
+        if index.covers(start_date, end_date):
+            return index
+    return None
+
+async def get_due_activity_index(start_date: date, end_date: date) -> DueActivityIndex:
+    index = await run_in_threadpool(_covering_sweep, start_date, end_date)
+    if index is not None:
+        return index
+
+    swept = {}
+    async def sweep() -> float:
+        user_map = await pipedrive_client.get_user_map_async()
+        activities = [
+            {field: a.get(field) for field in _ACTIVITY_FIELDS}
+            async for a in pipedrive_client.stream_due_activities_all_owners_async(
+                start_date=start_date, end_date=end_date, done=False,
+            )
+        ]
+        payload = {
+            "start_date": start_date.isoformat(), "end_date": end_date.isoformat(),
+            "activities": activities, "active_owner_ids": list(user_map), "swept_at": time.time(),
+        }
+        await run_in_threadpool(_last_good.remember, (start_date, end_date), payload)
+        swept["index"] = DueActivityIndex.from_cache(payload)
+        return payload["swept_at"]
+
+    # Concurrent requests for the same range, in any worker, wait for a single
+    # sweep; the single-flight entry holds only its timestamp.
+    swept_at, age = await shared_cache.aget_or_compute(_sweep_key(start_date, end_date), SWEEP_TTL_SECONDS, sweep)
+    if age != 0:
+        index = await run_in_threadpool(_decode_sweep, start_date, end_date, swept_at)
+        if index is not None:
+            return index
+        # The stored sweep was evicted since; take a new one.
+        swept_at = await sweep()
+    index = swept["index"]
+    _remember_decoded(index)
+    await run_in_threadpool(shared_cache.index_add, SWEEP_INDEX, _index_member(start_date, end_date, swept_at), MAX_CACHED_SWEEPS)
+    return index
+
 # --- API Endpoint ---
 @router.get("/due-activities", response_model=List[DueActivityItem], tags=["Activities"])
 async def get_due_activities(
     user_id: Optional[int] = None, 
     start_date: Optional[date] = None, 
-    end_date: Optional[date] = None
+    end_date: Optional[date] = None,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    stream: bool = False,
 ):
     """
     Fetch open (not done) activities whose due_date is within [start_date, end_date], inclusive.
+
+    Pass `limit` (and the returned `X-Next-Cursor` header as `cursor`) to page through
+    the results, and `stream=true` to receive them as NDJSON, one activity per line.
+    While Pipedrive is failing, the last sweep covering the range is served with
+    `X-Data-Stale: true` and its `Age`.
     """
     tz = ZoneInfo("Asia/Dubai")
     today_dubai = datetime.now(tz).date()
@@ -39,41 +191,53 @@ async def get_due_activities(
     if end_date is None:
         end_date = today_dubai
 
-    if user_id:
-        activities = await pipedrive_client.get_activities_by_due_date_range_v2_async(
-            owner_id=user_id,
-            start_date=start_date,
-            end_date=end_date,
-            done=False,
-        )
-    else:
-        activities = await pipedrive_client.get_due_activities_all_salespersons_async(
-            start_date=start_date,
-            end_date=end_date,
-            done=False,
-        )
+    after = None
+    if cursor:
+        try:
+            after_due_date, after_id = decode_cursor(cursor)
+            after = (str(after_due_date), int(after_id))
+        except (ValueError, TypeError):
+            raise HTTPException(status_code=400, detail="Invalid cursor.")
 
-    if not activities:
-        return []
-
-    response_items: List[DueActivityItem] = []
-    for activity in activities:
-        due_date_str = activity.get("due_date")
-        if not due_date_str: continue
-        
-        due_date = date.fromisoformat(due_date_str)
-
-        response_items.append(
-            DueActivityItem(
-                id=activity["id"],
-                subject=activity.get("subject") or "No Subject",
-                type=activity.get("type") or "task",
-                due_date=due_date_str,
-                owner_name=activity.get("owner_name") or str(activity.get("owner_id") or "Unknown"),
-                deal_id=activity.get("deal_id"),
-                deal_title=activity.get("deal_title") or "No Associated Deal",
-                is_overdue=(due_date < today_dubai),
-            )
-        )
-        
-    return sorted(response_items, key=lambda x: x.due_date)
\ No newline at end of file
+    # Per-user and all-owner requests share one cached sweep per date range.
+    try:
+        index = await get_due_activity_index(start_date, end_date)
+        freshness = degraded.freshness_headers(int(time.time() - index.swept_at))
+    except pipedrive_client.UPSTREAM_ERRORS as e:
+        index = await run_in_threadpool(stale_index, start_date, end_date)
+        if index is None:
+            raise HTTPException(status_code=503, detail="Pipedrive is unavailable.")
+        logger.warning(f"Serving stale due activities: {e}")
+        freshness = degraded.freshness_headers(int(time.time() - index.swept_at), stale=True)
+    activities = sorted(
+        (a for a in index.select(user_id, start_date, end_date) if a.get("due_date")),
+        key=lambda a: (a["due_date"], a["id"]),
+    )
+
+    if after:
+        activities = activities[bisect_right(activities, after, key=lambda a: (a["due_date"], a["id"])):]
+
+    next_cursor = None
+    if limit and len(activities) > limit:
+        activities = activities[:limit]
+        next_cursor = encode_cursor(activities[-1]["due_date"], activities[-1]["id"])
+
+    today_str = today_dubai.isoformat()
+    # Plain dicts with the DueActivityItem shape; orjson serializes them directly.
+    rows = (
+        {
+            "id": activity["id"],
+            "subject": activity.get("subject") or "No Subject",
+            "type": activity.get("type") or "task",
+            "due_date": activity["due_date"],
+            "owner_name": activity.get("owner_name") or str(activity.get("owner_id") or "Unknown"),
+            "deal_id": activity.get("deal_id"),
+            "deal_title": activity.get("deal_title") or "No Associated Deal",
+            "is_overdue": activity["due_date"] < today_str,
+        }
+        for activity in activities
+    )
+
+    if stream:
+        return ndjson_response(rows, next_cursor, headers=freshness)
+    return FastJSONResponse(list(rows), headers={**paginated_headers(next_cursor), **freshness})
@@ -0,0 +1,93 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from pydantic import BaseModel, Field
+from typing import Optional, List
+from datetime import datetime, date, timedelta, timezone
+
+from database import get_db
+import funnel
+import points_series
+import velocity
+from utils import ensure_timezone_aware, get_current_quarter_dates
+
+router = APIRouter()
+
+# --- Pydantic Models ---
+class SimulationRequest(BaseModel):
+    candidates: List[dict] = Field(..., min_length=1, max_length=50, description="Candidate STAGES/POINT_CONFIG/MILESTONES overrides.")
+    start_date: Optional[date] = None
+    end_date: Optional[date] = None
+
+def resolve_period(start_date: Optional[date], end_date: Optional[date]):
+    """Explicit dates if given, otherwise the current quarter."""
+    q_start, q_end, _ = get_current_quarter_dates()
+    start = ensure_timezone_aware(datetime.combine(start_date, datetime.min.time())) if start_date else q_start
+    end = ensure_timezone_aware(datetime.combine(end_date, datetime.max.time())) if end_date else q_end
+    if start > end:
+        raise HTTPException(status_code=400, detail="start_date must be on or before end_date.")
+    return start, end
+
+@router.get("/funnel", tags=["Analytics"])
+def get_funnel_conversion(
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    stages: Optional[List[int]] = Query(None, description="Stage ids in funnel order. Defaults to every configured stage."),
+    db: Session = Depends(get_db),
+):
+    """
+    Stage-to-stage conversion for deals with stage activity in the period (default: current quarter),
+    ending with a "Won" step.
+    """
+    start, end = resolve_period(start_date, end_date)
+    try:
+        return funnel.get_funnel(db, start, end, stages)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/points-series", tags=["Analytics"])
+def get_points_series(
+    granularity: str = Query("week", pattern="^(day|week)$"),
+    user_id: Optional[int] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    db: Session = Depends(get_db),
+):
+    """
+    Gap-filled points per day or week for one user (or the whole team), read from the
+    pre-aggregated bucket table. Defaults to the last 12 buckets.
+    """
+    end_date = end_date or datetime.now(timezone.utc).date()
+    if start_date is None:
+        start_date = end_date - (timedelta(weeks=11) if granularity == "week" else timedelta(days=11))
+    if start_date > end_date:
+        raise HTTPException(status_code=400, detail="start_date must be on or before end_date.")
+    return points_series.get_points_series(db, start_date, end_date, granularity=granularity, user_id=user_id)
+
+@router.get("/stage-velocity", tags=["Analytics"])
+def get_stage_velocity(
+    user_id: Optional[int] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    db: Session = Depends(get_db),
+):
+    """
+    Median / p90 / average time-in-stage and speed-to-close for one user (or the team),
+    read from the precomputed dwell sketches. Periods resolve to whole months; defaults
+    to the current quarter.
+    """
+    start, end = resolve_period(start_date, end_date)
+    return velocity.get_stage_velocity(db, start, end, user_id=user_id)
+
+@router.post("/simulate", tags=["Analytics"])
+def simulate_scoring(request: SimulationRequest, db: Session = Depends(get_db)):
+    """
+    What-if scoring: per-user totals for the period (default: current quarter) and lifetime
+    milestone crossings under each candidate configuration.
+    """
+    import simulator  # numpy; loaded on first use rather than at API start-up
+
+    start, end = resolve_period(request.start_date, request.end_date)
+    try:
+        return simulator.simulate_many(db, request.candidates, start, end)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
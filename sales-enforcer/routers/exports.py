@@ -0,0 +1,53 @@
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from typing import Optional
+from datetime import date, datetime
+
+from database import read_engine
+from utils import ensure_timezone_aware
+
+router = APIRouter()
+
+EXPORT_WATERMARK_HEADER = "X-Export-Watermark"
+# Short: a download waits this long for in-flight writes, then returns nothing new.
+DOWNLOAD_SETTLE_SECONDS = 5.0
+_MEDIA_TYPES = {"parquet": "application/vnd.apache.parquet", "arrow": "application/vnd.apache.arrow.stream"}
+
+@router.get("/exports/{table}", tags=["Exports"])
+def download_export(
+    table: str,
+    format: str = Query("parquet", pattern="^(parquet|arrow)$"),
+    since_id: int = Query(0, ge=0, description="Only rows with a larger id (the previous download's watermark)."),
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+):
+    """
+    Streams points_ledger, deal_stage_events or user_milestones as one Parquet file
+    (or Arrow IPC stream), read through a server-side cursor. The `X-Export-Watermark`
+    header holds the highest id included; pass it back as `since_id` for the next
+    incremental download.
+    """
+    import exporter  # pyarrow; loaded on first use rather than at API start-up
+
+    try:
+        exporter.get_spec(table)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+    start = ensure_timezone_aware(datetime.combine(start_date, datetime.min.time())) if start_date else None
+    end = ensure_timezone_aware(datetime.combine(end_date, datetime.max.time())) if end_date else None
+    # Exports are the heaviest reads we serve, so they go to the replica while it's fresh.
+    source = read_engine()
+    with source.connect() as conn:
+        watermark = exporter.settled_max_id(conn, table, floor=since_id, settle_seconds=DOWNLOAD_SETTLE_SECONDS)
+
+    def body():
+        # A dedicated connection for the life of the download; the request's session is long gone.
+        with source.connect() as conn:
+            yield from exporter.stream_export(conn, table, format, after_id=since_id, up_to_id=watermark, start=start, end=end)
+
+    filename = f"{table}-{since_id + 1}-{watermark}.{format}"
+    return StreamingResponse(body(), media_type=_MEDIA_TYPES[format], headers={
+        EXPORT_WATERMARK_HEADER: str(watermark),
+        "Content-Disposition": f'attachment; filename="{filename}"',
+    })
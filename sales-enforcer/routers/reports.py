@@ -1,14 +1,22 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from typing import Optional, List
 from datetime import datetime, timedelta, timezone, date
 import asyncio
-from collections import Counter
+import logging
+from collections import Counter, deque
 
+import config
 import pipedrive_client
-from utils import ensure_timezone_aware, time_ago
+import rotting
+import degraded
+import shared_cache
+from utils.timestamps import DealTimes, parse_datetime
+from utils import ensure_timezone_aware, time_ago, FastJSONResponse, decode_cursor, encode_cursor, ndjson_response, paginated_headers
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
 # --- Pydantic Models (Unchanged) ---
 class ActivityDetail(BaseModel):id:int;subject:str;type:str;done:bool;due_date:Optional[date];add_time:datetime;owner_name:str
@@ -17,12 +25,141 @@ class StageSummary(BaseModel):stage_name:str;deal_count:int
 class ReportSummary(BaseModel):total_deals_created:int;stage_breakdown:List[StageSummary]
 class WeeklyReportResponse(BaseModel):summary:ReportSummary;deals:List[WeeklyDealReportItem]
 
+DETAIL_FETCH_CONCURRENCY = 10
+# Deals fetched ahead of the row being yielded; bounds memory on long pages.
+DETAIL_LOOKAHEAD = DETAIL_FETCH_CONCURRENCY * 4
+# Paging through one report reuses the first page's deal listing instead of
+# re-pulling the whole pipeline per page.
+DEAL_LIST_TTL_SECONDS = 60
+
+# Last good report per request, served (marked stale) while Pipedrive is failing.
+_last_good = degraded.LastGood("weekly_report", maxsize=64)
+
+async def _serve_stale(key, stream: bool, error: Exception):
+    hit = await run_in_threadpool(_last_good.recall, key)
+    if hit is None:
+        raise HTTPException(status_code=503, detail="Pipedrive is unavailable and this report has not been cached yet.")
+    logger.warning(f"Serving stale weekly report: {error}")
+    (summary, deals, next_cursor), age = hit
+    headers = degraded.freshness_headers(age, stale=True)
+    if stream:
+        return ndjson_response([degraded.mark({"summary": summary}, age, stale=True), *deals], next_cursor, headers=headers)
+    return FastJSONResponse(degraded.mark({"summary": summary, "deals": deals}, age, stale=True), headers={**paginated_headers(next_cursor), **headers})
+
+def _build_deal_item(deal: dict, activities_raw: Optional[list], stage_map: dict, rot_days: dict, now: datetime) -> dict:
+    """Builds one report row (WeeklyDealReportItem shape) as a plain dict for fast serialization."""
+    activities = []
+    if activities_raw:
+        # Sort by when it was marked done; fall back gracefully to other dates
+        def _sort_key(a):
+            return (
+                a.get("marked_as_done_time")
+                or (f"{a.get('due_date','')} {a.get('due_time','')}".strip() or None)
+                or a.get("update_time")
+                or a.get("add_time") or ""
+            )
+        activities_raw.sort(key=_sort_key, reverse=True)
+
+        for act in activities_raw:
+            if not act.get("id"): continue
+
+            # Pick a display timestamp, preferring marked_as_done_time
+            ts = parse_datetime(act.get("marked_as_done_time")) or parse_datetime(act.get("add_time"))
+
+            owner_name = act.get("owner_name", "Unknown")
+
+            activities.append({
+                "id": act["id"],
+                "subject": act.get("subject", "No Subject"),
+                "type": act.get("type", "task"),
+                "done": bool(act.get("done", False)),
+                "due_date": act.get("due_date") or None,
+                "add_time": ts or datetime(1970, 1, 1, tzinfo=timezone.utc),
+                "owner_name": owner_name,
+            })
+
+    times = DealTimes(deal)
+    last_activity_time = times.last_activity_date
+
+    stage_age_days = 0
+    if times.stage_change_time:
+        stage_age_days = (now - times.stage_change_time).days
+
+    is_stuck, stuck_reason, _ = rotting.rot_status(deal.get("stage_id"), times, now, pipeline_rot_days=rot_days)
+
+    return {"id": deal["id"], "title": deal.get("title", "Untitled Deal"), "owner_name": deal.get("owner_name", "Unknown Owner"), "owner_id": deal.get("owner_id", 0), "unique_id": deal.get(config.DEAL_UNIQUE_ID_KEY), "stage_name": stage_map.get(deal["stage_id"], "Unknown Stage"), "value": f"{deal.get('currency', '$')} {deal.get('value', 0):,}", "stage_age_days": stage_age_days, "is_stuck": is_stuck, "stuck_reason": stuck_reason, "last_activity_formatted": time_ago(last_activity_time), "activities": activities}
+
+async def _iter_deal_items(deals: list, stage_map: dict, rot_days: dict, now: datetime):
+    """
+    Fetches deal details with at most DETAIL_FETCH_CONCURRENCY in flight, yielding rows in input order.
+
+    A slow deal only holds back the rows after it, not the next fetches: up to
+    DETAIL_LOOKAHEAD later deals keep fetching while the head is awaited.
+    """
+    semaphore = asyncio.Semaphore(DETAIL_FETCH_CONCURRENCY)
+
+    async def fetch_full_data(deal_id: int):
+        async with semaphore:
+            return await asyncio.gather(
+                pipedrive_client.get_deal_async(deal_id),
+                pipedrive_client.get_deal_activities_async(deal_id),
+            )
+
+    pending = deque()
+    remaining = iter(deals)
+    try:
+        while True:
+            while len(pending) < DETAIL_LOOKAHEAD:
+                deal = next(remaining, None)
+                if deal is None: break
+                pending.append(asyncio.ensure_future(fetch_full_data(deal["id"])))
+            if not pending: break
+            deal, activities_raw = await pending.popleft()
+            if not deal: continue
+            yield _build_deal_item(deal, activities_raw, stage_map, rot_days, now)
+    finally:
+        # A failed fetch or a disconnected stream client abandons the rest.
+        for task in pending:
+            task.cancel()
+
+async def _deals_created_between(user_id: Optional[int], start_datetime: datetime, end_datetime: datetime) -> list:
+    """[{"id", "add_time", "stage_id"}] for deals added in the range, newest first."""
+    async def fetch():
+        deals_in_pipeline = await pipedrive_client.get_deals_from_pipeline_async(
+            pipeline_id=config.SALES_FLOW_PIPELINE_ID,
+            user_id=user_id
+        )
+        filtered = []
+        for deal in deals_in_pipeline:
+            if not (deal and deal.get('add_time')): continue
+            add_time = parse_datetime(deal['add_time'])
+            if add_time < start_datetime: break
+            if add_time <= end_datetime:
+                filtered.append({"id": deal["id"], "add_time": deal["add_time"], "stage_id": deal.get("stage_id")})
+        return filtered
+
+    key = shared_cache.make_key("weekly_deals", user_id or "all", start_datetime.isoformat(), end_datetime.isoformat())
+    deals, _ = await shared_cache.aget_or_compute(key, DEAL_LIST_TTL_SECONDS, fetch)
+    return deals
+
 @router.get("/weekly-report", response_model=WeeklyReportResponse, tags=["Reports"])
 async def get_weekly_report(
     user_id: Optional[int] = None, 
     start_date: Optional[date] = None, 
-    end_date: Optional[date] = None
+    end_date: Optional[date] = None,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=500),
+    stream: bool = False,
 ):
+    """
+    Deals created in [start_date, end_date] with their recent activities.
+
+    The summary always covers the whole range. `limit`/`cursor` page through the
+    deals (next cursor in the `X-Next-Cursor` header), and `stream=true` returns
+    NDJSON: a `{"summary": ...}` line followed by one deal per line.
+    While Pipedrive is failing, the last good copy of the same request is
+    served with `"stale": true` and its age.
+    """
     now = datetime.now(timezone.utc)
     
     if end_date is None: end_date = now.date()
@@ -31,102 +168,63 @@ async def get_weekly_report(
     start_datetime = ensure_timezone_aware(datetime.combine(start_date, datetime.min.time()))
     end_datetime = ensure_timezone_aware(datetime.combine(end_date, datetime.max.time()))
 
-    SALES_FLOW_PIPELINE_ID = 11
-    DEAL_UNIQUE_ID_KEY = "8d5a64af5474d18b62fb4d6e2881fb65009fca99"
-    
-    deals_in_pipeline = await pipedrive_client.get_deals_from_pipeline_async(
-        pipeline_id=SALES_FLOW_PIPELINE_ID,
-        user_id=user_id
-    )
-    
-    filtered_deals = []
-    for deal in deals_in_pipeline:
-        if not (deal and 'add_time' in deal): continue
-        add_time = ensure_timezone_aware(datetime.fromisoformat(deal['add_time'].replace('Z', '+00:00')))
-        if add_time < start_datetime: break
-        if add_time <= end_datetime:
-            filtered_deals.append(deal)
-
+    after = None
+    if cursor:
+        try:
+            after_add_time, after_id = decode_cursor(cursor)
+            after = (str(after_add_time), int(after_id))
+        except (ValueError, TypeError):
+            raise HTTPException(status_code=400, detail="Invalid cursor.")
+
+    key = (user_id, start_date, end_date, cursor, limit)
+    try:
+        filtered_deals = await _deals_created_between(user_id, start_datetime, end_datetime)
+    except pipedrive_client.UPSTREAM_ERRORS as e:
+        return await _serve_stale(key, stream, e)
+
+    fresh = degraded.freshness_headers()
+    empty_summary = {"total_deals_created": 0, "stage_breakdown": []}
     if not filtered_deals:
-        return WeeklyReportResponse(summary=ReportSummary(total_deals_created=0, stage_breakdown=[]), deals=[])
-
-    all_stages = await pipedrive_client.get_all_stages_async()
+        await run_in_threadpool(_last_good.remember, key, (empty_summary, [], None))
+        if stream:
+            return ndjson_response([degraded.mark({"summary": empty_summary})], headers=fresh)
+        return FastJSONResponse(degraded.mark({"summary": empty_summary, "deals": []}), headers=fresh)
+
+    try:
+        all_stages = await pipedrive_client.get_all_stages_async()
+    except pipedrive_client.UPSTREAM_ERRORS as e:
+        return await _serve_stale(key, stream, e)
     stage_map = {stage['id']: stage['name'] for stage in all_stages} if all_stages else {}
-
-    summary = ReportSummary(
-        total_deals_created=len(filtered_deals),
-        stage_breakdown=sorted([StageSummary(stage_name=stage_map.get(sid, f"Unknown Stage {sid}"), deal_count=c) for sid, c in Counter([d['stage_id'] for d in filtered_deals]).items()], key=lambda x: x.deal_count, reverse=True)
-    )
-
-    semaphore = asyncio.Semaphore(10)
-    async def fetch_full_data(deal_id: int):
-        async with semaphore:
-            deal_task = pipedrive_client.get_deal_async(deal_id)
-            activity_task = pipedrive_client.get_deal_activities_async(deal_id)
-            return await asyncio.gather(deal_task, activity_task)
-
-    tasks = [fetch_full_data(deal["id"]) for deal in filtered_deals]
-    results = await asyncio.gather(*tasks)
-    
-    detailed_deals = []
-    STUCK_DAYS_THRESHOLD = 5
-    for deal, activities_raw in results:
-        if not deal: continue 
-        
-        # ✅ FIXED: Replaced the entire activity processing block with the new, correct logic.
-        activities = []
-        if activities_raw:
-            # Sort by when it was marked done; fall back gracefully to other dates
-            def _sort_key(a):
-                return (
-                    a.get("marked_as_done_time")
-                    or (f"{a.get('due_date','')} {a.get('due_time','')}".strip() or None)
-                    or a.get("update_time")
-                    or a.get("add_time") or ""
-                )
-            activities_raw.sort(key=_sort_key, reverse=True)
-
-            for act in activities_raw:
-                if not act.get("id"): continue
-
-                # Pick a display timestamp, preferring marked_as_done_time
-                ts = None
-                if act.get("marked_as_done_time"):
-                    ts = ensure_timezone_aware(datetime.strptime(act["marked_as_done_time"], "%Y-%m-%d %H:%M:%S"))
-                elif act.get("add_time"):
-                    ts = ensure_timezone_aware(datetime.fromisoformat(act["add_time"].replace("Z", "+00:00")))
-                
-                owner_name = ( (act.get("user_id") or {}).get("name") if isinstance(act.get("user_id"), dict) else None ) or act.get("owner_name") or "Unknown"
-
-                activities.append(ActivityDetail(
-                    id=act["id"],
-                    subject=act.get("subject", "No Subject"),
-                    type=act.get("type", "task"),
-                    done=bool(act.get("done", False)),
-                    due_date=act.get("due_date"),
-                    add_time=ts or ensure_timezone_aware(datetime(1970, 1, 1, tzinfo=timezone.utc)),
-                    owner_name=owner_name
-                ))
-
-        last_activity_time = None
-        if deal.get("last_activity_date"):
-            last_activity_time = ensure_timezone_aware(datetime.strptime(deal["last_activity_date"], '%Y-%m-%d'))
-        
-        stage_age_days = 0
-        if deal.get("stage_change_time"):
-            stage_change_time = ensure_timezone_aware(datetime.fromisoformat(deal["stage_change_time"].replace('Z', '+00:00')))
-            stage_age_days = (now - stage_change_time).days
-
-        is_stuck = False
-        stuck_reason = ""
-        if last_activity_time:
-            days_since_activity = (now - last_activity_time).days
-            if days_since_activity > STUCK_DAYS_THRESHOLD:
-                is_stuck = True; stuck_reason = f"No activity for {days_since_activity} days."
-        elif stage_age_days > STUCK_DAYS_THRESHOLD:
-            is_stuck = True; stuck_reason = f"In stage for {stage_age_days} days with no completed activities."
-
-        owner = deal.get("user_id") or {}
-        detailed_deals.append(WeeklyDealReportItem(id=deal["id"],title=deal.get("title", "Untitled Deal"),owner_name=owner.get("name", "Unknown Owner"),owner_id=owner.get("id", 0),unique_id=deal.get(DEAL_UNIQUE_ID_KEY),stage_name=stage_map.get(deal["stage_id"], "Unknown Stage"),value=f"{deal.get('currency', '$')} {deal.get('value', 0):,}",stage_age_days=stage_age_days,is_stuck=is_stuck,stuck_reason=stuck_reason,last_activity_formatted=time_ago(last_activity_time),activities=activities))
-    
-    return WeeklyReportResponse(summary=summary, deals=detailed_deals)
\ No newline at end of file
+    # "Stuck" follows the pipeline's own rotting setting, from the same stage list.
+    rot_days = pipedrive_client.stage_rot_days(all_stages or [])
+
+    summary = {
+        "total_deals_created": len(filtered_deals),
+        "stage_breakdown": sorted([{"stage_name": stage_map.get(sid, f"Unknown Stage {sid}"), "deal_count": c} for sid, c in Counter([d['stage_id'] for d in filtered_deals]).items()], key=lambda x: x["deal_count"], reverse=True)
+    }
+
+    # Deals arrive sorted by add_time desc; (add_time, id) is the keyset for paging.
+    page = sorted(filtered_deals, key=lambda d: (d["add_time"], d["id"]), reverse=True)
+    if after:
+        page = [d for d in page if (d["add_time"], d["id"]) < after]
+    next_cursor = None
+    if limit and len(page) > limit:
+        page = page[:limit]
+        next_cursor = encode_cursor(page[-1]["add_time"], page[-1]["id"])
+
+    if stream:
+        async def lines():
+            yield degraded.mark({"summary": summary})
+            items = []
+            async for item in _iter_deal_items(page, stage_map, rot_days, now):
+                items.append(item)
+                yield item
+            await run_in_threadpool(_last_good.remember, key, (summary, items, next_cursor))
+        return ndjson_response(lines(), next_cursor, headers=fresh)
+
+    try:
+        detailed_deals = [item async for item in _iter_deal_items(page, stage_map, rot_days, now)]
+    except pipedrive_client.UPSTREAM_ERRORS as e:
+        return await _serve_stale(key, stream, e)
+    await run_in_threadpool(_last_good.remember, key, (summary, detailed_deals, next_cursor))
+    return FastJSONResponse(degraded.mark({"summary": summary, "deals": detailed_deals}), headers={**paginated_headers(next_cursor), **fresh})
@@ -0,0 +1,143 @@
+# sales-enforcer/scoring.py
+"""
+Pure scoring rules: turn one Pipedrive webhook event into ledger entries.
+
+Shared by the live Celery task (which persists the result) and the ledger
+rebuild engine (which replays the event log into a shadow ledger), so both
+always score with the current config.STAGES / POINT_CONFIG.
+"""
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import List, Optional, Set, Tuple
+
+import config
+from models import PointEventType
+from utils.timestamps import DealTimes
+
+@dataclass
+class ScoreResult:
+    status: str
+    ledger_entries: List[dict] = field(default_factory=list)
+    stage_events: List[int] = field(default_factory=list)
+    # (stage_id the deal tried to enter, stage_id to revert to, failed rule messages)
+    compliance_failure: Optional[Tuple[int, Optional[int], List[str]]] = None
+    was_updated: bool = False
+
+def check_compliance(stage_id: int, deal_data: dict) -> (bool, list):
+    """
+    Evaluates if a deal meets the compliance rules for a given stage.
+    This version is robust against different data types from the Pipedrive API.
+    """
+    stage_rules = config.COMPLIANCE_RULES.get(stage_id)
+    if not stage_rules:
+        return True, []
+
+    def evaluate(ruleset):
+        condition = ruleset["condition"]
+        rules = ruleset["rules"]
+        failed_messages = []
+        passed_count = 0
+        
+        for rule in rules:
+            if "condition" in rule:
+                passed, messages = evaluate(rule)
+                if passed:
+                    passed_count += 1
+                else:
+                    failed_messages.extend(messages)
+                continue
+
+            field_key = rule["field"]
+            rule_type = rule["type"]
+            field_value = deal_data.get(field_key)
+            
+            value_to_check = None
+            if isinstance(field_value, dict) and 'id' in field_value:
+                value_to_check = field_value['id']
+            elif field_value is not None:
+                value_to_check = field_value
+
+            rule_passed = False
+            if rule_type == "not_empty" and value_to_check is not None:
+                rule_passed = True
+            elif rule_type == "equals_id" and value_to_check is not None:
+                if str(value_to_check) == str(rule["value"]):
+                    rule_passed = True
+            elif rule_type == "equals" and value_to_check is not None:
+                 if str(value_to_check) == str(rule["value"]):
+                    rule_passed = True
+
+            if rule_passed:
+                passed_count += 1
+            else:
+                failed_messages.append(rule["message"])
+        
+        if condition == "AND" and passed_count == len(rules):
+            return True, []
+        if condition == "OR" and passed_count > 0:
+            return True, []
+            
+        return False, failed_messages
+
+    return evaluate(stage_rules)
+
+def status_change_entries(user_id: int, deal_data: dict, previous_data: dict) -> List[dict]:
+    deal_id = deal_data["id"]
+    entries = []
+
+    if deal_data.get("status") == 'won' and previous_data.get("status") != 'won':
+        days_to_win = DealTimes(deal_data).days_to_win
+
+        if days_to_win is not None and days_to_win <= config.POINT_CONFIG["bonus_won_fast_days"]:
+            entries.append(dict(deal_id=deal_id, user_id=user_id, event_type=PointEventType.BONUS, points=config.POINT_CONFIG["bonus_won_fast_points"], notes=f"Bonus: Deal won in {days_to_win} days."))
+
+        entries.append(dict(deal_id=deal_id, user_id=user_id, event_type=PointEventType.STAGE_ADVANCE, points=config.POINT_CONFIG["won_deal_points"], notes="Deal WON"))
+    return entries
+
+def score_event(payload: dict, deal_data, reached_stages: Set[int], at: Optional[datetime] = None) -> ScoreResult:
+    """
+    Scores one webhook payload against the full deal (`deal_data`) and the set of stages
+    the deal has already been credited for. Entries get `created_at=at` when given
+    (replays), otherwise the database default applies.
+    """
+    current_data = payload.get("data") or {}
+    previous_data = payload.get("previous") or {}
+    deal_id = current_data.get("id")
+    user_id = current_data.get("owner_id")
+    result = ScoreResult(status="No changes triggered point updates.")
+
+    # Handle status change events
+    if current_data.get("status") != previous_data.get("status"):
+        result.ledger_entries.extend(status_change_entries(user_id, deal_data, previous_data))
+        result.was_updated = True
+
+    # Handle stage change events
+    current_stage_id = current_data.get("stage_id")
+    previous_stage_id = previous_data.get("stage_id")
+    if current_stage_id is not None and current_stage_id != previous_stage_id:
+        current_stage = config.STAGES.get(current_stage_id)
+        previous_stage = config.STAGES.get(previous_stage_id, {"order": 0})
+
+        if not current_stage:
+            result.status = f"Unknown stage_id: {current_stage_id}"
+        elif current_stage["order"] > previous_stage["order"]:
+            is_compliant, messages = check_compliance(current_stage_id, deal_data)
+            if not is_compliant:
+                return ScoreResult(
+                    status=f"Not compliant with stage {current_stage_id}. Deal reverted.",
+                    compliance_failure=(current_stage_id, previous_stage_id, messages),
+                )
+
+            if current_stage_id not in reached_stages:
+                result.stage_events.append(current_stage_id)
+                result.was_updated = True
+                points_to_add = current_stage.get("points", 0)
+                if points_to_add > 0:
+                    result.ledger_entries.append(dict(deal_id=deal_id, user_id=user_id, event_type=PointEventType.STAGE_ADVANCE, points=points_to_add, notes=f"Advanced to stage: {current_stage['name']}"))
+
+    if at is not None:
+        for entry in result.ledger_entries:
+            entry["created_at"] = at
+    if result.was_updated and not result.status.startswith("Unknown"):
+        result.status = "Processed successfully with point updates."
+    return result
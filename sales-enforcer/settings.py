@@ -0,0 +1,45 @@
+# sales-enforcer/settings.py
+"""
+Process-wide configuration, read from the environment once.
+
+`.env` is loaded here and nowhere else. Modules that read configuration at
+import time import this module first, so whether `.env` applies no longer
+depends on which module happened to be imported first. Connection strings and
+credentials live here; per-feature tunables stay next to the code that uses
+them.
+"""
+import logging
+import os
+import re
+from typing import Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+def parse_azure_redis_url(azure_url: Optional[str]) -> Optional[str]:
+    """Turns an Azure Cache for Redis connection string into a rediss:// URL; other values pass through."""
+    if not azure_url or not azure_url.startswith('redis-'): return azure_url
+    try:
+        host, params = azure_url.split(',', 1)
+        password_match = re.search(r'password=([^,]+)', params)
+        password = password_match.group(1) if password_match else ''
+        return f"rediss://:{password}@{host}?ssl_cert_reqs=CERT_NONE"
+    except (ValueError, AttributeError):
+        logger.warning("Could not parse Azure Redis URL, falling back to original value.")
+        return azure_url
+
+DATABASE_URL = os.getenv("DATABASE_URL")
+# Optional streaming replica for read-only API traffic (dashboard, reports, analytics, exports).
+REPLICA_DATABASE_URL = os.getenv("REPLICA_DATABASE_URL")
+# Celery broker/result backend, in the form Celery expects.
+REDIS_URL = parse_azure_redis_url(os.getenv("REDIS_URL"))
+
+PIPEDRIVE_API_TOKEN = os.getenv("PIPEDRIVE_API_TOKEN")
+# Overridden by the benchmark harness to point at benchmarks/fake_pipedrive.py.
+PIPEDRIVE_API_HOST = os.getenv("PIPEDRIVE_API_HOST", "https://api.pipedrive.com")
+
+ZAPIER_WEBHOOK_URL_DEAL_WON = os.getenv("ZAPIER_WEBHOOK_URL_DEAL_WON")
+ZAPIER_WEBHOOK_URL_MILESTONE = os.getenv("ZAPIER_WEBHOOK_URL_MILESTONE")
@@ -0,0 +1,291 @@
+# sales-enforcer/shared_cache.py
+"""
+Cache tier shared by every API worker process.
+
+With several gunicorn workers per pod, module-level caches are duplicated and
+go cold per process. Values cached here live in Redis (CACHE_REDIS_URL, ideally
+a pod-local instance; otherwise REDIS_URL under its own key prefix), so
+Pipedrive reference data and dashboard snapshots are fetched once and read by
+every worker.
+
+- get / set: JSON values (orjson) with a TTL. Dates and datetimes come back as
+  ISO strings and tuples as lists, so cache response-shaped data.
+- get_or_compute / aget_or_compute: single-flight across processes through a
+  short Redis lock; the other workers wait for the winner's value instead of
+  calling Pipedrive themselves.
+- Index: a bounded, most-recent-first set of keys (degraded.LastGood).
+
+Without any Redis URL (local dev, one process) an in-process store is used.
+Redis errors are logged and treated as misses, so a cache outage costs
+latency, not availability.
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import orjson
+
+import settings
+from observability import SHARED_CACHE_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL") or settings.REDIS_URL
+KEY_PREFIX = os.getenv("CACHE_KEY_PREFIX", "se:cache:")
+# A compute that outlives the lock lets the next waiter start its own.
+LOCK_TTL_SECONDS = 60
+LOCK_WAIT_SECONDS = 30.0
+LOCK_POLL_SECONDS = 0.1
+# Fail fast: a slow cache must never be slower than the upstream it protects.
+SOCKET_TIMEOUT_SECONDS = 0.5
+
+def make_key(*parts) -> str:
+    return ":".join(str(p) for p in parts)
+
+# Same options as utils.dumps, so a datetime reads back as the string a fresh
+# response would have rendered ("...Z", not "...+00:00").
+_ENCODE_OPTIONS = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+
+def _encode(value: Any) -> bytes:
+    return orjson.dumps({"t": time.time(), "v": value}, option=_ENCODE_OPTIONS)
+
+def _decode(data: Optional[bytes]) -> Optional[Tuple[Any, int]]:
+    if data is None:
+        return None
+    entry = orjson.loads(data)
+    return entry["v"], max(0, int(time.time() - entry["t"]))
+
+# --- Backends ---
+
+class _LocalStore:
+    """In-process stand-in with the same operations, for single-process runs."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values: Dict[str, Tuple[float, bytes]] = {}
+        self._indexes: Dict[str, Dict[str, float]] = {}
+
+    def _live(self, key: str) -> Optional[bytes]:
+        hit = self._values.get(key)
+        if hit is None:
+            return None
+        if hit[0] <= time.monotonic():
+            self._values.pop(key, None)
+            return None
+        return hit[1]
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            return self._live(key)
+
+    def mget(self, keys: List[str]) -> List[Optional[bytes]]:
+        with self._lock:
+            return [self._live(k) for k in keys]
+
+    def set(self, key: str, data: bytes, ttl: float):
+        with self._lock:
+            self._values[key] = (time.monotonic() + ttl, data)
+
+    def delete(self, *keys: str):
+        with self._lock:
+            for k in keys:
+                self._values.pop(k, None)
+
+    def set_nx(self, key: str, token: str, ttl: float) -> bool:
+        with self._lock:
+            if self._live(key) is not None:
+                return False
+            self._values[key] = (time.monotonic() + ttl, token.encode())
+            return True
+
+    def delete_if(self, key: str, token: str):
+        with self._lock:
+            if self._live(key) == token.encode():
+                self._values.pop(key, None)
+
+    def index_add(self, index: str, member: str, maxsize: int) -> List[str]:
+        with self._lock:
+            members = self._indexes.setdefault(index, {})
+            members[member] = time.time()
+            ranked = sorted(members, key=members.get, reverse=True)
+            for evicted in ranked[maxsize:]:
+                members.pop(evicted, None)
+            return ranked[maxsize:]
+
+    def index_members(self, index: str) -> List[str]:
+        with self._lock:
+            members = self._indexes.get(index, {})
+            return sorted(members, key=members.get, reverse=True)
+
+    def clear(self, prefix: str):
+        with self._lock:
+            for store in (self._values, self._indexes):
+                for key in [k for k in store if k.startswith(prefix)]:
+                    del store[key]
+
+class _RedisStore:
+    _RELEASE = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) end return 0"
+
+    def __init__(self, url: str):
+        import redis
+
+        # Celery spells the Azure TLS option CERT_NONE; redis-py wants "none".
+        url = url.replace("ssl_cert_reqs=CERT_NONE", "ssl_cert_reqs=none")
+        self._redis = redis.Redis.from_url(
+            url, socket_timeout=SOCKET_TIMEOUT_SECONDS, socket_connect_timeout=SOCKET_TIMEOUT_SECONDS,
+        )
+        self._release = self._redis.register_script(self._RELEASE)
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self._redis.get(key)
+
+    def mget(self, keys: List[str]) -> List[Optional[bytes]]:
+        return self._redis.mget(keys) if keys else []
+
+    def set(self, key: str, data: bytes, ttl: float):
+        self._redis.set(key, data, px=int(ttl * 1000))
+
+    def delete(self, *keys: str):
+        if keys:
+            self._redis.delete(*keys)
+
+    def set_nx(self, key: str, token: str, ttl: float) -> bool:
+        return bool(self._redis.set(key, token, nx=True, px=int(ttl * 1000)))
+
+    def delete_if(self, key: str, token: str):
+        self._release(keys=[key], args=[token])
+
+    def index_add(self, index: str, member: str, maxsize: int) -> List[str]:
+        pipe = self._redis.pipeline()
+        pipe.zadd(index, {member: time.time()})
+        pipe.zrange(index, 0, -(maxsize + 1))
+        pipe.zremrangebyrank(index, 0, -(maxsize + 1))
+        _, evicted, _ = pipe.execute()
+        return [m.decode() for m in evicted]
+
+    def index_members(self, index: str) -> List[str]:
+        return [m.decode() for m in self._redis.zrevrange(index, 0, -1)]
+
+    def clear(self, prefix: str):
+        batch = []
+        for key in self._redis.scan_iter(match=prefix + "*", count=1000):
+            batch.append(key)
+            if len(batch) >= 1000:
+                self._redis.delete(*batch)
+                batch = []
+        if batch:
+            self._redis.delete(*batch)
+
+_store = None
+_store_lock = threading.Lock()
+
+def _backend():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = _RedisStore(CACHE_REDIS_URL) if CACHE_REDIS_URL else _LocalStore()
+    return _store
+
+def _call(op: str, default, *args):
+    try:
+        return getattr(_backend(), op)(*args)
+    except Exception as e:
+        SHARED_CACHE_REQUESTS.labels("error").inc()
+        logger.warning(f"Shared cache {op} failed, continuing without it: {e}")
+        return default
+
+# --- Values ---
+
+def get(key: str) -> Optional[Tuple[Any, int]]:
+    """(value, age in seconds) or None."""
+    hit = _decode(_call("get", None, KEY_PREFIX + key))
+    SHARED_CACHE_REQUESTS.labels("hit" if hit is not None else "miss").inc()
+    return hit
+
+def get_many(keys: List[str]) -> List[Optional[Tuple[Any, int]]]:
+    return [_decode(data) for data in _call("mget", [None] * len(keys), [KEY_PREFIX + k for k in keys])]
+
+def set(key: str, value: Any, ttl: float):
+    _call("set", None, KEY_PREFIX + key, _encode(value), ttl)
+
+def delete(*keys: str):
+    _call("delete", None, *[KEY_PREFIX + k for k in keys])
+
+def clear():
+    """Drops every value, index and lock under KEY_PREFIX (benchmarks start cold with it)."""
+    _call("clear", None, KEY_PREFIX)
+
+# --- Indexes ---
+
+def index_add(index: str, member: str, maxsize: int) -> List[str]:
+    """Records `member` as the most recent entry of `index`; returns the members evicted past maxsize."""
+    return _call("index_add", [], KEY_PREFIX + index, member, maxsize)
+
+def index_members(index: str) -> List[str]:
+    """Most recent first."""
+    return _call("index_members", [], KEY_PREFIX + index)
+
+# --- Single-flight ---
+
+def _try_lock(key: str) -> Optional[str]:
+    token = uuid.uuid4().hex
+    # If the cache is down, everyone computes, as they did before it existed.
+    return token if _call("set_nx", True, KEY_PREFIX + "lock:" + key, token, LOCK_TTL_SECONDS) else None
+
+def _unlock(key: str, token: str):
+    _call("delete_if", None, KEY_PREFIX + "lock:" + key, token)
+
+def _claim(key: str) -> Tuple[Optional[Tuple[Any, int]], Optional[str]]:
+    """(cached hit, None), or (None, lock token) when this process should compute; (None, None) means wait."""
+    hit = get(key)
+    if hit is not None:
+        return hit, None
+    token = _try_lock(key)
+    if token is None:
+        return None, None
+    # The previous holder may have stored the value between our read and our lock.
+    hit = get(key)
+    if hit is not None:
+        _unlock(key, token)
+        return hit, None
+    return None, token
+
+def get_or_compute(key: str, ttl: float, compute: Callable[[], Any]) -> Tuple[Any, int]:
+    """(value, age in seconds) for `key`, computing it in at most one process at a time."""
+    deadline = time.monotonic() + LOCK_WAIT_SECONDS
+    while True:
+        hit, token = _claim(key)
+        if hit is not None:
+            return hit
+        if token is not None or time.monotonic() >= deadline:
+            break
+        time.sleep(LOCK_POLL_SECONDS)
+    try:
+        value = compute()
+        set(key, value, ttl)
+        return value, 0
+    finally:
+        if token is not None:
+            _unlock(key, token)
+
+async def aget_or_compute(key: str, ttl: float, compute: Callable[[], Awaitable[Any]]) -> Tuple[Any, int]:
+    """get_or_compute for coroutine computes; cache calls run in a thread."""
+    deadline = time.monotonic() + LOCK_WAIT_SECONDS
+    while True:
+        hit, token = await asyncio.to_thread(_claim, key)
+        if hit is not None:
+            return hit
+        if token is not None or time.monotonic() >= deadline:
+            break
+        await asyncio.sleep(LOCK_POLL_SECONDS)
+    try:
+        value = await compute()
+        await asyncio.to_thread(set, key, value, ttl)
+        return value, 0
+    finally:
+        if token is not None:
+            await asyncio.to_thread(_unlock, key, token)
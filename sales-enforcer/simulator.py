@@ -0,0 +1,284 @@
+# sales-enforcer/simulator.py
+"""
+Vectorized "what-if" scoring simulator.
+
+Loads stage events, won deals and the remaining ledger adjustments into NumPy
+column arrays once (cached for a few minutes), then scores any number of
+candidate point configurations against them with array operations only:
+
+    {"name": "close-150", "stages": {"95": 150}, "bonus_won_fast_days": 21,
+     "won_deal_points": 200, "bonus_won_fast_points": 50, "milestones": {"Gold": 4000}}
+
+Every key is optional and falls back to the live config, and "stages" and
+"milestones" override only the entries they name (the example keeps Bronze
+and Silver). Unknown keys, stages and milestones, and non-numeric values, are
+rejected rather than ignored, so a typo can't pass for the live value. For
+each candidate it returns per-user totals for the period (leaderboard) and
+the lifetime milestone each user would hold, with the time it was crossed.
+
+Attribution follows the ledger: a stage event belongs to the user who owns the
+deal's earliest ledger entry, and days-to-win comes from the deal snapshot in
+the webhook event log (falling back to the deal's first stage event).
+Penalties and other adjustments are carried over unchanged.
+
+CLI: python -m simulator candidates.json [--start 2025-07-01 --end 2025-09-30]
+Benchmark: python -m benchmarks.bench_simulator
+"""
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import numpy as np
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+import config
+import event_log
+from models import PointEventType
+from utils.timestamps import DealTimes
+
+DATASET_TTL_SECONDS = 600
+_SECONDS_PER_DAY = 86400.0
+CANDIDATE_KEYS = frozenset({"name", "stages", "won_deal_points", "bonus_won_fast_days", "bonus_won_fast_points", "milestones"})
+
+@dataclass
+class SimulationDataset:
+    user_ids: np.ndarray           # dense index -> Pipedrive user id
+    stage_ids: np.ndarray          # dense index -> stage id
+    ev_user: np.ndarray            # stage events: dense user index
+    ev_stage: np.ndarray           # stage events: dense stage index
+    ev_time: np.ndarray            # stage events: epoch seconds
+    won_user: np.ndarray
+    won_days: np.ndarray           # days from add_time to won_time
+    won_time: np.ndarray
+    adj_user: np.ndarray           # other ledger adjustments (penalties, revivals, ...)
+    adj_points: np.ndarray
+    adj_time: np.ndarray
+    # The three kinds concatenated (ev, won, adj), and the (user, time) order of
+    # that concatenation; candidates only change points, so it is sorted once.
+    user: np.ndarray
+    ts: np.ndarray
+    order: np.ndarray
+    sorted_user: np.ndarray
+    sorted_ts: np.ndarray
+    user_starts: np.ndarray        # first position of each user's run in sorted order
+    loaded_at: float
+
+# Epochs are cast to float8: extract() returns numeric on Postgres 14+, which
+# comes back as Decimal.
+_STAGE_EVENTS_SQL = text("""
+    SELECT e.stage_id, extract(epoch FROM e.entered_at)::float8 AS ts, o.user_id
+    FROM deal_stage_events e
+    JOIN (
+        SELECT DISTINCT ON (deal_id) deal_id, user_id
+        FROM points_ledger ORDER BY deal_id, created_at
+    ) o ON o.deal_id = e.deal_id
+""")
+
+_WON_SQL = text("""
+    SELECT w.deal_id, w.user_id, extract(epoch FROM w.created_at)::float8 AS ts,
+           extract(epoch FROM (SELECT min(entered_at) FROM deal_stage_events e WHERE e.deal_id = w.deal_id))::float8 AS first_stage_ts
+    FROM points_ledger w
+    WHERE w.notes = 'Deal WON'
+""")
+
+_SNAPSHOTS_SQL = text("""
+    SELECT DISTINCT ON (deal_id) deal_id, deal_snapshot
+    FROM webhook_events
+    WHERE deal_id = ANY(:deal_ids) AND deal_snapshot IS NOT NULL
+    ORDER BY deal_id, received_at DESC
+""")
+
+_ADJUSTMENTS_SQL = text("""
+    SELECT user_id, points, extract(epoch FROM created_at)::float8 AS ts
+    FROM points_ledger
+    WHERE event_type NOT IN (:stage_advance, :bonus)
+""")
+
+def load_dataset(db: Session) -> SimulationDataset:
+    stage_rows = db.execute(_STAGE_EVENTS_SQL).all()
+    won_rows = db.execute(_WON_SQL).all()
+    adj_rows = db.execute(_ADJUSTMENTS_SQL, {"stage_advance": PointEventType.STAGE_ADVANCE.name, "bonus": PointEventType.BONUS.name}).all()
+
+    won_days_by_deal = {}
+    if won_rows:
+        for deal_id, blob in db.execute(_SNAPSHOTS_SQL, {"deal_ids": [r.deal_id for r in won_rows]}):
+            days = DealTimes(event_log.unpack(blob)).days_to_win
+            if days is not None:
+                won_days_by_deal[deal_id] = days
+    return build_dataset(stage_rows, won_rows, adj_rows, won_days_by_deal)
+
+def build_dataset(stage_rows, won_rows, adj_rows, won_days_by_deal: Dict[int, int]) -> SimulationDataset:
+    """Column arrays from row objects shaped like the _STAGE_EVENTS_SQL / _WON_SQL / _ADJUSTMENTS_SQL results."""
+    all_users = sorted({r.user_id for r in stage_rows} | {r.user_id for r in won_rows} | {r.user_id for r in adj_rows})
+    user_ids = np.array(all_users, dtype=np.int64)
+    stage_ids = np.array(sorted(config.STAGES), dtype=np.int64)
+
+    def dense(values, index):
+        return np.searchsorted(index, np.array(values, dtype=np.int64))
+
+    known = [r for r in stage_rows if r.stage_id in config.STAGES]
+    won_days = [
+        won_days_by_deal.get(r.deal_id, int((float(r.ts) - float(r.first_stage_ts)) // _SECONDS_PER_DAY) if r.first_stage_ts is not None else 10**6)
+        for r in won_rows
+    ]
+    columns = dict(
+        ev_user=dense([r.user_id for r in known], user_ids),
+        ev_stage=dense([r.stage_id for r in known], stage_ids),
+        ev_time=np.array([float(r.ts) for r in known], dtype=np.float64),
+        won_user=dense([r.user_id for r in won_rows], user_ids),
+        won_days=np.array(won_days, dtype=np.int64),
+        won_time=np.array([float(r.ts) for r in won_rows], dtype=np.float64),
+        adj_user=dense([r.user_id for r in adj_rows], user_ids),
+        adj_points=np.array([r.points for r in adj_rows], dtype=np.int64),
+        adj_time=np.array([float(r.ts) for r in adj_rows], dtype=np.float64),
+    )
+    user = np.concatenate([columns["ev_user"], columns["won_user"], columns["adj_user"]]).astype(np.int64)
+    ts = np.concatenate([columns["ev_time"], columns["won_time"], columns["adj_time"]])
+    order = np.lexsort((ts, user))
+    sorted_user = user[order]
+    user_starts = np.flatnonzero(np.r_[True, sorted_user[1:] != sorted_user[:-1]]) if len(user) else np.zeros(0, dtype=np.int64)
+    return SimulationDataset(
+        user_ids=user_ids, stage_ids=stage_ids, **columns,
+        user=user, ts=ts, order=order, sorted_user=sorted_user, sorted_ts=ts[order], user_starts=user_starts,
+        loaded_at=time.monotonic(),
+    )
+
+_dataset: Optional[SimulationDataset] = None
+
+def get_dataset(db: Session) -> SimulationDataset:
+    global _dataset
+    if _dataset is None or time.monotonic() - _dataset.loaded_at > DATASET_TTL_SECONDS:
+        _dataset = load_dataset(db)
+    return _dataset
+
+def _points(value, what: str) -> int:
+    # bool is an int subclass, but `true` is a typo, not a point value.
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or (isinstance(value, float) and not value.is_integer()):
+        raise ValueError(f"{what} must be a whole number, got {value!r}")
+    return int(value)
+
+def _overrides(candidate: dict, key: str) -> dict:
+    value = candidate.get(key) or {}
+    if not isinstance(value, dict):
+        raise ValueError(f"'{key}' must be an object, got {value!r}")
+    return value
+
+def _resolve(candidate: dict) -> dict:
+    """The live config with the candidate's values on top; stages and milestones are merged key by key."""
+    if not isinstance(candidate, dict):
+        raise ValueError(f"Each candidate must be an object, got {candidate!r}")
+    unknown = set(candidate) - CANDIDATE_KEYS
+    if unknown:
+        raise ValueError(f"Unknown candidate keys: {sorted(unknown)}; expected any of {sorted(CANDIDATE_KEYS)}")
+    stage_points = {sid: s["points"] for sid, s in config.STAGES.items()}
+    for sid, pts in _overrides(candidate, "stages").items():
+        try:
+            stage_id = int(sid)
+        except ValueError:
+            stage_id = None
+        if stage_id not in stage_points:
+            raise ValueError(f"Unknown stage id in candidate: {sid}")
+        stage_points[stage_id] = _points(pts, f"stages.{sid}")
+    milestones = dict(config.MILESTONES)
+    for rank, threshold in _overrides(candidate, "milestones").items():
+        if rank not in milestones:
+            raise ValueError(f"Unknown milestone in candidate: {rank}; expected any of {sorted(milestones)}")
+        milestones[rank] = _points(threshold, f"milestones.{rank}")
+    scalars = {
+        key: _points(candidate.get(key, config.POINT_CONFIG[key]), key)
+        for key in ("won_deal_points", "bonus_won_fast_days", "bonus_won_fast_points")
+    }
+    return {"stage_points": stage_points, **scalars, "milestones": milestones}
+
+def _milestone_crossings(ds: SimulationDataset, points: np.ndarray, milestones: Dict[str, int]):
+    """Highest milestone each user reaches on lifetime points, with when it was crossed."""
+    points = points[ds.order]
+    cumulative = np.cumsum(points)
+    # Per-user running totals: subtract the cumulative sum just before each user's first row.
+    starts = ds.user_starts
+    base = cumulative[starts] - points[starts]
+    running = cumulative - np.repeat(base, np.diff(np.r_[starts, len(points)]))
+
+    reached: Dict[int, tuple] = {}
+    for rank, threshold in sorted(milestones.items(), key=lambda kv: kv[1]):
+        hit = np.flatnonzero(running >= threshold)
+        # Rows are sorted by (user, time): a user's first hit is where the user changes.
+        users_hit = ds.sorted_user[hit]
+        first = hit[np.r_[True, users_hit[1:] != users_hit[:-1]]] if len(hit) else hit
+        for u, t in zip(ds.sorted_user[first].tolist(), ds.sorted_ts[first].tolist()):
+            reached[u] = (rank, t)
+    return {
+        int(ds.user_ids[u]): {"rank": rank, "crossed_at": datetime.fromtimestamp(t, tz=timezone.utc)}
+        for u, (rank, t) in reached.items()
+    }
+
+def _period_mask(ds: SimulationDataset, start: Optional[datetime], end: Optional[datetime]) -> np.ndarray:
+    in_period = np.ones(len(ds.ts), dtype=bool)
+    if start is not None:
+        in_period &= ds.ts >= start.timestamp()
+    if end is not None:
+        in_period &= ds.ts <= end.timestamp()
+    return in_period
+
+def simulate(ds: SimulationDataset, candidate: dict, start: Optional[datetime] = None, end: Optional[datetime] = None,
+             in_period: Optional[np.ndarray] = None) -> dict:
+    cfg = _resolve(candidate)
+    n_users = len(ds.user_ids)
+    lut = np.array([cfg["stage_points"][int(sid)] for sid in ds.stage_ids], dtype=np.int64)
+
+    ev_points = lut[ds.ev_stage] if len(ds.ev_stage) else np.zeros(0, dtype=np.int64)
+    won_points = cfg["won_deal_points"] + np.where(ds.won_days <= cfg["bonus_won_fast_days"], cfg["bonus_won_fast_points"], 0)
+    points = np.concatenate([ev_points, won_points, ds.adj_points]).astype(np.int64)
+
+    if in_period is None:
+        in_period = _period_mask(ds, start, end)
+    user = ds.user[in_period]
+    totals = np.bincount(user, weights=points[in_period], minlength=n_users).astype(np.int64)
+    active = np.bincount(user, minlength=n_users) > 0
+
+    ranking = np.argsort(-totals, kind="stable")
+    leaderboard = [{"user_id": int(ds.user_ids[i]), "points": int(totals[i])} for i in ranking if active[i]]
+    return {
+        "name": candidate.get("name"),
+        "leaderboard": leaderboard,
+        "milestones": _milestone_crossings(ds, points, cfg["milestones"]),
+    }
+
+def simulate_many(db: Session, candidates: List[dict], start: Optional[datetime] = None, end: Optional[datetime] = None) -> dict:
+    return score_candidates(get_dataset(db), candidates, start, end)
+
+def score_candidates(ds: SimulationDataset, candidates: List[dict], start: Optional[datetime] = None, end: Optional[datetime] = None) -> dict:
+    started = time.perf_counter()
+    in_period = _period_mask(ds, start, end)
+    results = [simulate(ds, c, start, end, in_period) for c in candidates]
+    return {
+        "events": int(len(ds.ev_time) + len(ds.won_time) + len(ds.adj_time)),
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+        "results": results,
+    }
+
+def main():
+    import argparse
+    import json
+
+    from database import SessionLocal
+    from utils import dumps
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("candidates", help="JSON file with a list of candidate configs.")
+    parser.add_argument("--start", type=datetime.fromisoformat, default=None)
+    parser.add_argument("--end", type=datetime.fromisoformat, default=None)
+    args = parser.parse_args()
+
+    with open(args.candidates) as f:
+        candidates = json.load(f)
+    db = SessionLocal()
+    try:
+        print(dumps(simulate_many(db, candidates, args.start, args.end)).decode())
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
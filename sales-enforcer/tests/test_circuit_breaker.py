@@ -0,0 +1,146 @@
+# sales-enforcer/tests/test_circuit_breaker.py
+import httpx
+import pytest
+import requests
+
+import circuit_breaker
+import pipedrive_client
+from circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(circuit_breaker.time, "monotonic", clock)
+    return clock
+
+@pytest.fixture
+def breaker(clock):
+    changes = []
+    b = CircuitBreaker("deals", failure_threshold=3, reset_timeout=30.0, on_state_change=lambda name, state: changes.append(state))
+    b.changes = changes
+    return b
+
+def _fail(breaker: CircuitBreaker, times: int):
+    for _ in range(times):
+        breaker.before_call()
+        breaker.record_failure()
+
+def test_opens_after_consecutive_failures(breaker, clock):
+    _fail(breaker, 2)
+    breaker.before_call()
+    breaker.record_success()
+    _fail(breaker, 2)
+    assert breaker.state == CLOSED
+
+    _fail(breaker, 1)
+    assert breaker.state == OPEN
+    clock.now += 10
+    with pytest.raises(CircuitOpenError) as e:
+        breaker.before_call()
+    assert e.value.retry_in == pytest.approx(20.0)
+
+def test_half_open_lets_one_probe_through_and_closes_on_success(breaker, clock):
+    _fail(breaker, 3)
+    clock.now += 30
+
+    breaker.before_call()
+    assert breaker.state == HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.record_success()
+
+    assert breaker.state == CLOSED
+    breaker.before_call()
+    assert breaker.changes == [OPEN, HALF_OPEN, CLOSED]
+
+def test_failed_probe_reopens_for_a_full_timeout(breaker, clock):
+    _fail(breaker, 3)
+    clock.now += 30
+    breaker.before_call()
+    breaker.record_failure()
+
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpenError) as e:
+        breaker.before_call()
+    assert e.value.retry_in == pytest.approx(30.0)
+
+def test_abandoned_probe_frees_the_slot(breaker, clock):
+    _fail(breaker, 3)
+    clock.now += 30
+    breaker.before_call()
+    breaker.abandon_call()
+
+    breaker.before_call()
+    assert breaker.state == HALF_OPEN
+
+# --- Pipedrive client ---
+
+@pytest.fixture
+def breakers(monkeypatch, clock):
+    monkeypatch.setattr(pipedrive_client, "_breakers", {})
+    return pipedrive_client._breakers
+
+class FakeResponse:
+    def __init__(self, status_code: int):
+        self.status_code = status_code
+        self.headers = {}
+        self.content = b'{"data": {"id": 7}}'
+        self.text = self.content.decode()
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.exceptions.HTTPError(f"{self.status_code}", response=self)
+
+def test_endpoint_family_keys_share_a_breaker(breakers):
+    deal = pipedrive_client.circuit_for(f"{pipedrive_client.V1_BASE}/deals/123")
+    deals = pipedrive_client.circuit_for(f"{pipedrive_client.V1_BASE}/deals?start=0")
+
+    assert deal is deals
+    assert deal.name == "deals"
+    assert pipedrive_client.circuit_for(f"{pipedrive_client.V1_BASE}/deals/123/activities").name == "activities"
+    assert pipedrive_client.circuit_for(f"{pipedrive_client.V1_BASE}/users").name == "users"
+
+def test_get_deal_failures_raise_unavailable_then_open_the_circuit(breakers, monkeypatch):
+    calls = []
+    def get(url, **kwargs):
+        calls.append(url)
+        raise requests.exceptions.ConnectionError("refused")
+    monkeypatch.setattr(pipedrive_client.requests, "get", get)
+
+    for _ in range(pipedrive_client.CIRCUIT_FAILURE_THRESHOLD):
+        with pytest.raises(pipedrive_client.PipedriveUnavailable):
+            pipedrive_client.get_deal(7)
+    with pytest.raises(CircuitOpenError):
+        pipedrive_client.get_deal(8)
+
+    assert len(calls) == pipedrive_client.CIRCUIT_FAILURE_THRESHOLD
+    # Another family is unaffected.
+    assert pipedrive_client.circuit_for(f"{pipedrive_client.V1_BASE}/users").state == CLOSED
+
+def test_get_deal_server_error_is_unavailable_and_404_is_none(breakers, monkeypatch):
+    monkeypatch.setattr(pipedrive_client.requests, "get", lambda url, **kwargs: FakeResponse(500))
+    with pytest.raises(pipedrive_client.PipedriveUnavailable):
+        pipedrive_client.get_deal(7)
+
+    monkeypatch.setattr(pipedrive_client.requests, "get", lambda url, **kwargs: FakeResponse(404))
+    assert pipedrive_client.get_deal(7) is None
+    assert pipedrive_client.circuit_for(f"{pipedrive_client.V1_BASE}/deals").state == CLOSED
+
+def test_async_reference_calls_raise_instead_of_returning_empty(breakers, monkeypatch):
+    import asyncio
+
+    async def unreachable(client, function, url, params):
+        raise httpx.ConnectError("refused")
+    monkeypatch.setattr(pipedrive_client, "_http_get_async", unreachable)
+
+    with pytest.raises(pipedrive_client.PipedriveUnavailable):
+        asyncio.run(pipedrive_client.get_all_stages_async())
+    with pytest.raises(pipedrive_client.PipedriveUnavailable):
+        asyncio.run(pipedrive_client.get_deal_activities_async(7))
@@ -0,0 +1,15 @@
+# sales-enforcer/tests/test_import_budget.py
+"""The API's cold-start budget (benchmarks/bench_import_time.py), enforced in CI."""
+import statistics
+
+from benchmarks.bench_import_time import budget_ms, forbidden_imports, measure
+
+RUNS = 3
+
+def test_main_imports_no_worker_or_heavy_modules():
+    _, modules = measure("main")
+    assert forbidden_imports(modules) == []
+
+def test_main_import_time_within_budget():
+    median = statistics.median(measure("main")[0] for _ in range(RUNS))
+    assert median <= budget_ms(), f"import main took {median:.0f} ms (budget {budget_ms():.0f} ms)"
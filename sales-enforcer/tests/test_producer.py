@@ -0,0 +1,49 @@
+# sales-enforcer/tests/test_producer.py
+"""Messages from producer.build_message must be what a Celery worker would have received from apply_async."""
+import json
+
+import orjson
+from celery import Celery
+from celery.worker.request import Request
+from kombu import Connection
+
+import producer
+import queues
+
+def _receive(envelope: dict):
+    """Decodes an envelope the way kombu's Redis transport does after popping it off the list."""
+    app = Celery("test", set_as_current=False)
+
+    @app.task(name=producer.PROCESS_PIPEDRIVE_EVENT, bind=True)
+    def task(self, payload, event_id=None):
+        return payload
+
+    with Connection("memory://") as conn:
+        channel = conn.default_channel
+        message = channel.Message(json.loads(orjson.dumps(envelope)), channel=channel)
+        return message, Request(message, app=app, task=task)
+
+def test_message_decodes_as_protocol_v2_task():
+    payload = {"event": "updated.deal", "data": {"id": 42, "owner_id": 7}}
+    queue = queues.route_task(producer.PROCESS_PIPEDRIVE_EVENT, (payload,), {"event_id": 3}, {})["queue"]
+    envelope = producer.build_message(producer.PROCESS_PIPEDRIVE_EVENT, (payload,), {"event_id": 3}, queue, "task-1")
+
+    message, request = _receive(envelope)
+
+    args, kwargs, embed = message.decode()
+    assert (args, kwargs) == ([payload], {"event_id": 3})
+    assert embed == {"callbacks": None, "errbacks": None, "chain": None, "chord": None}
+    assert request.id == "task-1"
+    assert request.name == producer.PROCESS_PIPEDRIVE_EVENT
+    assert request.args == [payload] and request.kwargs == {"event_id": 3}
+    assert request.delivery_info["routing_key"] == queue
+    # A bound task retrying from this message starts counting at zero.
+    assert request.request_dict["retries"] == 0
+
+def test_message_carries_correlation_headers():
+    envelope = producer.build_message(producer.PROCESS_PIPEDRIVE_EVENT, ({},), {}, queues.SCHEDULED_QUEUE, "task-2")
+
+    message, _ = _receive(envelope)
+
+    assert message.headers[producer.CELERY_CORRELATION_HEADER]
+    assert message.headers["published_at"] > 0
@@ -0,0 +1,39 @@
+# sales-enforcer/tests/test_rotting.py
+from datetime import datetime, timedelta, timezone
+
+import config
+import pipedrive_client
+import rotting
+from utils.timestamps import DealTimes
+
+NOW = datetime(2025, 10, 20, 12, tzinfo=timezone.utc)
+
+def _deal(stage_id: int, idle_days: int) -> DealTimes:
+    changed = (NOW - timedelta(days=idle_days)).strftime("%Y-%m-%d %H:%M:%S")
+    return DealTimes({"stage_id": stage_id, "add_time": changed, "stage_change_time": changed})
+
+def test_stage_rot_days_follows_the_rotten_flag():
+    stages = [
+        {"id": 90, "rotten_flag": True, "rotten_days": 3},
+        {"id": 91, "rotten_flag": False, "rotten_days": 7},
+        {"id": 92},
+    ]
+
+    assert pipedrive_client.stage_rot_days(stages) == {90: 3, 91: None, 92: None}
+
+def test_pipeline_setting_overrides_config():
+    assert config.STAGES[90]["rot_days"] == 5
+
+    assert rotting.rot_status(90, _deal(90, 4), NOW, pipeline_rot_days={90: 3}).is_stuck
+    assert not rotting.rot_status(90, _deal(90, 4), NOW).is_stuck
+    assert not rotting.rot_status(90, _deal(90, 40), NOW, pipeline_rot_days={90: None}).is_stuck
+
+def test_config_is_the_fallback_when_stage_settings_are_unavailable(monkeypatch):
+    def unavailable():
+        raise pipedrive_client.PipedriveUnavailable("down")
+    monkeypatch.setattr(pipedrive_client, "get_stage_rot_days", unavailable)
+
+    pipeline_rot_days = rotting.load_pipeline_rot_days()
+
+    assert pipeline_rot_days == {}
+    assert rotting.rot_days(90, pipeline_rot_days) == config.STAGES[90]["rot_days"]
@@ -0,0 +1,61 @@
+# sales-enforcer/tests/test_simulator.py
+from collections import namedtuple
+
+import pytest
+from fastapi.testclient import TestClient
+
+import simulator
+
+StageRow = namedtuple("StageRow", "stage_id ts user_id")
+
+T0 = 1_750_000_000.0
+
+@pytest.fixture
+def dataset():
+    # User 8: 15 closes x 100 points = 1500 (Bronze); user 9: 45 x 100 = 4500.
+    rows = [StageRow(95, T0 + i, 8) for i in range(15)] + [StageRow(95, T0 + i, 9) for i in range(45)]
+    return simulator.build_dataset(rows, [], [], {})
+
+def _result(ds, candidate):
+    return simulator.score_candidates(ds, [candidate])["results"][0]
+
+def test_milestone_override_keeps_the_other_ranks(dataset):
+    result = _result(dataset, {"milestones": {"Gold": 4000}})
+
+    assert result["milestones"][8]["rank"] == "Bronze"
+    assert result["milestones"][9]["rank"] == "Gold"
+
+def test_stage_override_only_changes_that_stage(dataset):
+    result = _result(dataset, {"stages": {"95": 10}})
+
+    assert {row["user_id"]: row["points"] for row in result["leaderboard"]} == {8: 150, 9: 450}
+
+@pytest.mark.parametrize("candidate", [
+    {"won_deal_points": "lots"},
+    {"won_deal_points": True},
+    {"bonus_won_fast_days": 1.5},
+    {"stages": {"95": "150"}},
+    {"stages": {"95": None}},
+    {"stages": {"abc": 10}},
+    {"stages": [95]},
+    {"milestones": {"Gold": "4000"}},
+    {"milestones": {"Platinum": 9000}},
+    {"typo_points": 1},
+])
+def test_bad_candidates_are_rejected(dataset, candidate):
+    with pytest.raises(ValueError):
+        _result(dataset, candidate)
+
+def test_bad_candidate_is_a_400(dataset, monkeypatch):
+    import database
+    import main
+
+    monkeypatch.setattr(simulator, "get_dataset", lambda db: dataset)
+    main.app.dependency_overrides[database.get_db] = lambda: None
+    try:
+        response = TestClient(main.app).post("/api/simulate", json={"candidates": [{"stages": {"95": "x"}}]})
+    finally:
+        main.app.dependency_overrides.clear()
+
+    assert response.status_code == 400
+    assert "stages.95" in response.json()["detail"]
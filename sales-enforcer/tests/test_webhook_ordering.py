@@ -0,0 +1,73 @@
+# sales-enforcer/tests/test_webhook_ordering.py
+"""A webhook lane must apply one deal's events in order, even across a Pipedrive outage."""
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+import orjson
+import pytest
+import requests
+
+import celery_worker
+import circuit_breaker
+import pipedrive_client
+
+DEAL_ID = 42
+OUTAGE_SECONDS = 120.0
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float):
+        self.now += seconds
+
+class Deal:
+    status_code = 200
+    headers = {}
+    content = orjson.dumps({"success": True, "data": {"id": DEAL_ID, "owner_id": 7, "stage_id": 91, "status": "open"}})
+
+    def raise_for_status(self):
+        pass
+
+@pytest.fixture
+def lane(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(circuit_breaker.time, "monotonic", clock.monotonic)
+    monkeypatch.setattr(celery_worker.time, "sleep", clock.sleep)
+    monkeypatch.setattr(pipedrive_client, "_breakers", {})
+    states = []
+    monkeypatch.setattr(pipedrive_client, "_on_circuit_change", lambda family, state: states.append(state))
+
+    recovers_at = clock.now + OUTAGE_SECONDS
+    def get(url, **kwargs):
+        if clock.now < recovers_at:
+            raise requests.exceptions.ConnectionError("Pipedrive is down")
+        return Deal()
+    monkeypatch.setattr(pipedrive_client.requests, "get", get)
+
+    scored = []
+    def score_event(payload, deal, reached_stages, at=None):
+        scored.append((payload["meta"]["seq"], clock.now))
+        return SimpleNamespace(status="ok", compliance_failure=None, stage_events=[], ledger_entries=[], was_updated=False)
+    monkeypatch.setattr(celery_worker.scoring, "score_event", score_event)
+    monkeypatch.setattr(celery_worker, "SessionLocal", MagicMock)
+    for module, name in ((celery_worker.event_log, "attach_snapshot"), (celery_worker.rotting, "upsert_deal_states"),
+                         (celery_worker.health_kpis, "record_webhook"), (celery_worker.velocity, "record_score_result")):
+        monkeypatch.setattr(module, name, lambda *args, **kwargs: None)
+    return SimpleNamespace(scored=scored, states=states, recovers_at=recovers_at)
+
+def _event(seq: int, stage_id: int) -> dict:
+    return {"meta": {"seq": seq}, "data": {"id": DEAL_ID, "owner_id": 7, "stage_id": stage_id}}
+
+def test_events_for_one_deal_stay_in_order_across_a_breaker_trip(lane):
+    # The solo worker runs the lane's messages one at a time, in queue order.
+    for event in (_event(1, 90), _event(2, 91)):
+        celery_worker.process_pipedrive_event(event)
+
+    assert [seq for seq, _ in lane.scored] == [1, 2]
+    # The first event waited out the outage instead of being re-queued behind the second.
+    assert lane.scored[0][1] >= lane.recovers_at
+    assert circuit_breaker.OPEN in lane.states and lane.states[-1] == circuit_breaker.CLOSED
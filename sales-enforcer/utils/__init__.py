@@ -0,0 +1,86 @@
+from datetime import datetime, timedelta, timezone
+import math
+import base64
+from typing import AsyncIterable, Iterable, Optional
+
+import orjson
+from fastapi.responses import ORJSONResponse, StreamingResponse
+
+# These helper functions are now in their own file to be shared across the application.
+
+def ensure_timezone_aware(dt: datetime) -> datetime:
+    """Ensures a datetime object is timezone-aware, assuming UTC if naive."""
+    if dt.tzinfo is None:
+        return dt.replace(tzinfo=timezone.utc)
+    return dt
+
+def get_current_quarter_dates():
+    now = datetime.now(timezone.utc)
+    current_quarter = math.ceil(now.month / 3)
+    start_month = 3 * current_quarter - 2
+    end_month = 3 * current_quarter
+    start_date = datetime(now.year, start_month, 1, tzinfo=timezone.utc)
+    
+    next_month_start_year = now.year
+    next_month_start_month = end_month + 1
+    if next_month_start_month > 12:
+        next_month_start_month = 1
+        next_month_start_year += 1
+        
+    next_month_start = datetime(next_month_start_year, next_month_start_month, 1, tzinfo=timezone.utc)
+    end_date = next_month_start - timedelta(days=1)
+    
+    quarter_name = f"Q{current_quarter} {now.year}"
+    return start_date, end_date.replace(hour=23, minute=59, second=59), quarter_name
+
+def time_ago(dt: datetime) -> str:
+    """Converts a datetime object to a human-readable string like '2h ago'."""
+    if not dt: return "N/A"
+    now = datetime.now(timezone.utc)
+    dt_aware = ensure_timezone_aware(dt)
+    diff = now - dt_aware
+    seconds = diff.total_seconds()
+    if seconds < 60: return "Just now"
+    if seconds < 3600: return f"{int(seconds / 60)}m ago"
+    if seconds < 86400: return f"{int(seconds / 3600)}h ago"
+    return f"{diff.days}d ago"
+
+# --- Fast JSON / Streaming Responses ---
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+_ORJSON_OPTIONS = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+
+def dumps(obj) -> bytes:
+    """Serializes plain dicts/lists (including dates and datetimes) with orjson."""
+    return orjson.dumps(obj, option=_ORJSON_OPTIONS)
+
+class FastJSONResponse(ORJSONResponse):
+    """ORJSONResponse that renders UTC datetimes with a 'Z' suffix, matching Pydantic's output."""
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+def encode_cursor(*key) -> str:
+    """Encodes a keyset position (e.g. due_date, id) as an opaque URL-safe cursor."""
+    return base64.urlsafe_b64encode(dumps(list(key))).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> list:
+    """Inverse of encode_cursor. Raises ValueError on a malformed cursor."""
+    try:
+        return orjson.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+def paginated_headers(next_cursor: Optional[str]) -> dict:
+    return {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else {}
+
+def ndjson_response(lines: AsyncIterable | Iterable, next_cursor: Optional[str] = None, headers: Optional[dict] = None) -> StreamingResponse:
+    """Streams one JSON document per line so clients can render rows as they arrive."""
+    async def body():
+        if hasattr(lines, "__aiter__"):
+            async for item in lines:
+                yield dumps(item) + b"\n"
+        else:
+            for item in lines:
+                yield dumps(item) + b"\n"
+    return StreamingResponse(body(), media_type=NDJSON_MEDIA_TYPE, headers={**paginated_headers(next_cursor), **(headers or {})})
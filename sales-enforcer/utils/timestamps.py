@@ -0,0 +1,96 @@
+# sales-enforcer/utils/timestamps.py
+"""
+Fast, memoized parsers for the timestamp formats Pipedrive returns.
+
+Pipedrive mixes several formats across v1/v2 payloads:
+    - "2025-08-25T12:54:17Z"   (v2 add_time, update_time, stage_change_time ...)
+    - "2025-08-25 12:54:17"    (v1 add_time, marked_as_done_time; always UTC)
+    - "2025-08-25"             (due_date, last_activity_date)
+
+On Python 3.11+ `datetime.fromisoformat` accepts all of them directly, so the
+old `.replace('Z', '+00:00')` / `strptime` round trips are unnecessary. Values
+repeat a lot (dates especially), so the parsers are memoized.
+"""
+from datetime import date, datetime, timezone
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional
+
+_PARSE_CACHE_SIZE = 1 << 16
+
+@lru_cache(maxsize=_PARSE_CACHE_SIZE)
+def _parse_datetime(value: str) -> datetime:
+    dt = datetime.fromisoformat(value)
+    if dt.tzinfo is None:
+        return dt.replace(tzinfo=timezone.utc)
+    return dt
+
+@lru_cache(maxsize=_PARSE_CACHE_SIZE)
+def _parse_date(value: str) -> date:
+    return date.fromisoformat(value[:10])
+
+def parse_datetime(value: Optional[str]) -> Optional[datetime]:
+    """Parses any Pipedrive timestamp (or bare date) into a UTC-aware datetime. Empty values give None."""
+    if not value:
+        return None
+    return _parse_datetime(value)
+
+def parse_date(value: Optional[str]) -> Optional[date]:
+    """Parses the date part of a Pipedrive date or timestamp. Empty values give None."""
+    if not value:
+        return None
+    return _parse_date(value)
+
+def parse_datetimes(values: Iterable[Optional[str]]) -> List[Optional[datetime]]:
+    """Vectorized parse_datetime: each distinct value is parsed once per call."""
+    seen: Dict[Optional[str], Optional[datetime]] = {}
+    out = []
+    for v in values:
+        if v not in seen:
+            seen[v] = parse_datetime(v)
+        out.append(seen[v])
+    return out
+
+def parse_dates(values: Iterable[Optional[str]]) -> List[Optional[date]]:
+    """Vectorized parse_date: each distinct value is parsed once per call."""
+    seen: Dict[Optional[str], Optional[date]] = {}
+    out = []
+    for v in values:
+        if v not in seen:
+            seen[v] = parse_date(v)
+        out.append(seen[v])
+    return out
+
+
+# --- Parse-once normalized records ---
+
+class DealTimes:
+    """The timestamps of a Pipedrive deal, parsed once and reused by every consumer."""
+    __slots__ = ("id", "add_time", "won_time", "stage_change_time", "last_activity_date")
+
+    def __init__(self, deal: dict):
+        self.id = deal.get("id")
+        self.add_time = parse_datetime(deal.get("add_time"))
+        self.won_time = parse_datetime(deal.get("won_time"))
+        self.stage_change_time = parse_datetime(deal.get("stage_change_time"))
+        self.last_activity_date = parse_datetime(deal.get("last_activity_date"))
+
+    @property
+    def days_to_win(self) -> Optional[int]:
+        if self.add_time and self.won_time:
+            return (self.won_time - self.add_time).days
+        return None
+
+class ActivityTimes:
+    """The timestamps of a Pipedrive activity, parsed once."""
+    __slots__ = ("id", "add_time", "marked_as_done_time", "due_date")
+
+    def __init__(self, activity: dict):
+        self.id = activity.get("id")
+        self.add_time = parse_datetime(activity.get("add_time"))
+        self.marked_as_done_time = parse_datetime(activity.get("marked_as_done_time"))
+        self.due_date = parse_date(activity.get("due_date"))
+
+    @property
+    def display_time(self) -> Optional[datetime]:
+        """When the activity was completed, falling back to when it was added."""
+        return self.marked_as_done_time or self.add_time
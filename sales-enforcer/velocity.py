@@ -0,0 +1,199 @@
+# sales-enforcer/velocity.py
+"""
+Stage dwell-time and speed-to-close analytics from DealStageEvent.
+
+Durations are folded into `stage_dwell_sketches`: log-bucketed histograms
+(bucket i holds durations in (GAMMA^(i-1), GAMMA^i] seconds, ~5% relative
+error) keyed by metric, stage, user and month. Histograms for any set of
+months merge by adding counts, so percentiles over a period are a small
+GROUP BY instead of a scan over the stage history.
+
+- "dwell": when a deal enters a new stage, the time since its previous stage
+  event is added to that previous stage, in the month the deal left it.
+- "close": when a deal is won, the time since its first stage event.
+
+`record_stage_entry` / `record_close` are called by the webhook task in the
+same transaction as the stage event; `rebuild_sketches` recomputes everything
+with LEAD() over (deal_id, entered_at) for the backfill and repairs.
+"""
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+import config
+from funnel import WON_NOTE
+from models import StageDwellSketch
+
+GAMMA = 1.1
+DWELL = "dwell"
+CLOSE = "close"
+CLOSE_STAGE_ID = 0
+TEAM_USER_ID = StageDwellSketch.TEAM_USER_ID
+
+_BUCKET_SQL = f"CASE WHEN secs <= 1 THEN 0 ELSE ceil(ln(secs) / ln({GAMMA}))::int END"
+
+_UPSERT_SQL = """
+    ON CONFLICT (metric, stage_id, user_id, month, bucket) DO UPDATE
+    SET count = stage_dwell_sketches.count + EXCLUDED.count,
+        total_seconds = stage_dwell_sketches.total_seconds + EXCLUDED.total_seconds
+"""
+
+# --- Incremental maintenance ---
+
+_RECORD_DWELL_SQL = text(f"""
+    INSERT INTO stage_dwell_sketches (metric, stage_id, user_id, month, bucket, count, total_seconds)
+    SELECT '{DWELL}', p.stage_id, u.user_id, date_trunc('month', timezone('UTC', now()))::date, {_BUCKET_SQL}, 1, secs
+    FROM (
+        SELECT stage_id, GREATEST(extract(epoch FROM now() - entered_at), 0) AS secs
+        FROM deal_stage_events
+        WHERE deal_id = :deal_id
+        ORDER BY entered_at DESC
+        LIMIT 1
+    ) p
+    CROSS JOIN (VALUES (:user_id), (:team_user_id)) AS u(user_id)
+    {_UPSERT_SQL}
+""")
+
+_RECORD_CLOSE_SQL = text(f"""
+    INSERT INTO stage_dwell_sketches (metric, stage_id, user_id, month, bucket, count, total_seconds)
+    SELECT '{CLOSE}', {CLOSE_STAGE_ID}, u.user_id, date_trunc('month', timezone('UTC', now()))::date, {_BUCKET_SQL}, 1, secs
+    FROM (
+        SELECT GREATEST(extract(epoch FROM now() - min(entered_at)), 0) AS secs
+        FROM deal_stage_events
+        WHERE deal_id = :deal_id
+        HAVING min(entered_at) IS NOT NULL
+    ) f
+    CROSS JOIN (VALUES (:user_id), (:team_user_id)) AS u(user_id)
+    {_UPSERT_SQL}
+""")
+
+def record_stage_entry(db: Session, deal_id: int, user_id: int):
+    """Closes the dwell of the deal's current stage. Call before adding the new DealStageEvent."""
+    db.execute(_RECORD_DWELL_SQL, {"deal_id": deal_id, "user_id": user_id, "team_user_id": TEAM_USER_ID})
+
+def record_close(db: Session, deal_id: int, user_id: int):
+    db.execute(_RECORD_CLOSE_SQL, {"deal_id": deal_id, "user_id": user_id, "team_user_id": TEAM_USER_ID})
+
+def record_score_result(db: Session, deal_id: int, user_id: int, result):
+    """Folds a scoring.ScoreResult into the sketches; must run before its stage events are added."""
+    for _ in result.stage_events:
+        record_stage_entry(db, deal_id, user_id)
+    if any(entry.get("notes") == WON_NOTE for entry in result.ledger_entries):
+        record_close(db, deal_id, user_id)
+
+# --- Reads ---
+
+def _bucket_value(bucket: int) -> float:
+    """Representative duration for a bucket (relative error (GAMMA - 1) / (GAMMA + 1))."""
+    return 0.0 if bucket <= 0 else 2 * GAMMA ** bucket / (GAMMA + 1)
+
+def _quantile(buckets: List[tuple], total: int, q: float) -> float:
+    rank = q * (total - 1)
+    seen = 0
+    for bucket, count in buckets:
+        seen += count
+        if seen > rank:
+            return _bucket_value(bucket)
+    return _bucket_value(buckets[-1][0])
+
+_READ_SQL = text("""
+    SELECT stage_id, bucket, SUM(count) AS count, SUM(total_seconds) AS total_seconds
+    FROM stage_dwell_sketches
+    WHERE metric = :metric AND user_id = :user_id
+      AND month BETWEEN date_trunc('month', CAST(:start AS timestamp))::date AND CAST(:end AS date)
+    GROUP BY stage_id, bucket
+    ORDER BY stage_id, bucket
+""")
+
+def _summaries(db: Session, metric: str, start: datetime, end: datetime, user_id: int) -> Dict[int, dict]:
+    grouped: Dict[int, dict] = {}
+    for r in db.execute(_READ_SQL, {"metric": metric, "user_id": user_id, "start": start, "end": end}):
+        g = grouped.setdefault(r.stage_id, {"buckets": [], "count": 0, "total_seconds": 0.0})
+        g["buckets"].append((r.bucket, int(r.count)))
+        g["count"] += int(r.count)
+        g["total_seconds"] += float(r.total_seconds)
+    return {
+        stage_id: {
+            "samples": g["count"],
+            "median_seconds": _quantile(g["buckets"], g["count"], 0.5),
+            "p90_seconds": _quantile(g["buckets"], g["count"], 0.9),
+            "avg_seconds": g["total_seconds"] / g["count"],
+        }
+        for stage_id, g in grouped.items()
+    }
+
+def get_stage_velocity(db: Session, start: datetime, end: datetime, user_id: Optional[int] = None) -> dict:
+    """
+    Median / p90 / average time-in-stage per configured stage and speed-to-close for
+    durations that ended in the months overlapping [start, end].
+    """
+    uid = user_id if user_id is not None else TEAM_USER_ID
+    dwell = _summaries(db, DWELL, start, end, uid)
+    close = _summaries(db, CLOSE, start, end, uid).get(CLOSE_STAGE_ID)
+
+    def hours(seconds: float) -> float:
+        return round(seconds / 3600, 1)
+
+    stages = []
+    for stage_id, stage in sorted(config.STAGES.items(), key=lambda kv: kv[1]["order"]):
+        s = dwell.get(stage_id)
+        stages.append({
+            "stage_id": stage_id,
+            "name": stage["name"],
+            "samples": s["samples"] if s else 0,
+            "median_hours": hours(s["median_seconds"]) if s else None,
+            "p90_hours": hours(s["p90_seconds"]) if s else None,
+            "avg_hours": hours(s["avg_seconds"]) if s else None,
+        })
+    return {
+        "start": start,
+        "end": end,
+        "user_id": user_id,
+        "stages": stages,
+        "speed_to_close": {
+            "samples": close["samples"] if close else 0,
+            "avg_days": round(close["avg_seconds"] / 86400, 1) if close else None,
+            "median_days": round(close["median_seconds"] / 86400, 1) if close else None,
+        },
+    }
+
+# --- Rebuild ---
+
+REBUILD_SQL = f"""
+    WITH owners AS (
+        SELECT DISTINCT ON (deal_id) deal_id, user_id
+        FROM points_ledger ORDER BY deal_id, created_at
+    ),
+    timeline AS (
+        SELECT deal_id, stage_id, entered_at,
+               LEAD(entered_at) OVER (PARTITION BY deal_id ORDER BY entered_at) AS left_at,
+               MIN(entered_at) OVER (PARTITION BY deal_id) AS first_entered_at
+        FROM deal_stage_events
+    ),
+    durations AS (
+        SELECT '{DWELL}' AS metric, t.stage_id, o.user_id, t.left_at AS ended_at,
+               GREATEST(extract(epoch FROM t.left_at - t.entered_at), 0) AS secs
+        FROM timeline t JOIN owners o USING (deal_id)
+        WHERE t.left_at IS NOT NULL
+        UNION ALL
+        SELECT '{CLOSE}', {CLOSE_STAGE_ID}, w.user_id, w.created_at,
+               GREATEST(extract(epoch FROM w.created_at - f.first_entered_at), 0)
+        FROM points_ledger w
+        JOIN (SELECT DISTINCT deal_id, first_entered_at FROM timeline) f USING (deal_id)
+        WHERE w.notes = '{WON_NOTE}'
+    )
+    INSERT INTO stage_dwell_sketches (metric, stage_id, user_id, month, bucket, count, total_seconds)
+    SELECT d.metric, d.stage_id, u.user_id, date_trunc('month', timezone('UTC', d.ended_at))::date,
+           {_BUCKET_SQL}, COUNT(*), SUM(secs)
+    FROM durations d
+    CROSS JOIN LATERAL (VALUES (d.user_id), ({TEAM_USER_ID})) AS u(user_id)
+    GROUP BY 1, 2, 3, 4, 5
+"""
+
+def rebuild_sketches(db: Session):
+    """Recomputes every sketch from the stage history (used by the migration backfill and for repairs)."""
+    db.query(StageDwellSketch).delete()
+    db.execute(text(REBUILD_SQL))
+    db.commit()